@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from boards.models import (
-    Repo, Issue, Pipeline, PipelineNameMapping, Transfer
+    Repo, Issue, IssueDuration, IssueLabel, Label, Pipeline,
+    PipelineNameMapping, Transfer
 )
 
 
@@ -10,3 +11,6 @@ admin.site.register(Issue)
 admin.site.register(Pipeline)
 admin.site.register(PipelineNameMapping)
 admin.site.register(Transfer)
+admin.site.register(IssueDuration)
+admin.site.register(Label)
+admin.site.register(IssueLabel)
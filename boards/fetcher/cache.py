@@ -0,0 +1,148 @@
+from hashlib import sha1
+from threading import Lock
+from time import time
+from urllib.parse import urlencode
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache(object):
+    """
+    On disk cache of GET responses with their ETag and Last-Modified
+    validators. Cached responses are revalidated with conditional requests,
+    so unchanged resources come back as bodyless 304s, which GitHub does
+    not count against the rate limit.
+    """
+
+    def __init__(self, directory, ttl, max_size):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, url, params=None):
+        if params:
+            url = f'{url}?{urlencode(sorted(params.items()))}'
+        name = sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name[:2], name)
+
+    def get(self, url, params=None):
+        path = self.path(url, params)
+        try:
+            if time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, url, params, response):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        path = self.path(url, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'body': response.json(),
+        }
+        # write to a temporary file first, other threads may be reading
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.replace(temp_path, path)
+
+    def touch(self, url, params=None):
+        """
+        Marks a revalidated entry as fresh and recently used.
+        """
+        try:
+            os.utime(self.path(url, params))
+        except OSError:
+            pass
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def evict(self):
+        """
+        Removes expired entries, then least recently used ones until the
+        cache fits in max_size bytes.
+        """
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        size = sum(e[1] for e in entries)
+        removed = 0
+        for mtime, file_size, path in entries:
+            if size <= self.max_size and time() - mtime <= self.ttl:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+            removed += 1
+        if removed:
+            logger.info(f'evicted {removed} cached responses')
+
+    def report(self, name):
+        with self._lock:
+            total = self.hits + self.misses
+            rate = self.hits / total * 100 if total else 0
+            logger.info(
+                f'{name} response cache: {self.hits} of {total} requests '
+                f'not modified ({rate:.1f}%)')
+            self.hits = self.misses = 0
+
+
+_caches = {}
+_caches_lock = Lock()
+
+
+def get_response_cache(name):
+    """
+    Response cache of an API, None if FETCHER_CACHE is not configured.
+    """
+    options = getattr(settings, 'FETCHER_CACHE', None)
+    if not options:
+        return None
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = ResponseCache(
+                os.path.join(options['directory'], name.lower()),
+                ttl=options['ttl'],
+                max_size=options['max_size']
+            )
+        return _caches[name]
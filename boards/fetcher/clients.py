@@ -1,10 +1,14 @@
-from datetime import datetime
-from time import sleep
 import logging
 
 import requests
 import backoff
 
+from django.conf import settings
+
+from boards.fetcher.cache import get_response_cache
+from boards.fetcher.limits import RateLimiter
+from boards.fetcher.sessions import RequestStats, get_session
+
 logger = logging.getLogger(__name__)
 
 
@@ -12,22 +16,56 @@ class BaseClient(object):
     def __init__(self, *args, **kwargs):
         self.base_url = kwargs.get('base_url', self.BASE_URL)
         self.token = kwargs.pop('token')
+        # requests of this client only, so each fetcher reports its own
+        self.stats = RequestStats(self.name)
 
     @backoff.on_exception(
         backoff.expo,
         (requests.exceptions.Timeout, requests.exceptions.ConnectionError),
         max_tries=8
     )
-    def request(self, endpoint, method, *args, **kwargs):
-        response = requests.request(
-            method, endpoint, headers=self._authentication_header,
+    def request(self, endpoint, method, headers=None, *args, **kwargs):
+        kwargs.setdefault('timeout', settings.FETCHER_HTTP['timeout'])
+        self.limiter.acquire()
+        response = self.session.request(
+            method, endpoint,
+            headers=dict(self._authentication_header, **(headers or {})),
             *args, **kwargs)
+        self.stats.record(method, endpoint, response.elapsed)
         response.raise_for_status()
         self._deal_with_limits(response)
         return response
 
     def get(self, endpoint, *args, **kwargs):
-        return self.request(endpoint, method='GET', *args, **kwargs).json()
+        cache = self.cache
+        if not cache:
+            return self.request(endpoint, method='GET', *args, **kwargs).json()
+        params = kwargs.get('params')
+        cached = cache.get(endpoint, params)
+        response = self.request(
+            endpoint, method='GET', headers=cache.conditional_headers(cached),
+            *args, **kwargs)
+        if response.status_code == 304 and cached:
+            cache.count(hit=True)
+            cache.touch(endpoint, params)
+            return cached['body']
+        cache.count(hit=False)
+        cache.set(endpoint, params, response)
+        return response.json()
+
+    @property
+    def session(self):
+        return get_session(self.__class__.__name__)
+
+    @property
+    def cache(self):
+        return get_response_cache(self.__class__.__name__)
+
+    def report(self):
+        self.stats.report(self.session)
+        if self.cache:
+            self.cache.report(self.__class__.__name__)
+            self.cache.evict()
 
     @property
     def _authentication_header(self):
@@ -39,6 +77,8 @@ class BaseClient(object):
 
 class GithubClient(BaseClient):
     BASE_URL = 'https://api.github.com'
+    name = 'Github'
+    limiter = RateLimiter(name)
 
     def __init__(self, *args, **kwargs):
         super(GithubClient, self).__init__(*args, **kwargs)
@@ -74,21 +114,17 @@ class GithubClient(BaseClient):
         return {'Authorization': f'token {self.token}'}
 
     def _deal_with_limits(self, response):
-        limit = int(response.headers['X-RateLimit-Limit'])
-        remaining = int(response.headers['X-RateLimit-Remaining'])
-        used = limit - remaining
-        wait_until = int(response.headers['X-RateLimit-Reset'])
-        wait = (wait_until - datetime.now().timestamp())
-        logger.info(
-            f'Github Request limit: {used} of {limit}, {wait} seconds to reset'
+        self.limiter.update(
+            limit=int(response.headers['X-RateLimit-Limit']),
+            remaining=int(response.headers['X-RateLimit-Remaining']),
+            reset_at=int(response.headers['X-RateLimit-Reset'])
         )
-        if limit - used <= 5:
-            logger.warning(f'sleeping {wait} seconds')
-            sleep(wait)
 
 
 class ZenhubClient(BaseClient):
     BASE_URL = 'https://api.zenhub.io/p1'
+    name = 'Zenhub'
+    limiter = RateLimiter(name)
 
     def get_board(self, repo_id):
         return self.get(f'{self.base_url}/repositories/{repo_id}/board')
@@ -110,12 +146,8 @@ class ZenhubClient(BaseClient):
 
     def _deal_with_limits(self, response):
         limit = int(response.headers['X-RateLimit-Limit'])
-        used = int(response.headers['X-RateLimit-Used'])
-        wait_until = int(response.headers['X-RateLimit-Reset'])
-        wait = (wait_until - datetime.now().timestamp())
-        logger.info(
-            f'Zenhub Request limit: {used} of {limit}, {wait} seconds to reset'
+        self.limiter.update(
+            limit=limit,
+            remaining=limit - int(response.headers['X-RateLimit-Used']),
+            reset_at=int(response.headers['X-RateLimit-Reset'])
         )
-        if limit - used <= 5:
-            logger.warning(f'sleeping {wait} seconds')
-            sleep(wait)
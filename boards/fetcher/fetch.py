@@ -1,68 +1,68 @@
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
 import logging
 from django.utils.timezone import now
 from django.conf import settings
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_datetime
 from django.db.models.fields import DateTimeField
 
 from boards.fetcher.clients import GithubClient, ZenhubClient
 from boards.fetcher.exceptions import PipelineNotFoundError
-from boards.models import (
-    Repo, Pipeline, PipelineNameMapping, Issue, Transfer
-)
+from boards.fetcher.persistence import IssueWriter
+from boards.fetcher.pipelines import get_registry
+from boards.webhooks import REFETCH_ACTIONS
+from boards.models import CLOSED_PIPELINE_NAME, Repo, Issue, Transfer
+from zenhub_charts import profiling
 
 logger = logging.getLogger(__name__)
 
 
 class Fetcher(object):
-    closed_pipeline_name = 'Closed'
+    closed_pipeline_name = CLOSED_PIPELINE_NAME
+    chunk_size = 100  # issues written to the database at once
 
-    def __init__(self, repo_names=None, initial=False, fix=False):
+    def __init__(self, repo_names=None, initial=False, fix=False, full=False,
+                 workers=None, github=None, zenhub=None):
         self.repo_names = repo_names
         self.initial = initial
         self.fix = fix
-        self.github = GithubClient(**settings.GITHUB)
-        self.zenhub = ZenhubClient(**settings.ZENHUB)
-        self.pipelines = {}
+        self.full = full or initial or fix
+        self.workers = workers or settings.FETCHER_WORKERS
+        self.writer = IssueWriter(self.chunk_size)
+        self.known_issues = {}
+        self.github = github or GithubClient(**settings.GITHUB)
+        self.zenhub = zenhub or ZenhubClient(**settings.ZENHUB)
+        self.registry = None
 
     def create_pipelines(self, repo, pipelines):
-        self.closed_pipeline, created = Pipeline.objects.get_or_create(
-            pipeline_id=f"{repo}-closed",
-            name=self.closed_pipeline_name, repo=repo,
-            defaults={
-                'order': 10000  # assuming there is no board with 10000 cols
-            }
-        )
-
-        for order, pipeline in enumerate(pipelines):
-            by_id = Pipeline.objects.filter(
-                repo=repo, pipeline_id=pipeline['id'])
-            if by_id.exists() and by_id.first().name != pipeline['name']:
-                # Name changed
-                PipelineNameMapping.objects.create(
-                    repo=repo,
-                    old_name=by_id.first().name,
-                    new_name=pipeline['name']
-                )
-                by_id.update(name=pipeline['name'])
-            else:
-                Pipeline.objects.update_or_create(
-                    pipeline_id=pipeline['id'],
-                    name=pipeline['name'], repo=repo,
-                    defaults={
-                        'order': order
-                    }
-                )
-        self.pipelines = self.get_pipelines(repo)
-        self.first_pipeline = Pipeline.objects.filter(
-            repo=repo).earliest('order')
-        self.pipeline_name_mapping = dict(PipelineNameMapping.objects.filter(
-            repo=repo
-        ).values_list('old_name', 'new_name'))
-
-    def get_pipelines(self, repo):
-        return {
-            p.name: p
-            for p in Pipeline.objects.filter(repo=repo)
-        }
+        """
+        Applies the board `pipelines` to the pipelines of the repo.
+        """
+        self.load_pipelines(repo)
+        self.registry.sync(pipelines)
+
+    def load_pipelines(self, repo):
+        """
+        Loads the saved pipelines of the repo, for fetching its issues
+        without getting the board first. They are shared by the fetchers
+        of the process, see PipelineRegistry.
+        """
+        self.registry = get_registry(repo)
+
+    @property
+    def pipelines(self):
+        return self.registry.pipelines
+
+    @property
+    def closed_pipeline(self):
+        return self.registry.closed
+
+    @property
+    def first_pipeline(self):
+        return self.registry.first
 
     def get_pipeline(self, repo, name):
         def select_one(pipeline_names):
@@ -78,7 +78,7 @@ class Fetcher(object):
             return select_one(pipeline_names)
 
         try:
-            return self.pipelines[self.pipeline_name_mapping.get(name, name)]
+            return self.registry.get(name)
         except KeyError:
             if self.fix:
                 print(
@@ -89,109 +89,249 @@ class Fetcher(object):
                 for index, pipeline in enumerate(pipeline_names):
                     print(f'[{index}]: {pipeline}')
                 new_name = select_one(pipeline_names)
-                PipelineNameMapping.objects.create(
-                    repo=repo, old_name=name, new_name=new_name
-                )
-                self.pipelines[new_name] = self.pipelines[new_name]
-                self.pipeline_name_mapping[name] = new_name
+                self.registry.add_mapping(name, new_name)
                 return self.pipelines[new_name]
             else:
                 raise PipelineNotFoundError(repo, name) 
 
     def get_issue_events(self, repo, issue_number):
-        github_issue = self.github.get_issue(repo.name, issue_number)
-        zenhub_issue_events = self.zenhub.get_issue_events(
-            repo.repo_id, issue_number)
-        zenhub_issue = self.zenhub.get_issue(repo.repo_id, issue_number)
-        latest_pipeline_name = zenhub_issue['pipeline']['name']
-        closed = latest_pipeline_name == self.closed_pipeline_name
-        labels = [i['name'] for i in github_issue['labels']]
-        issue, created = Issue.objects.update_or_create(
-            repo=repo, number=issue_number,
-            defaults={
-                'title': github_issue['title'],
-                'latest_transfer_date': github_issue['created_at'],
-                'labels': labels,
-            }
-        )
-        transfers = [
-            self._prepare_transfer(issue, e) for e in zenhub_issue_events
-            if e['type'] == 'transferIssue'
-        ]
-        transfers = sorted(transfers, key=lambda x: x['transfered_at']) 
-        transfers.insert(0, {
-            'issue': issue, 
-            'transfered_at': github_issue['created_at'],
-            'from_pipeline': None,
-            'to_pipeline': self.first_pipeline,
-        })
-        if closed:
-            # Issue is closed, we can not get this info from Zenhub
-            transfers.append({
-                'issue': issue,
-                'transfered_at': github_issue['closed_at'],
-                'from_pipeline': transfers[-1]['to_pipeline'],
-                'to_pipeline': self.closed_pipeline,
-            })
-        for transfer in transfers:
-            self.create_transfer(**transfer)
-        durations = self.calculate_durations(issue)
-        issue.durations = durations
-        issue.latest_transfer_date = transfers[-1]['transfered_at']
-        issue.latest_pipeline_name = latest_pipeline_name
-        issue.save()
+        self.load_known_issues(repo, [issue_number])
+        self.save_issue_events(
+            repo, issue_number, *self.fetch_issue_events(repo, issue_number))
+        self.writer.flush()
+        repo.refresh_label_counts()
+
+    def fetch_issue_events(self, repo, issue_number):
+        """
+        Network part of getting an issue, safe to run in worker threads.
+        """
+        with profiling.phase('sync.api'):
+            github_issue = self.github.get_issue(repo.name, issue_number)
+            zenhub_issue_events = self.zenhub.get_issue_events(
+                repo.repo_id, issue_number)
+            zenhub_issue = self.zenhub.get_issue(repo.repo_id, issue_number)
+        return github_issue, zenhub_issue_events, zenhub_issue
+
+    def save_issue_events(
+            self, repo, issue_number, github_issue, zenhub_issue_events,
+            zenhub_issue):
+        """
+        Prepares the issue, its transfers and durations in memory and hands
+        them to the writer, which saves them with the rest of the chunk.
+        """
+        with profiling.phase('sync.durations'):
+            latest_pipeline_name = zenhub_issue['pipeline']['name']
+            closed = latest_pipeline_name == self.closed_pipeline_name
+            labels = [i['name'] for i in github_issue['labels']]
+            issue = Issue(
+                repo=repo, number=issue_number,
+                title=github_issue['title'],
+                labels=labels,
+                latest_pipeline_name=latest_pipeline_name,
+            )
+            transfers = [
+                self._prepare_transfer(issue, e) for e in zenhub_issue_events
+                if e['type'] == 'transferIssue'
+            ]
+            transfers = sorted(transfers, key=lambda x: x.transfered_at)
+            transfers.insert(0, Transfer(
+                issue=issue,
+                transfered_at=parse_datetime(github_issue['created_at']),
+                from_pipeline=None,
+                to_pipeline=self.first_pipeline,
+            ))
+            if closed:
+                # Issue is closed, we can not get this info from Zenhub
+                transfers.append(Transfer(
+                    issue=issue,
+                    transfered_at=parse_datetime(github_issue['closed_at']),
+                    from_pipeline=transfers[-1].to_pipeline,
+                    to_pipeline=self.closed_pipeline,
+                ))
+            transfers = sorted(
+                [t for t in transfers if t.from_pipeline != t.to_pipeline],
+                key=lambda x: x.transfered_at)
+            known = self.known_issues.pop(issue_number, None)
+            if known:
+                # only fold in what happened since the stored state
+                new = [
+                    t for t in transfers
+                    if t.transfered_at > known.latest_transfer_date
+                ]
+                issue.set_durations(self.fold_transfers(
+                    known.durations, known.latest_transfer_date,
+                    known.current_pipeline_name, new))
+            else:
+                issue.set_durations(self.calculate_durations(issue, transfers))
+            if known and not new:
+                # a transfer first dated by its webhook is fetched with an
+                # earlier date, the durations were counted up to the later
+                issue.latest_transfer_date = known.latest_transfer_date
+                issue.current_pipeline_name = known.current_pipeline_name
+            else:
+                latest = transfers[-1]
+                issue.latest_transfer_date = latest.transfered_at
+                issue.current_pipeline_name = (
+                    latest.to_pipeline.name if latest.to_pipeline else '')
+        self.writer.add(issue, transfers, self.pipelines)
+
+    def apply_webhook_events(self, repo, events):
+        """
+        Applies deduped webhook events of the repo. ZenHub transfers and
+        GitHub title and label changes update the stored issues directly,
+        issues that are new or reopened are fetched.
+        """
+        self.load_pipelines(repo)
+        issues = {
+            issue.number: issue
+            for issue in Issue.objects.filter(
+                repo=repo, number__in={e['number'] for e in events}
+            ).exclude(current_pipeline_name='')
+        }
+        refetch = set()
+        transfers = defaultdict(list)
+        for event in events:
+            issue = issues.get(event['number'])
+            if issue is None or event.get('action') in REFETCH_ACTIONS:
+                refetch.add(event['number'])
+            elif event['source'] == 'zenhub':
+                try:
+                    transfer = self._prepare_transfer(issue, {
+                        'created_at': event['received_at'],
+                        'from_pipeline': {'name': event['from_pipeline']},
+                        'to_pipeline': {'name': event['to_pipeline']},
+                    })
+                except PipelineNotFoundError:
+                    # new pipeline on the board
+                    refetch.add(event['number'])
+                    continue
+                transfer.from_webhook = True
+                transfers[issue.number].append(transfer)
+            else:
+                issue.title = event['title']
+                issue.labels = event['labels']
+                if event['action'] == 'closed':
+                    transfers[issue.number].append(Transfer(
+                        issue=issue, from_webhook=True,
+                        transfered_at=parse_datetime(event['closed_at']),
+                        from_pipeline=self.pipelines.get(
+                            issue.current_pipeline_name),
+                        to_pipeline=self.closed_pipeline,
+                    ))
+        for number, issue in issues.items():
+            if number in refetch:
+                continue
+            new = []
+            current = issue.current_pipeline_name
+            for transfer in sorted(
+                    transfers[number], key=lambda t: t.transfered_at):
+                # already there, e.g. moved to Closed by both webhooks
+                if (transfer.to_pipeline.name == current or
+                        transfer.transfered_at <= issue.latest_transfer_date):
+                    continue
+                new.append(transfer)
+                current = transfer.to_pipeline.name
+            if new:
+                issue.set_durations(self.fold_transfers(
+                    issue.durations, issue.latest_transfer_date,
+                    issue.current_pipeline_name, new))
+                latest = new[-1]
+                issue.latest_transfer_date = latest.transfered_at
+                issue.current_pipeline_name = latest.to_pipeline.name
+                issue.latest_pipeline_name = latest.to_pipeline.name
+            self.writer.add(issue, new, self.pipelines)
+        logger.info(
+            f'applied {len(events)} webhook events to {len(issues)} issues '
+            f'of {repo}, fetching {len(refetch)}')
+        if refetch:
+            board = self.zenhub.get_board(repo.repo_id)
+            self.create_pipelines(repo, board['pipelines'])
+        self.sync_issues(repo, sorted(refetch, reverse=True))
+        repo.refresh_label_counts()
+        repo.bump_data_version()
+
+    def load_known_issues(self, repo, issue_numbers):
+        """
+        Stored duration state of the issues, new transfers are folded into
+        it instead of recalculating everything.
+        """
+        self.known_issues = {
+            issue.number: issue
+            for issue in Issue.objects.filter(
+                repo=repo, number__in=issue_numbers
+            ).exclude(current_pipeline_name='').only(
+                'number', 'durations', 'latest_transfer_date',
+                'current_pipeline_name')
+        }
 
     def _prepare_transfer(self, issue, transfer):
-        _transfer = {'issue': issue, 'transfered_at': transfer['created_at']}
+        _transfer = Transfer(
+            issue=issue, transfered_at=parse_datetime(transfer['created_at']))
         from_pipeline_name = transfer.get('from_pipeline', {}).get('name')
         if from_pipeline_name:
-            _transfer['from_pipeline'] = self.get_pipeline(
+            _transfer.from_pipeline = self.get_pipeline(
                 issue.repo, from_pipeline_name)
         to_pipeline_name = transfer.get('to_pipeline', {}).get('name')
         if to_pipeline_name:
-            _transfer['to_pipeline'] = self.get_pipeline(
+            _transfer.to_pipeline = self.get_pipeline(
                 issue.repo, to_pipeline_name)
         return _transfer
 
-    def create_transfer(
-            self, issue, from_pipeline, to_pipeline, transfered_at):
-        if from_pipeline == to_pipeline:
-            return
-        transfer, created = Transfer.objects.get_or_create(
-            issue=issue,
-            from_pipeline=from_pipeline,
-            to_pipeline=to_pipeline,
-            transfered_at=transfered_at
-        )
-        if created:
-            logger.info(f'created transfer: {transfer}')
-
-    def calculate_durations(self, issue):
-        transfers = issue.transfers.select_related(
-            'from_pipeline', 'to_pipeline').order_by('transfered_at')
-        durations = {}
-        last_index = transfers.count() - 1
-        for order, transfer in enumerate(transfers):
-            if order == last_index:
-                if transfer.to_pipeline.name != self.closed_pipeline_name:
-                    delta = now() - transfer.transfered_at
-                    total_seconds = delta.total_seconds()
-                    if not transfer.to_pipeline.name in durations:
-                        durations[transfer.to_pipeline.name] = 0
-                    durations[transfer.to_pipeline.name] += total_seconds
-            previous = None
-            if order > 0:
-                previous = transfers[order-1]
-            if not previous or not previous.to_pipeline:
-                continue
-            delta =  transfer.transfered_at - previous.transfered_at
-            if not previous.to_pipeline.name in durations:
-                durations[previous.to_pipeline.name] = 0
-            durations[previous.to_pipeline.name] += delta.total_seconds()
-        
-        logger.info(f'calculated durations')
+    def calculate_durations(self, issue, transfers=None):
+        """
+        Rebuilds the seconds spent in each pipeline from all `transfers`,
+        ordered by date. Saved transfers of the issue are used if none are
+        given.
+        """
+        if transfers is None:
+            transfers = list(issue.transfers.select_related(
+                'from_pipeline', 'to_pipeline').order_by('transfered_at'))
+        return self.fold_transfers({}, None, None, transfers)
+
+    def fold_transfers(self, durations, since, pipeline_name, transfers):
+        """
+        Adds the time spent between `transfers` to `durations`, starting
+        from `pipeline_name` entered at `since`. The time spent in the last
+        pipeline is not included, it grows until the next transfer.
+        """
+        durations = dict(durations)
+        for transfer in transfers:
+            if pipeline_name:
+                delta = transfer.transfered_at - since
+                durations[pipeline_name] = (
+                    durations.get(pipeline_name, 0) + delta.total_seconds())
+            since = transfer.transfered_at
+            pipeline_name = (
+                transfer.to_pipeline.name if transfer.to_pipeline else None)
         return durations
 
+    def rebuild_durations(self, repo):
+        """
+        Recalculates the durations of every issue of the repo from its
+        saved transfers. Syncs only fold in new transfers, this repairs
+        issues whose history changed afterwards.
+        """
+        self.load_pipelines(repo)
+        pipelines = self.pipelines
+        transfers = Prefetch(
+            'transfers',
+            queryset=Transfer.objects.select_related(
+                'from_pipeline', 'to_pipeline').order_by('transfered_at'))
+        issues = repo.issues.select_related('repo').prefetch_related(transfers)
+        for issue in issues:
+            ordered = list(issue.transfers.all())
+            if not ordered:
+                continue
+            issue.set_durations(self.calculate_durations(issue, ordered))
+            latest = ordered[-1]
+            issue.latest_transfer_date = latest.transfered_at
+            issue.current_pipeline_name = (
+                latest.to_pipeline.name if latest.to_pipeline else '')
+            self.writer.add(issue, [], pipelines)
+        self.writer.flush()
+        repo.refresh_label_counts()
+        repo.bump_data_version()
+
     def get_closed_issue_numbers(self, repo):
         closed_github_issue_numbers = []
         if self.fix:
@@ -209,21 +349,122 @@ class Fetcher(object):
             for item in sublist
         ]
 
+    def get_board_pipeline_names(self, pipelines):
+        return {
+            item['issue_number']: pipeline['name']
+            for pipeline in pipelines
+            for item in pipeline['issues']
+        }
+
+    def get_updated_issue_numbers(self, repo, since):
+        pages = self.github.get_issues(
+            repo=repo.name, iterate=True, state='all', per_page=100,
+            since=since.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        return [
+            issue['number']
+            for page in pages
+            for issue in page
+            if 'pull_request' not in issue
+        ]
+
+    def get_changed_issue_numbers(self, repo, pipelines):
+        """
+        Issues that are new on the board, moved to another pipeline or
+        updated on GitHub since the last sync.
+        """
+        known = dict(repo.issues.values_list('number', 'latest_pipeline_name'))
+        board = self.get_board_pipeline_names(pipelines)
+        changed = [
+            number for number, pipeline_name in board.items()
+            if known.get(number) != pipeline_name
+        ]
+        updated = self.get_updated_issue_numbers(repo, repo.synced_at)
+        logger.info(
+            f'{len(changed)} new or moved, {len(updated)} updated issues '
+            f'in {repo} since {repo.synced_at}')
+        return changed + updated
+
+    def get_sync_issue_numbers(self, repo):
+        """
+        Updates the pipelines of the repo from its board and returns the
+        numbers of the issues to fetch, newest first.
+        """
+        with profiling.phase('sync.board'):
+            board = self.zenhub.get_board(repo.repo_id)
+        with profiling.phase('sync.pipelines'):
+            self.create_pipelines(repo, board['pipelines'])
+        if self.full or not repo.synced_at:
+            issue_numbers = self.get_issue_numbers(board['pipelines'])
+            issue_numbers += self.get_closed_issue_numbers(repo)
+        else:
+            with profiling.phase('sync.changes'):
+                issue_numbers = self.get_changed_issue_numbers(
+                    repo, board['pipelines'])
+        return sorted(list(set(issue_numbers)), reverse=True)
+
+    def sync_issues(self, repo, issue_numbers):
+        total = len(issue_numbers)
+        fetch = partial(self.fetch_issue_events, repo)
+        numbers = iter(issue_numbers)
+        with profiling.sampled_profile(f'sync-{repo}'):
+            self.load_known_issues(repo, issue_numbers)
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                # requests run concurrently, results come back in order and
+                # are written one by one from this thread. Only two issues
+                # per worker are fetched ahead of the writes, so a failed
+                # write does not wait for the requests of every issue.
+                window = deque(
+                    (number, executor.submit(fetch, number))
+                    for number in islice(numbers, self.workers * 2))
+                try:
+                    for counter in range(1, total + 1):
+                        issue_number, future = window.popleft()
+                        for number in islice(numbers, 1):
+                            window.append(
+                                (number, executor.submit(fetch, number)))
+                        result = future.result()
+                        logger.info(
+                            f'Getting issue events for #{issue_number} in '
+                            f'{repo} {counter}/{total}')
+                        self.save_issue_events(repo, issue_number, *result)
+                except BaseException:
+                    for _, future in window:
+                        future.cancel()
+                    raise
+            self.writer.flush()
+
+    def finish_sync(self, repo, started_at, issue_count):
+        """
+        Marks the sync that started at `started_at` as done and records
+        how long it took.
+        """
+        repo.refresh_label_counts()
+        repo.synced_at = started_at
+        repo.sync_duration = (now() - started_at).total_seconds()
+        repo.synced_issues = issue_count
+        repo.save(update_fields=[
+            'synced_at', 'sync_duration', 'synced_issues'])
+        repo.bump_data_version()
+        profiling.metrics.flush()
+        logger.info(
+            f'synced {issue_count} issues of {repo} in '
+            f'{repo.sync_duration:.1f}s ({repo.sync_throughput:.2f} issues/s)')
+
+    def sync_repo(self, repo):
+        started_at = now()
+        issue_numbers = self.get_sync_issue_numbers(repo)
+        self.sync_issues(repo, issue_numbers)
+        self.finish_sync(repo, started_at, len(issue_numbers))
+
     def sync(self):
         repos = Repo.objects.all()
         if self.repo_names:
             repos = repos.filter(name__in=self.repo_names)
         for repo in repos:
-            current_issues = repo.issues.all()
-            board = self.zenhub.get_board(repo.repo_id)
-            self.create_pipelines(repo, board['pipelines'])
-            closed_github_issue_numbers = self.get_closed_issue_numbers(repo)
-            issue_numbers = self.get_issue_numbers(board['pipelines'])
-            issue_numbers += closed_github_issue_numbers
-            issue_numbers = sorted(list(set(issue_numbers)), reverse=True)
-            total = len(issue_numbers)
-            for counter, issue_number in enumerate(issue_numbers, 1):
-                logger.info(
-                    f'Getting issue events for #{issue_number} in {repo} '
-                    f'{counter}/{total}')    
-                self.get_issue_events(repo, issue_number)
+            self.sync_repo(repo)
+        self.report()
+
+    def report(self):
+        self.github.report()
+        self.zenhub.report()
+        profiling.metrics.flush()
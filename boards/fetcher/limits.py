@@ -0,0 +1,54 @@
+from threading import Condition
+from time import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter(object):
+    """
+    Token bucket filled from the rate limit headers of an API.
+    Every request draws a token before it is sent, so any number of threads
+    can share one API budget. When it runs out, only the threads that need
+    a token wait until the limit resets.
+    """
+
+    def __init__(self, name, reserve=5):
+        self.name = name
+        self.reserve = reserve
+        self.tokens = None  # unknown until the first response
+        self.reset_at = 0
+        self._condition = Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.tokens is not None and self.tokens <= self.reserve:
+                wait = self.reset_at - time()
+                if wait <= 0:
+                    # limit is reset, next response tells the new budget
+                    self.tokens = None
+                    break
+                logger.warning(
+                    f'{self.name} request limit reached, '
+                    f'waiting {wait} seconds')
+                self._condition.wait(wait)
+            if self.tokens is not None:
+                self.tokens -= 1
+
+    def update(self, limit, remaining, reset_at):
+        """
+        Syncs the bucket with the limits reported by a response. Responses
+        of requests sent before others can report more tokens than left, so
+        the lower count wins until the limit is reset.
+        """
+        with self._condition:
+            if reset_at > self.reset_at or self.tokens is None:
+                self.tokens = remaining
+            else:
+                self.tokens = min(self.tokens, remaining)
+            self.reset_at = max(self.reset_at, reset_at)
+            self._condition.notify_all()
+        logger.info(
+            f'{self.name} Request limit: {limit - remaining} of {limit}, '
+            f'{reset_at - time()} seconds to reset'
+        )
@@ -0,0 +1,42 @@
+from uuid import uuid4
+import logging
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RepoLock(object):
+    """
+    Redis lock held while a repo is synced, so overlapping periodic runs
+    do not sync the same repo twice. It expires after `timeout` seconds in
+    case its holder dies. The token can be handed over to another task,
+    which then releases the lock.
+    """
+    prefix = 'sync-lock'
+    # only delete the key if it still holds our token
+    release_script = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, repo_name, token=None, timeout=None):
+        options = settings.FETCHER_TASKS
+        self.key = f'{self.prefix}:{repo_name}'
+        self.token = token or uuid4().hex
+        self.timeout = timeout or options['lock_timeout']
+        self.redis = redis.StrictRedis.from_url(
+            options.get('url') or settings.CELERY_BROKER_URL)
+
+    def acquire(self):
+        return bool(self.redis.set(
+            self.key, self.token, nx=True, ex=self.timeout))
+
+    def release(self):
+        released = self.redis.eval(
+            self.release_script, 1, self.key, self.token)
+        if not released:
+            logger.warning(f'{self.key} expired before it was released')
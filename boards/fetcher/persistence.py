@@ -0,0 +1,150 @@
+from collections import defaultdict
+import logging
+
+from django.db import connection, transaction
+from psycopg2.extras import execute_values
+
+from boards.models import Issue, IssueDuration, IssueLabel, Label, Transfer
+from zenhub_charts import profiling
+
+logger = logging.getLogger(__name__)
+
+
+def upsert(objs, unique_fields, update_fields, insert_fields=()):
+    """
+    Inserts `objs` or updates `update_fields` of the rows that conflict on
+    `unique_fields`, in a single INSERT ... ON CONFLICT statement.
+    `insert_fields` are only set on new rows. Without `update_fields`
+    conflicting rows are left alone and only new rows are returned.
+    Returns (pk, *unique_fields) of every row.
+    """
+    if not objs:
+        return []
+    meta = type(objs[0])._meta
+    quote = connection.ops.quote_name
+    unique = [meta.get_field(f) for f in unique_fields]
+    update = [meta.get_field(f) for f in update_fields]
+    fields = unique + update + [meta.get_field(f) for f in insert_fields]
+    columns = ', '.join(quote(f.column) for f in fields)
+    unique_columns = ', '.join(quote(f.column) for f in unique)
+    assignments = ', '.join(
+        f'{quote(f.column)} = EXCLUDED.{quote(f.column)}' for f in update)
+    action = f'DO UPDATE SET {assignments}' if update else 'DO NOTHING'
+    sql = (
+        f'INSERT INTO {quote(meta.db_table)} ({columns}) VALUES %s '
+        f'ON CONFLICT ({unique_columns}) {action} '
+        f'RETURNING {quote(meta.pk.column)}, {unique_columns}'
+    )
+    values = [
+        [
+            f.get_db_prep_save(getattr(obj, f.attname), connection)
+            for f in fields
+        ]
+        for obj in objs
+    ]
+    with connection.cursor() as cursor:
+        execute_values(cursor, sql, values, page_size=len(values))
+        return cursor.fetchall()
+
+
+class IssueWriter(object):
+    """
+    Collects fetched issues with their transfers and durations, and writes
+    them in chunks: one upsert for the issues, one insert for the new
+    transfers and one for the per pipeline durations.
+    """
+    issue_fields = (
+        'title', 'labels', 'durations', 'cycle_time',
+        'latest_pipeline_name', 'latest_transfer_date',
+        'current_pipeline_name',
+    )
+
+    def __init__(self, chunk_size=100):
+        self.chunk_size = chunk_size
+        self.pending = {}
+
+    def add(self, issue, transfers, pipelines):
+        """
+        `transfers` are unsaved transfers of `issue`, `pipelines` maps
+        pipeline names to pipelines for the duration rows.
+        """
+        self.pending[(issue.repo_id, issue.number)] = (
+            issue, transfers, pipelines)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        issues = [issue for issue, _, _ in self.pending.values()]
+        with profiling.phase('sync.write'), transaction.atomic():
+            ids = {
+                (repo_id, number): pk
+                for pk, repo_id, number in upsert(
+                    issues, ['repo', 'number'], self.issue_fields)
+            }
+            for issue in issues:
+                issue.pk = ids[(issue.repo_id, issue.number)]
+            issue_ids = list(ids.values())
+            # fetched histories are complete, they replace webhook transfers
+            Transfer.objects.filter(issue_id__in=[
+                issue.pk for issue, transfers, _ in self.pending.values()
+                if any(not t.from_webhook for t in transfers)
+            ], from_webhook=True).delete()
+            existing = set(Transfer.objects.filter(
+                issue_id__in=issue_ids
+            ).values_list(
+                'issue_id', 'from_pipeline_id', 'to_pipeline_id',
+                'transfered_at'
+            ))
+            new_transfers = []
+            durations = []
+            for issue, transfers, pipelines in self.pending.values():
+                for transfer in transfers:
+                    transfer.issue = issue
+                    key = (
+                        issue.pk, transfer.from_pipeline_id,
+                        transfer.to_pipeline_id, transfer.transfered_at
+                    )
+                    if key not in existing:
+                        existing.add(key)
+                        new_transfers.append(transfer)
+                durations += issue.duration_rows(pipelines)
+            Transfer.objects.bulk_create(new_transfers)
+            IssueDuration.objects.filter(issue_id__in=issue_ids).delete()
+            IssueDuration.objects.bulk_create(durations)
+            self.save_labels(issues)
+        logger.info(
+            f'saved {len(issues)} issues, '
+            f'{len(new_transfers)} new transfers')
+        self.pending = {}
+
+    def save_labels(self, issues):
+        """
+        Replaces the label memberships of the saved `issues`, creating the
+        labels that are new to the repo. Label counts are refreshed per
+        repo once a sync is done, see Repo.refresh_label_counts. The chunks
+        of a sync run in parallel and may create the same labels.
+        """
+        names = defaultdict(set)
+        for issue in issues:
+            names[issue.repo_id].update(issue.labels)
+        labels = {}
+        for repo_id, repo_names in names.items():
+            existing = list(Label.objects.filter(
+                repo_id=repo_id, name__in=repo_names))
+            missing = repo_names - {label.name for label in existing}
+            if missing:
+                upsert([
+                    Label(repo_id=repo_id, name=name) for name in missing
+                ], ['repo', 'name'], [], ['issue_count'])
+                existing = list(Label.objects.filter(
+                    repo_id=repo_id, name__in=repo_names))
+            labels.update({(repo_id, l.name): l for l in existing})
+        IssueLabel.objects.filter(
+            issue_id__in=[issue.pk for issue in issues]).delete()
+        IssueLabel.objects.bulk_create([
+            IssueLabel(issue=issue, label=labels[(issue.repo_id, name)])
+            for issue in issues
+            for name in set(issue.labels)
+        ])
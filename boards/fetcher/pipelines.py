@@ -0,0 +1,193 @@
+"""
+Pipelines of the repos, kept in memory by the fetchers of a process and
+only written when the board changes.
+"""
+from threading import Lock
+from time import monotonic
+import logging
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import transaction
+from django.db.models import (
+    Case, CharField, Func, IntegerField, OuterRef, Subquery, Value, When
+)
+
+from boards.models import CLOSED_PIPELINE_NAME, Pipeline, PipelineNameMapping
+
+logger = logging.getLogger(__name__)
+
+_registries = {}
+_registries_lock = Lock()
+
+
+class Array(Func):
+    """
+    Values of a single column subquery as an array.
+    """
+    template = 'ARRAY%(expressions)s'
+
+
+class PipelineRegistry(object):
+    """
+    Pipelines of a repo by name and by board id, and the names they had
+    before being renamed. Loaded with one query, boards are compared to it
+    in memory and only their changes are written. It is valid as long as
+    the pipelines version of the repo is the one it was loaded with.
+    """
+    # seconds before a name that was missing is looked up again
+    miss_interval = 60
+
+    def __init__(self, repo):
+        self.repo = repo
+        # when names were last looked up again after a miss, see get
+        self.missing = {}
+        self.load()
+
+    def load(self):
+        self.version = self.repo.pipelines_version
+        # sync reloads the pipelines unless they were loaded for it
+        self.fresh = True
+        old_names = PipelineNameMapping.objects.filter(
+            repo=OuterRef('repo'), new_name=OuterRef('name')
+        ).values('old_name')
+        self.index(Pipeline.objects.filter(repo=self.repo).annotate(
+            old_names=Array(
+                Subquery(old_names), output_field=ArrayField(CharField()))
+        ))
+
+    def index(self, pipelines):
+        pipelines = sorted(pipelines, key=lambda p: p.order)
+        self.by_id = {p.pipeline_id: p for p in pipelines}
+        self.pipelines = {p.name: p for p in pipelines}
+        self.mapping = {
+            old_name: p.name for p in pipelines for old_name in p.old_names}
+        self.first = pipelines[0] if pipelines else None
+        # columns of the board the pipelines were last synced with
+        self.board = None
+
+    @property
+    def closed(self):
+        return self.pipelines[CLOSED_PIPELINE_NAME]
+
+    def get(self, name):
+        """
+        Pipeline named `name`, now or before being renamed. Raises KeyError
+        if there is none, after reloading the pipelines in case another
+        process added it, at most every `miss_interval` seconds per name.
+        """
+        if self.mapping.get(name, name) not in self.pipelines:
+            now = monotonic()
+            if now - self.missing.get(name, -self.miss_interval) >= (
+                    self.miss_interval):
+                self.missing[name] = now
+                self.load()
+        return self.pipelines[self.mapping.get(name, name)]
+
+    def add_mapping(self, old_name, new_name):
+        with transaction.atomic():
+            PipelineNameMapping.objects.create(
+                repo=self.repo, old_name=old_name, new_name=new_name)
+            self.repo.bump_pipelines_version()
+        self.mapping[old_name] = new_name
+        self.version = self.repo.pipelines_version
+
+    def sync(self, columns):
+        """
+        Applies the board `columns`: new pipelines are created, renamed ones
+        keep their old name in a mapping and moved ones get their new order,
+        with one query for each kind of change. Nothing is read or written
+        if the columns are the ones of the previous call, otherwise the
+        pipelines are compared as saved, unless they were just loaded.
+        """
+        board = [(column['id'], column['name']) for column in columns]
+        if board == self.board:
+            return
+        if not self.fresh:
+            # another process may have applied the board already
+            self.load()
+        created = []
+        renamed = []
+        changed = []
+        closed_id = f'{self.repo}-closed'
+        if closed_id not in self.by_id:
+            created.append(Pipeline(
+                repo=self.repo, pipeline_id=closed_id,
+                name=CLOSED_PIPELINE_NAME,
+                order=10000  # assuming there is no board with 10000 cols
+            ))
+        for order, (pipeline_id, name) in enumerate(board):
+            pipeline = self.by_id.get(pipeline_id)
+            if pipeline is None:
+                created.append(Pipeline(
+                    repo=self.repo, pipeline_id=pipeline_id, name=name,
+                    order=order))
+            elif pipeline.name != name or pipeline.order != order:
+                if pipeline.name != name:
+                    renamed.append(PipelineNameMapping(
+                        repo=self.repo, old_name=pipeline.name,
+                        new_name=name))
+                pipeline.name = name
+                pipeline.order = order
+                changed.append(pipeline)
+        try:
+            self.write(created, renamed, changed)
+        except Exception:
+            forget(self.repo)
+            raise
+        for pipeline in created:
+            pipeline.old_names = []
+        self.index(list(self.by_id.values()) + created)
+        for mapping in renamed:
+            self.mapping[mapping.old_name] = mapping.new_name
+        self.board = board
+        self.fresh = False
+
+    def write(self, created, renamed, changed):
+        if not (created or renamed or changed):
+            return
+        logger.info(
+            f'{len(created)} new, {len(renamed)} renamed and '
+            f'{len(changed) - len(renamed)} moved pipelines in {self.repo}')
+        with transaction.atomic():
+            if created:
+                Pipeline.objects.bulk_create(created)
+            if renamed:
+                PipelineNameMapping.objects.bulk_create(renamed)
+            if changed:
+                Pipeline.objects.filter(
+                    pk__in=[p.pk for p in changed]
+                ).update(
+                    name=Case(
+                        *[When(pk=p.pk, then=Value(p.name)) for p in changed],
+                        output_field=CharField()),
+                    order=Case(
+                        *[When(pk=p.pk, then=Value(p.order))
+                          for p in changed],
+                        output_field=IntegerField()),
+                )
+            self.repo.bump_pipelines_version()
+        self.version = self.repo.pipelines_version
+
+
+def get_registry(repo):
+    """
+    Pipeline registry of the repo, shared by the fetchers of the process
+    so Celery tasks reuse it from one sync to the next. It is loaded again
+    if the pipelines version of `repo` changed since.
+    """
+    with _registries_lock:
+        registry = _registries.get(repo.pk)
+        if registry is None:
+            registry = _registries[repo.pk] = PipelineRegistry(repo)
+            return registry
+        registry.repo = repo
+        if registry.version != repo.pipelines_version:
+            registry.load()
+        else:
+            registry.fresh = False
+        return registry
+
+
+def forget(repo):
+    with _registries_lock:
+        _registries.pop(repo.pk, None)
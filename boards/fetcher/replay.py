@@ -0,0 +1,334 @@
+"""
+Local stand-in for the GitHub and ZenHub APIs, serving a recorded or a
+synthetic board to the API clients through their base_url. Used to test
+and benchmark syncs without touching the real APIs.
+"""
+from datetime import timedelta
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from time import sleep, time
+from urllib.parse import parse_qs, urlparse
+import json
+import random
+import re
+
+from django.conf import settings
+from django.test import override_settings
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+from boards.models import CLOSED_PIPELINE_NAME
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _format(date):
+    return date.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class FakeBoard(object):
+    """
+    A repo as the APIs see it: the board pipelines and, for every issue,
+    its GitHub issue, ZenHub transfer events and current pipeline.
+    """
+
+    def __init__(self, name, repo_id, pipelines, issues):
+        self.name = name
+        self.repo_id = repo_id
+        self.pipelines = pipelines
+        self.issues = issues
+
+    @classmethod
+    def synthetic(cls, name='synthetic', repo_id=1, issues=100,
+                  transfers=3, pipelines=5, closed=0.3, days=365, seed=0):
+        """
+        Every issue is moved `transfers` times on average between the
+        `pipelines` board pipelines, `closed` of them end up closed.
+        """
+        rand = random.Random(seed)
+        board = [
+            {'id': f'pipeline-{i}', 'name': f'Pipeline {i}'}
+            for i in range(pipelines)
+        ]
+        end = now()
+        fake_issues = {}
+        for number in range(1, issues + 1):
+            at = end - timedelta(seconds=rand.uniform(0, days * 86400))
+            github_issue = {
+                'number': number,
+                'title': f'Synthetic issue {number}',
+                'labels': [
+                    {'name': label}
+                    for label in rand.sample(['bug', 'feature', 'ui'], 1)
+                ],
+                'created_at': _format(at),
+                'updated_at': _format(at),
+                'closed_at': None,
+                'state': 'open',
+            }
+            position = 0
+            events = []
+            for _ in range(rand.randint(0, 2 * transfers)):
+                at += timedelta(seconds=rand.expovariate(1 / 86400))
+                if at >= end:
+                    break
+                to = rand.choice(
+                    [i for i in range(pipelines) if i != position])
+                events.append({
+                    'type': 'transferIssue',
+                    'created_at': _format(at),
+                    'from_pipeline': {'name': board[position]['name']},
+                    'to_pipeline': {'name': board[to]['name']},
+                })
+                position = to
+            pipeline = board[position]['name']
+            at += timedelta(seconds=rand.expovariate(1 / 86400))
+            if rand.random() < closed and at < end:
+                pipeline = CLOSED_PIPELINE_NAME
+                github_issue.update({
+                    'state': 'closed',
+                    'closed_at': _format(at),
+                    'updated_at': _format(at),
+                })
+            fake_issues[number] = {
+                'github': github_issue,
+                'events': events,
+                'pipeline': pipeline,
+            }
+        return cls(name, repo_id, board, fake_issues)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        issues = {int(k): v for k, v in data['issues'].items()}
+        return cls(data['name'], data['repo_id'], data['pipelines'], issues)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'name': self.name,
+                'repo_id': self.repo_id,
+                'pipelines': self.pipelines,
+                'issues': self.issues,
+            }, f)
+
+    def move(self, number, pipeline_name, at=None):
+        issue = self.issues[number]
+        issue['events'].append({
+            'type': 'transferIssue',
+            'created_at': _format(at or now()),
+            'from_pipeline': {'name': issue['pipeline']},
+            'to_pipeline': {'name': pipeline_name},
+        })
+        issue['pipeline'] = pipeline_name
+
+    def update(self, number, at=None, **fields):
+        """
+        Changes GitHub fields of an issue, like its title.
+        """
+        github_issue = self.issues[number]['github']
+        github_issue.update(fields, updated_at=_format(at or now()))
+
+    def get_board(self):
+        return {'pipelines': [
+            dict(pipeline, issues=[
+                {'issue_number': number, 'estimate': None}
+                for number, issue in sorted(self.issues.items())
+                if issue['pipeline'] == pipeline['name']
+            ])
+            for pipeline in self.pipelines
+        ]}
+
+    def get_github_issues(self, since=None, page=1, per_page=30, **params):
+        issues = [
+            issue['github'] for _, issue in sorted(self.issues.items())
+            if not since or parse_datetime(
+                issue['github']['updated_at']) >= parse_datetime(since)
+        ]
+        state = params.get('state', 'open')
+        if state != 'all':
+            issues = [i for i in issues if i['state'] == state]
+        start = (page - 1) * per_page
+        return issues[start:start + per_page]
+
+    def get_zenhub_issue(self, number):
+        return {'pipeline': {'name': self.issues[number]['pipeline']}}
+
+
+class FakeApiServer(object):
+    """
+    Serves a FakeBoard over HTTP on localhost, GitHub under `github_url`
+    and ZenHub under `zenhub_url`. Responses have ETags and rate limit
+    headers, and are delayed by `latency` seconds.
+    """
+    routes = [
+        (r'^/github/repos/[^/]+/(?P<repo>[^/]+)/issues/(?P<number>\d+)$',
+         'github_issue'),
+        (r'^/github/repos/[^/]+/(?P<repo>[^/]+)/issues$', 'github_issues'),
+        (r'^/zenhub/p1/repositories/(?P<repo_id>\d+)/board$', 'board'),
+        (r'^/zenhub/p1/repositories/(?P<repo_id>\d+)/issues/'
+         r'(?P<number>\d+)/events$', 'events'),
+        (r'^/zenhub/p1/repositories/(?P<repo_id>\d+)/issues/'
+         r'(?P<number>\d+)$', 'zenhub_issue'),
+    ]
+
+    def __init__(self, board, latency=0, rate_limit=5000, rate_window=3600):
+        self.board = board
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.calls = {'github': 0, 'zenhub': 0}
+        self._window_start = time()
+        self._window_calls = {'github': 0, 'zenhub': 0}
+        self._lock = Lock()
+        self.server = ThreadingHTTPServer(
+            ('127.0.0.1', 0), self._handler_class())
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.github_url = f'{self.url}/github'
+        self.zenhub_url = f'{self.url}/zenhub/p1'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def settings(self, **options):
+        """
+        Settings pointing the API clients to this server.
+        """
+        return override_settings(
+            GITHUB=dict(settings.GITHUB, base_url=self.github_url),
+            ZENHUB=dict(settings.ZENHUB, base_url=self.zenhub_url),
+            **options)
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = {'github': 0, 'zenhub': 0}
+
+    def respond(self, path, query):
+        """
+        Returns the api and body of a request, body is None if not found.
+        """
+        for pattern, name in self.routes:
+            match = re.match(pattern, path)
+            if match:
+                break
+        else:
+            return None, None
+        api = 'github' if name.startswith('github') else 'zenhub'
+        params = match.groupdict()
+        board = self.board
+        if 'repo' in params and params['repo'] != board.name:
+            return api, None
+        if 'repo_id' in params and int(params['repo_id']) != board.repo_id:
+            return api, None
+        number = int(params['number']) if 'number' in params else None
+        if number is not None and number not in board.issues:
+            return api, None
+        if name == 'github_issue':
+            return api, board.issues[number]['github']
+        if name == 'github_issues':
+            return api, board.get_github_issues(
+                since=query.get('since'), page=int(query.get('page', 1)),
+                per_page=int(query.get('per_page', 30)),
+                state=query.get('state', 'open'))
+        if name == 'board':
+            return api, board.get_board()
+        if name == 'events':
+            return api, board.issues[number]['events']
+        return api, board.get_zenhub_issue(number)
+
+    def count(self, api):
+        """
+        Counts a call, returns the calls left in the rate limit window and
+        when it resets.
+        """
+        with self._lock:
+            if time() - self._window_start > self.rate_window:
+                self._window_start = time()
+                self._window_calls = {'github': 0, 'zenhub': 0}
+            self.calls[api] += 1
+            self._window_calls[api] += 1
+            remaining = max(self.rate_limit - self._window_calls[api], 0)
+            return remaining, int(self._window_start + self.rate_window)
+
+    def _handler_class(self):
+        api_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                api, data = api_server.respond(url.path, query)
+                if api_server.latency:
+                    sleep(api_server.latency)
+                body = json.dumps(data).encode('utf-8')
+                etag = f'"{sha1(body).hexdigest()}"'
+                status = 404 if data is None else 200
+                if status == 200 and self.headers.get(
+                        'If-None-Match') == etag:
+                    status, body = 304, b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                if api:
+                    remaining, reset_at = api_server.count(api)
+                    self.send_header(
+                        'X-RateLimit-Limit', str(api_server.rate_limit))
+                    self.send_header('X-RateLimit-Remaining', str(remaining))
+                    self.send_header(
+                        'X-RateLimit-Used',
+                        str(api_server.rate_limit - remaining))
+                    self.send_header('X-RateLimit-Reset', str(reset_at))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def record_board(github, zenhub, repo, limit=None):
+    """
+    Records the board of `repo` and its issues from the real APIs into a
+    FakeBoard, at most `limit` issues.
+    """
+    board = zenhub.get_board(repo.repo_id)
+    pipelines = [
+        {'id': p['id'], 'name': p['name']} for p in board['pipelines']]
+    numbers = sorted(
+        item['issue_number']
+        for pipeline in board['pipelines']
+        for item in pipeline['issues']
+    )[:limit]
+    issues = {}
+    for number in numbers:
+        issues[number] = {
+            'github': github.get_issue(repo.name, number),
+            'events': zenhub.get_issue_events(repo.repo_id, number),
+            'pipeline': zenhub.get_issue(
+                repo.repo_id, number)['pipeline']['name'],
+        }
+    return FakeBoard(repo.name, repo.repo_id, pipelines, issues)
@@ -0,0 +1,102 @@
+from collections import defaultdict
+from threading import Lock
+from urllib.parse import urlsplit
+import logging
+import re
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+_sessions = {}
+_sessions_lock = Lock()
+
+
+def get_session(name):
+    """
+    Keep-alive session of an API, shared by every client of the process so
+    connections survive between fetchers and Celery tasks.
+    """
+    with _sessions_lock:
+        if name not in _sessions:
+            _sessions[name] = create_session()
+        return _sessions[name]
+
+
+def create_session():
+    options = settings.FETCHER_HTTP
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=options['pool_size'],
+        pool_maxsize=options['pool_size'],
+        max_retries=Retry(
+            total=options['retries'],
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False
+        )
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    return session
+
+
+def connection_counts(session):
+    """
+    (connections opened, requests sent) over all pools of the session.
+    """
+    opened = sent = 0
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            if pool:
+                opened += pool.num_connections
+                sent += pool.num_requests
+    return opened, sent
+
+
+class RequestStats(object):
+    """
+    Per endpoint request counts and latencies of an API.
+    """
+    id_pattern = re.compile(r'/\d+(?=/|$)')
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = defaultdict(int)
+            self.seconds = defaultdict(float)
+            self.slowest = defaultdict(float)
+
+    def endpoint(self, method, url):
+        return f'{method} {self.id_pattern.sub("/:id", urlsplit(url).path)}'
+
+    def record(self, method, url, elapsed):
+        endpoint = self.endpoint(method, url)
+        seconds = elapsed.total_seconds()
+        with self._lock:
+            self.counts[endpoint] += 1
+            self.seconds[endpoint] += seconds
+            self.slowest[endpoint] = max(self.slowest[endpoint], seconds)
+
+    def report(self, session):
+        opened, sent = connection_counts(session)
+        logger.info(
+            f'{self.name}: {sent} requests over {opened} connections, '
+            f'{sent - opened} reused')
+        with self._lock:
+            for endpoint, count in sorted(self.counts.items()):
+                average = self.seconds[endpoint] / count
+                logger.info(
+                    f'{self.name} {endpoint}: {count} requests, '
+                    f'{average * 1000:.0f}ms average, '
+                    f'{self.slowest[endpoint] * 1000:.0f}ms slowest')
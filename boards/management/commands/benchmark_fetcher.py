@@ -0,0 +1,96 @@
+from time import perf_counter
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from boards.fetcher.fetch import Fetcher
+from boards.fetcher.replay import FakeApiServer, FakeBoard
+from boards.models import Repo
+
+# GitHub ids start at 1, the benchmark repo can not collide with a real one
+BENCHMARK_REPO_ID = 0
+BENCHMARK_REPO_NAME = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        'Syncs a synthetic or recorded board from a local fake of the APIs '
+        'and reports the throughput, API calls and queries of full and '
+        'incremental syncs. Rolled back unless --keep.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--issues', type=int, default=500)
+        parser.add_argument('--transfers', type=int, default=3)
+        parser.add_argument('--pipelines', type=int, default=6)
+        parser.add_argument(
+            '--board', type=str, dest='board', required=False,
+            help='Board recorded with record_board instead of a synthetic one')
+        parser.add_argument(
+            '--latency', type=float, default=0.05,
+            help='Seconds added to every API response')
+        parser.add_argument('--workers', type=int, required=False)
+        parser.add_argument(
+            '--changes', type=int, default=10,
+            help='Issues moved before the incremental sync')
+        parser.add_argument(
+            '--keep', action='store_true', default=False,
+            help='Keep the synced repo')
+
+    def run(self, name, server, repo, **kwargs):
+        server.reset_calls()
+        with CaptureQueriesContext(connection) as queries:
+            started = perf_counter()
+            Fetcher([repo.name], **kwargs).sync()
+            wall_time = perf_counter() - started
+        repo.refresh_from_db()
+        issues = repo.synced_issues
+        per_issue = max(issues, 1)
+        self.stdout.write(
+            f'{name}: {issues} issues in {wall_time:.2f}s, '
+            f'{issues / wall_time:.1f} issues/s, '
+            f'{server.total_calls} API calls '
+            f'({server.total_calls / per_issue:.2f}/issue), '
+            f'{len(queries)} queries ({len(queries) / per_issue:.2f}/issue)')
+
+    def handle(self, *args, **options):
+        if options['board']:
+            board = FakeBoard.load(options['board'])
+        else:
+            board = FakeBoard.synthetic(
+                issues=options['issues'],
+                transfers=options['transfers'],
+                pipelines=options['pipelines'])
+        # recorded boards are replayed under the reserved repo
+        board.name, board.repo_id = BENCHMARK_REPO_NAME, BENCHMARK_REPO_ID
+        if Repo.objects.filter(
+                Q(name=board.name) | Q(repo_id=board.repo_id)).exists():
+            raise CommandError(
+                f'A "{board.name}" repo or repo {board.repo_id} already '
+                'exists, delete the repo kept by a previous --keep run')
+        cache = tempfile.TemporaryDirectory()
+        server = FakeApiServer(
+            board, latency=options['latency'], rate_limit=10 ** 6)
+        with server, cache, server.settings(FETCHER_CACHE={
+                'directory': cache.name,
+                'ttl': 3600,
+                'max_size': 1024 ** 3}), transaction.atomic():
+            repo = Repo.objects.create(name=board.name, repo_id=board.repo_id)
+            workers = options['workers']
+            self.run('full sync', server, repo, full=True, workers=workers)
+            self.run('unchanged', server, repo, workers=workers)
+            open_issues = [
+                number for number, issue in sorted(board.issues.items())
+                if issue['pipeline'] in {p['name'] for p in board.pipelines}
+            ]
+            for number in open_issues[:options['changes']]:
+                current = board.issues[number]['pipeline']
+                board.move(number, next(
+                    p['name'] for p in board.pipelines
+                    if p['name'] != current))
+            self.run('incremental sync', server, repo, workers=workers)
+            if not options['keep']:
+                transaction.set_rollback(True)
@@ -0,0 +1,105 @@
+from time import perf_counter
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from zenhub_charts import profiling
+
+# What every process runs before it can do any work, in a fresh interpreter.
+# Workers and commands run the system checks when they start.
+ENTRY_POINTS = {
+    'web': (
+        'zenhub_charts.settings',
+        'import django; django.setup()\n'
+        'from django.urls import get_resolver\n'
+        'get_resolver().url_patterns'
+    ),
+    'worker': (
+        'zenhub_charts.settings_worker',
+        'import django; django.setup()\n'
+        'from zenhub_charts.celery import app\n'
+        'app.loader.import_default_modules()\n'
+        'from django.core.checks import run_checks\n'
+        'run_checks()'
+    ),
+    'command': (
+        'zenhub_charts.settings_worker',
+        'import django; django.setup()\n'
+        'from django.core.management import load_command_class\n'
+        "load_command_class('boards', 'fetch')\n"
+        'from django.core.checks import run_checks\n'
+        'run_checks()'
+    ),
+}
+# Modules worth knowing whether an entry point loads them
+HEAVY_MODULES = (
+    'numpy', 'requests', 'backoff', 'redis', 'django.contrib.admin',
+    'charts.views', 'boards.fetcher.fetch',
+)
+SCRIPT = '''
+import cProfile, json, sys
+profile = cProfile.Profile() if sys.argv[1] else None
+if profile:
+    profile.enable()
+exec(sys.argv[2])
+if profile:
+    profile.disable()
+    profile.dump_stats(sys.argv[1])
+print(json.dumps([m for m in sys.argv[3:] if m in sys.modules]))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Starts the web, worker and command entry points in fresh '
+        'interpreters and reports their cold start time and the heavy '
+        'modules they load, with a cProfile of the imports if --profile.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument(
+            '--entry-points', type=str, default=','.join(ENTRY_POINTS),
+            help='Comma separated entry points')
+        parser.add_argument(
+            '--profile', action='store_true', default=False,
+            help='Print the slowest imports of every entry point')
+
+    def start(self, settings_module, code, profile_path=''):
+        """
+        Runs `code` in a new interpreter, returns its wall time and the
+        heavy modules it loaded.
+        """
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+        started = perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', SCRIPT, profile_path, code] +
+            list(HEAVY_MODULES),
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, universal_newlines=True)
+        seconds = perf_counter() - started
+        if result.returncode:
+            raise CommandError(result.stderr)
+        return seconds, json.loads(result.stdout.splitlines()[-1])
+
+    def handle(self, *args, **options):
+        for name in options['entry_points'].split(','):
+            settings_module, code = ENTRY_POINTS[name]
+            timings = []
+            for _ in range(options['runs']):
+                seconds, loaded = self.start(settings_module, code)
+                timings.append(seconds)
+            self.stdout.write(
+                f'{name:<8} {statistics.median(timings) * 1000:>6.0f}ms '
+                f'median {min(timings) * 1000:>6.0f}ms best '
+                f'({settings_module}), loads {", ".join(loaded) or "-"}')
+            if options['profile']:
+                with tempfile.NamedTemporaryFile(suffix='.prof') as stats:
+                    self.start(settings_module, code, stats.name)
+                    self.stdout.write(profiling.report(stats.name, limit=25))
@@ -20,6 +20,21 @@ class Command(BaseCommand):
             dest='fix',
             default=False
         )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            dest='full',
+            default=False,
+            help='Fetch every issue instead of the ones changed since the '
+                 'last sync'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            dest='workers',
+            required=False,
+            help='Number of issues fetched concurrently'
+        )
         parser.add_argument(
             '--repo',
             type=str,
@@ -47,14 +62,15 @@ class Command(BaseCommand):
                 )
                 print('created ', github_repo['name'])
 
-        repos = Repo.objects.all()
-        repo_name = options['repo']        
-        if repo_name:
-            repos = repos.filter(name=repo_name)
-        for repo in repos:
-            fetcher = Fetcher(
-                [repo.name],
-                initial=options['initial'],
-                fix=options['initial'] or options['fix']
-            )
-            fetcher.sync()
+        repo_name = options['repo']
+        # one fetcher and its clients sync the repos one after the other
+        fetcher = Fetcher(
+            [repo_name] if repo_name else None,
+            initial=options['initial'],
+            fix=options['initial'] or options['fix'],
+            full=options['full'],
+            workers=options['workers'],
+            github=self.github,
+            zenhub=self.zenhub,
+        )
+        fetcher.sync()
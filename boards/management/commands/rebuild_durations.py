@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from boards.fetcher.fetch import Fetcher
+from boards.models import Repo
+
+
+class Command(BaseCommand):
+    help = 'Recalculates issue durations from the saved transfers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repo',
+            type=str,
+            dest='repo',
+            required=False
+        )
+
+    def handle(self, *args, **options):
+        fetcher = Fetcher()
+        repos = Repo.objects.all()
+        if options['repo']:
+            repos = repos.filter(name=options['repo'])
+        for repo in repos:
+            fetcher.rebuild_durations(repo)
+            self.stdout.write(f'rebuilt durations of {repo}')
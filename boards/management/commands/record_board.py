@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from boards.fetcher.clients import GithubClient, ZenhubClient
+from boards.fetcher.replay import record_board
+from boards.models import Repo
+
+
+class Command(BaseCommand):
+    help = (
+        'Records the board and issues of a repo from GitHub and ZenHub, to '
+        'replay them with benchmark_fetcher --board'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repo', type=str, dest='repo', required=True)
+        parser.add_argument(
+            '--output', type=str, dest='output', required=True)
+        parser.add_argument(
+            '--limit', type=int, dest='limit', required=False,
+            help='Record at most this many issues')
+
+    def handle(self, *args, **options):
+        repo = Repo.objects.get(name=options['repo'])
+        board = record_board(
+            GithubClient(**settings.GITHUB), ZenhubClient(**settings.ZENHUB),
+            repo, options['limit'])
+        board.save(options['output'])
+        self.stdout.write(f'recorded {len(board.issues)} issues of {repo}')
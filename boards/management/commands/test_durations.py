@@ -29,3 +29,4 @@ class Command(BaseCommand):
         for transfer in issue.transfers.order_by('transfered_at'):
             print(transfer)
         print(fetcher.calculate_durations(issue))
+        print(issue.live_durations())
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 14:49
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_cycle_times(apps, schema_editor):
+    Issue = apps.get_model('boards', 'Issue')
+    IssueDuration = apps.get_model('boards', 'IssueDuration')
+    Pipeline = apps.get_model('boards', 'Pipeline')
+    PipelineNameMapping = apps.get_model('boards', 'PipelineNameMapping')
+    pipelines = {
+        (p.repo_id, p.name): p for p in Pipeline.objects.all()
+    }
+    mapping = {
+        (m.repo_id, m.old_name): m.new_name
+        for m in PipelineNameMapping.objects.all()
+    }
+    seconds_by_pipeline = {}
+    for issue in Issue.objects.iterator():
+        issue.cycle_time = sum(issue.durations.values())
+        issue.save(update_fields=['cycle_time'])
+        for name, seconds in issue.durations.items():
+            name = mapping.get((issue.repo_id, name), name)
+            pipeline = pipelines.get((issue.repo_id, name))
+            if pipeline:
+                key = (issue.pk, pipeline.pk)
+                seconds_by_pipeline[key] = (
+                    seconds_by_pipeline.get(key, 0) + seconds)
+    IssueDuration.objects.bulk_create([
+        IssueDuration(issue_id=issue_id, pipeline_id=pipeline_id,
+                      seconds=seconds)
+        for (issue_id, pipeline_id), seconds in seconds_by_pipeline.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IssueDuration',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seconds', models.FloatField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='issue',
+            name='cycle_time',
+            field=models.FloatField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='issueduration',
+            name='issue',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pipeline_durations', to='boards.Issue'),
+        ),
+        migrations.AddField(
+            model_name='issueduration',
+            name='pipeline',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='issue_durations', to='boards.Pipeline'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='issueduration',
+            unique_together=set([('issue', 'pipeline')]),
+        ),
+        migrations.RunPython(fill_cycle_times, migrations.RunPython.noop),
+    ]
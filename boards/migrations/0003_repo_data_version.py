@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 14:51
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0002_issue_cycle_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repo',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 14:51
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0003_repo_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repo',
+            name='synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
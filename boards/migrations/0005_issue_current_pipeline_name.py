@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 14:56
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Prefetch
+
+
+def remove_open_durations(apps, schema_editor):
+    """
+    Durations used to include the time spent in the current pipeline until
+    the sync, rebuild them from the transfers without it.
+    """
+    Issue = apps.get_model('boards', 'Issue')
+    IssueDuration = apps.get_model('boards', 'IssueDuration')
+    Transfer = apps.get_model('boards', 'Transfer')
+    ordered_transfers = Prefetch(
+        'transfers',
+        queryset=Transfer.objects.select_related(
+            'to_pipeline').order_by('transfered_at'))
+    issue_durations = []
+    for issue in Issue.objects.prefetch_related(ordered_transfers):
+        transfers = list(issue.transfers.all())
+        if not transfers:
+            continue
+        durations = {}
+        pipelines = {}
+        for previous, transfer in zip(transfers, transfers[1:]):
+            if not previous.to_pipeline:
+                continue
+            name = previous.to_pipeline.name
+            delta = transfer.transfered_at - previous.transfered_at
+            durations[name] = durations.get(name, 0) + delta.total_seconds()
+            pipelines[name] = previous.to_pipeline
+        last = transfers[-1]
+        issue.durations = durations
+        issue.cycle_time = sum(durations.values())
+        issue.latest_transfer_date = last.transfered_at
+        issue.current_pipeline_name = (
+            last.to_pipeline.name if last.to_pipeline else '')
+        issue.save(update_fields=[
+            'durations', 'cycle_time', 'latest_transfer_date',
+            'current_pipeline_name'
+        ])
+        issue_durations += [
+            IssueDuration(
+                issue=issue, pipeline=pipelines[name], seconds=seconds)
+            for name, seconds in durations.items()
+        ]
+    IssueDuration.objects.all().delete()
+    IssueDuration.objects.bulk_create(issue_durations, batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0004_repo_synced_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='current_pipeline_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(remove_open_durations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 14:59
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_labels(apps, schema_editor):
+    Issue = apps.get_model('boards', 'Issue')
+    IssueLabel = apps.get_model('boards', 'IssueLabel')
+    Label = apps.get_model('boards', 'Label')
+    members = {}
+    for repo_id, issue_id, names in Issue.objects.values_list(
+            'repo_id', 'pk', 'labels').iterator():
+        for name in set(names):
+            members.setdefault((repo_id, name), []).append(issue_id)
+    labels = Label.objects.bulk_create([
+        Label(repo_id=repo_id, name=name, issue_count=len(issue_ids))
+        for (repo_id, name), issue_ids in members.items()
+    ])
+    IssueLabel.objects.bulk_create([
+        IssueLabel(label=label, issue_id=issue_id)
+        for label in labels
+        for issue_id in members[(label.repo_id, label.name)]
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0006_issue_chart_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IssueLabel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Label',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('issue_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='issue',
+            name='issue_labels',
+        ),
+        migrations.AlterField(
+            model_name='issue',
+            name='labels',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=100), default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='label',
+            name='repo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='labels', to='boards.Repo'),
+        ),
+        migrations.AddField(
+            model_name='issuelabel',
+            name='issue',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='issue_labels', to='boards.Issue'),
+        ),
+        migrations.AddField(
+            model_name='issuelabel',
+            name='label',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='issue_labels', to='boards.Label'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='label',
+            unique_together=set([('repo', 'name')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='issuelabel',
+            unique_together=set([('label', 'issue')]),
+        ),
+        migrations.RunPython(fill_labels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 15:06
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0007_labels'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repo',
+            name='sync_duration',
+            field=models.FloatField(blank=True, help_text='seconds', null=True),
+        ),
+        migrations.AddField(
+            model_name='repo',
+            name='synced_issues',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 15:09
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0008_repo_sync_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transfer',
+            name='from_webhook',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 16:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0009_transfer_from_webhook'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repo',
+            name='pipelines_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,16 +1,61 @@
 from django.db import models
 from django.conf import settings
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
 from django.contrib.postgres.fields import JSONField
 from django.contrib.postgres.fields import ArrayField
 
+CLOSED_PIPELINE_NAME = 'Closed'
+
 
 class Repo(models.Model):
     repo_id = models.PositiveIntegerField(unique=True)
     name = models.CharField(max_length=255)
+    # bumped whenever a sync writes new data, versions cached charts
+    data_version = models.PositiveIntegerField(default=0)
+    # bumped whenever pipelines or name mappings change, versions the
+    # pipelines kept in memory by the fetchers
+    pipelines_version = models.PositiveIntegerField(default=0)
+    # start of the latest successful sync, incremental syncs continue from it
+    synced_at = models.DateTimeField(null=True, blank=True)
+    sync_duration = models.FloatField(
+        null=True, blank=True, help_text='seconds')
+    synced_issues = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
 
+    @property
+    def sync_throughput(self):
+        """
+        Issues fetched per second during the latest sync.
+        """
+        if not self.sync_duration:
+            return 0
+        return self.synced_issues / self.sync_duration
+
+    @property
+    def github_url(self):
+        owner = settings.GITHUB['owner']
+        return f'https://github.com/{owner}/{self.name}'
+
+    def bump_data_version(self):
+        Repo.objects.filter(pk=self.pk).update(
+            data_version=models.F('data_version') + 1)
+
+    def bump_pipelines_version(self):
+        Repo.objects.filter(pk=self.pk).update(
+            pipelines_version=models.F('pipelines_version') + 1)
+        self.refresh_from_db(fields=['pipelines_version'])
+
+    def refresh_label_counts(self):
+        counts = IssueLabel.objects.filter(
+            label=models.OuterRef('pk')
+        ).order_by().values('label').annotate(
+            count=models.Count('pk')).values('count')
+        self.labels.update(issue_count=Coalesce(
+            models.Subquery(counts, output_field=models.IntegerField()), 0))
+
 
 class Pipeline(models.Model):
     name = models.CharField(max_length=255)
@@ -46,25 +91,121 @@ class Issue(models.Model):
     number = models.PositiveIntegerField()
     title = models.CharField(max_length=255)
     durations = JSONField(default=dict)
+    cycle_time = models.FloatField(null=True, db_index=True)
     latest_pipeline_name = models.CharField(max_length=255)
     latest_transfer_date = models.DateTimeField()
-    labels = ArrayField(
-        ArrayField(models.CharField(max_length=100)),
-        default=list)
+    # Pipeline of the latest transfer. Durations only hold the time until
+    # latest_transfer_date, the time spent here since is added on read.
+    current_pipeline_name = models.CharField(
+        max_length=255, blank=True, default='')
+    labels = ArrayField(models.CharField(max_length=100), default=list)
 
     def __str__(self):
         return f'{self.repo}/{self.title}/{self.number}'
 
+    @property
+    def is_open(self):
+        return self.current_pipeline_name not in ('', CLOSED_PIPELINE_NAME)
+
+    def open_duration(self, at=None):
+        """
+        Seconds spent in the current pipeline, 0 once the issue is closed.
+        """
+        if not self.is_open:
+            return 0
+        return ((at or now()) - self.latest_transfer_date).total_seconds()
+
+    def live_durations(self, at=None, age=None):
+        """
+        Durations until `at`. The seconds spent in the current pipeline can
+        be given as `age` when computed in bulk, see
+        charts.stats.open_durations.
+        """
+        durations = dict(self.durations)
+        if self.is_open:
+            name = self.current_pipeline_name
+            if age is None:
+                age = self.open_duration(at)
+            durations[name] = durations.get(name, 0) + age
+        return durations
+
+    def set_durations(self, durations):
+        """
+        Durations are also stored as a total cycle time and as one row per
+        pipeline (see duration_rows), they have to be updated together.
+        Only time between transfers is stored, see live_durations.
+        """
+        self.durations = durations
+        self.cycle_time = sum(durations.values())
+
+    def duration_rows(self, pipelines):
+        """
+        Unsaved IssueDuration rows of the durations.
+        `pipelines` maps pipeline names to pipelines of the repo.
+        """
+        return [
+            IssueDuration(
+                issue=self, pipeline=pipelines[name], seconds=seconds)
+            for name, seconds in self.durations.items()
+            if name in pipelines
+        ]
+
     @property
     def github_url(self):
-        owner = settings.GITHUB['owner']
-        return (
-            f'https://github.com/{owner}/{self.repo.name}'
-            f'/issues/{self.number}'
-        )
+        return f'{self.repo.github_url}/issues/{self.number}'
 
     class Meta:
         unique_together = (('repo', 'number'),)
+        indexes = [
+            # chart queries: one repo, a date range, ordered by date
+            models.Index(
+                fields=['repo', 'latest_transfer_date'],
+                name='issue_repo_transfer_date'),
+        ]
+
+
+class Label(models.Model):
+    """
+    Labels used in a repo, with the number of issues they are on.
+    """
+    repo = models.ForeignKey('Repo', related_name='labels')
+    name = models.CharField(max_length=100)
+    issue_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        unique_together = (('repo', 'name'),)
+
+
+class IssueLabel(models.Model):
+    """
+    Normalized copy of Issue.labels, for filtering issues by label.
+    """
+    issue = models.ForeignKey('Issue', related_name='issue_labels')
+    label = models.ForeignKey('Label', related_name='issue_labels')
+
+    def __str__(self):
+        return f'({self.issue}) {self.label}'
+
+    class Meta:
+        unique_together = (('label', 'issue'),)
+
+
+class IssueDuration(models.Model):
+    """
+    Seconds an issue spent in a pipeline, normalized from Issue.durations.
+    """
+    issue = models.ForeignKey('Issue', related_name='pipeline_durations')
+    pipeline = models.ForeignKey('Pipeline', related_name='issue_durations')
+    seconds = models.FloatField()
+
+    def __str__(self):
+        return f'({self.issue}) {self.pipeline}: {self.seconds}'
+
+    class Meta:
+        unique_together = (('issue', 'pipeline'),)
 
 
 class Transfer(models.Model):
@@ -74,6 +215,9 @@ class Transfer(models.Model):
     to_pipeline = models.ForeignKey(
         'Pipeline', related_name='to_transfers', null=True)
     transfered_at = models.DateTimeField()
+    # made from a ZenHub webhook, dated when it was received; replaced by
+    # the ZenHub event when the issue is fetched again
+    from_webhook = models.BooleanField(default=False)
 
     def __str__(self):
         return (
@@ -0,0 +1,103 @@
+"""
+Synthetic boards for benchmarks: repos with issues that moved through the
+pipelines, with their transfers, durations and labels.
+"""
+from datetime import timedelta
+import random
+
+from django.db import connection, transaction
+from django.utils.timezone import now
+
+from boards.fetcher.persistence import IssueWriter
+from boards.models import (
+    CLOSED_PIPELINE_NAME, Issue, IssueDuration, IssueLabel, Pipeline, Repo,
+    Transfer
+)
+
+PIPELINE_NAMES = [
+    'New Issues', 'Backlog', 'Icebox', 'In Progress', 'Review', 'QA',
+    'Done', 'Blocked', 'Staging', 'Released',
+]
+LABELS = ['bug', 'feature', 'enhancement', 'ops', 'ui', 'api', 'urgent']
+
+
+@transaction.atomic
+def create_repo(name, issues=1000, pipelines=6, days=730, closed=0.7,
+                seed=0, batch_size=5000, repo_id=None):
+    """
+    Creates a repo with `issues` issues created over the last `days` days.
+    Each issue moves forward through the first `pipelines` pipelines,
+    sometimes back, and `closed` of them end up closed. Repos created
+    with the same `seed` need distinct `repo_id`s.
+    """
+    rand = random.Random(seed)
+    repo = Repo.objects.create(
+        repo_id=repo_id or rand.randint(10 ** 8, 10 ** 9), name=name)
+    names = [
+        PIPELINE_NAMES[i % len(PIPELINE_NAMES)] + (
+            f' {i // len(PIPELINE_NAMES)}' if i >= len(PIPELINE_NAMES) else '')
+        for i in range(pipelines)
+    ]
+    board = Pipeline.objects.bulk_create([
+        Pipeline(repo=repo, name=n, pipeline_id=f'{name}-{i}', order=i)
+        for i, n in enumerate(names)
+    ])
+    closed_pipeline = Pipeline.objects.create(
+        repo=repo, name=CLOSED_PIPELINE_NAME,
+        pipeline_id=f'{repo}-closed', order=10000)
+    end = now()
+
+    def histories(start, stop):
+        for number in range(start, stop):
+            created_at = end - timedelta(seconds=rand.uniform(0, days * 86400))
+            issue = Issue(
+                repo=repo, number=number, title=f'Synthetic issue {number}',
+                labels=rand.sample(LABELS, rand.randint(0, 3)),
+            )
+            history = [(created_at, None, board[0])]
+            position = 0
+            at = created_at
+            for _ in range(rand.randint(0, 2 * pipelines)):
+                at += timedelta(seconds=rand.expovariate(1 / (2 * 86400)))
+                if at >= end or position == len(board) - 1:
+                    break
+                step = 1 if rand.random() < 0.85 or not position else -1
+                history.append((at, board[position], board[position + step]))
+                position += step
+            if rand.random() < closed:
+                at += timedelta(seconds=rand.expovariate(1 / 86400))
+                if at < end:
+                    history.append((at, board[position], closed_pipeline))
+            durations = {}
+            for (since, _, pipeline), (until, _, _) in zip(
+                    history, history[1:]):
+                durations[pipeline.name] = (
+                    durations.get(pipeline.name, 0) +
+                    (until - since).total_seconds())
+            issue.set_durations(durations)
+            issue.latest_transfer_date = history[-1][0]
+            issue.latest_pipeline_name = history[-1][2].name
+            issue.current_pipeline_name = history[-1][2].name
+            yield issue, history
+
+    pipelines_by_name = {p.name: p for p in board + [closed_pipeline]}
+    for start in range(1, issues + 1, batch_size):
+        batch = list(histories(start, min(start + batch_size, issues + 1)))
+        Issue.objects.bulk_create([issue for issue, _ in batch])
+        Transfer.objects.bulk_create([
+            Transfer(issue=issue, transfered_at=at,
+                     from_pipeline=from_pipeline, to_pipeline=to_pipeline)
+            for issue, history in batch
+            for at, from_pipeline, to_pipeline in history
+        ], batch_size=batch_size)
+        IssueDuration.objects.bulk_create([
+            row
+            for issue, _ in batch
+            for row in issue.duration_rows(pipelines_by_name)
+        ], batch_size=batch_size)
+        IssueWriter().save_labels([issue for issue, _ in batch])
+    repo.refresh_label_counts()
+    with connection.cursor() as cursor:
+        for model in (Issue, Transfer, IssueDuration, IssueLabel):
+            cursor.execute(f'ANALYZE {model._meta.db_table}')
+    return repo
@@ -0,0 +1,61 @@
+import logging
+
+from celery import shared_task
+from django.conf import settings
+
+from boards.fetcher.locks import RepoLock
+from boards.models import Repo
+from boards.webhooks import dedupe_events, webhook_buffer
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_webhook_event(repo_name, event):
+    """
+    Buffers a webhook event, its batch is applied after
+    WEBHOOKS['batch_delay'] seconds.
+    """
+    if webhook_buffer.push(repo_name, event):
+        apply_webhook_events.apply_async(
+            (repo_name,), countdown=webhook_buffer.delay)
+
+
+@shared_task(name='Apply webhook events', bind=True,
+             max_retries=settings.WEBHOOKS['max_retries'])
+def apply_webhook_events(self, repo_name):
+    """
+    Applies the buffered events of the repo, they are only removed from
+    the buffer once applied. One task per repo is scheduled at a time.
+    """
+    lock = RepoLock(repo_name)
+    if not lock.acquire():
+        # a sync is running, the events wait in the buffer
+        if self.request.retries < self.max_retries:
+            webhook_buffer.keep_scheduled(repo_name)
+            raise self.retry(countdown=webhook_buffer.delay)
+        logger.warning(
+            f'{repo_name} stayed locked, its webhook events wait for the '
+            'next one')
+        webhook_buffer.unschedule(repo_name)
+        return
+    try:
+        events = webhook_buffer.peek(repo_name)
+        if events:
+            # the web process imports this module to enqueue the events,
+            # the API clients are only loaded by the workers
+            from boards.fetcher.fetch import Fetcher
+            fetcher = Fetcher([repo_name])
+            fetcher.apply_webhook_events(
+                Repo.objects.get(name=repo_name), dedupe_events(events))
+            fetcher.report()
+    except Exception:
+        # the events stay buffered for the batch of the next event
+        webhook_buffer.unschedule(repo_name)
+        raise
+    else:
+        if (webhook_buffer.remove(repo_name, len(events)) and
+                webhook_buffer.schedule(repo_name)):
+            apply_webhook_events.apply_async(
+                (repo_name,), countdown=webhook_buffer.delay)
+    finally:
+        lock.release()
@@ -1,3 +1,613 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from io import StringIO
+from threading import Thread
+from time import monotonic, time
+from unittest import mock
+import hashlib
+import hmac
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from celery.exceptions import Retry
+from django.conf import settings
+from django.core.management import call_command
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.utils.timezone import utc
+
+from boards import tasks, webhooks
+from boards.fetcher import cache
+from boards.fetcher.clients import ZenhubClient
+from boards.fetcher.exceptions import PipelineNotFoundError
+from boards.fetcher.fetch import Fetcher
+from boards.fetcher.limits import RateLimiter
+from boards.fetcher.locks import RepoLock
+from boards.fetcher.persistence import IssueWriter
+from boards.fetcher.pipelines import PipelineRegistry, forget, get_registry
+from boards.fetcher.replay import FakeApiServer, FakeBoard
+from boards.models import (
+    CLOSED_PIPELINE_NAME, Issue, IssueLabel, Label, Pipeline,
+    PipelineNameMapping, Repo, Transfer
+)
+from zenhub_charts import profiling
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), 'test_payloads')
+GITHUB = {'token': 'token', 'owner': 'octo-org', 'webhook_secret': 'secret'}
+ZENHUB = {'token': 'token', 'webhook_token': 'zenhub-token'}
+
+
+def read_payload(name):
+    with open(os.path.join(PAYLOADS, name), 'rb') as f:
+        return f.read()
+
+
+def sign(body, secret='secret'):
+    return 'sha256=' + hmac.new(
+        secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+@override_settings(GITHUB=GITHUB, ZENHUB=ZENHUB)
+class WebhookViewTests(TestCase):
+
+    def setUp(self):
+        Repo.objects.create(repo_id=35129377, name='website')
+        patcher = mock.patch('boards.views.enqueue_webhook_event')
+        self.enqueue = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_github(self, body, signature, event='issues'):
+        return self.client.post(
+            '/webhooks/github/', body, content_type='application/json',
+            HTTP_X_GITHUB_EVENT=event, HTTP_X_HUB_SIGNATURE_256=signature)
+
+    def test_github_event_is_queued(self):
+        body = read_payload('github_issues_labeled.json')
+        response = self.post_github(body, sign(body))
+        self.assertEqual(response.status_code, 202)
+        self.enqueue.assert_called_once_with('website', {
+            'source': 'github',
+            'action': 'labeled',
+            'number': 42,
+            'title': 'Search results ignore the selected language',
+            'labels': ['bug', 'search'],
+            'closed_at': None,
+        })
+
+    def test_github_bad_signature_is_rejected(self):
+        body = read_payload('github_issues_labeled.json')
+        response = self.post_github(body, sign(body, 'not the secret'))
+        self.assertEqual(response.status_code, 403)
+        self.enqueue.assert_not_called()
+
+    def test_github_other_events_are_ignored(self):
+        body = b'{"zen": "Keep it logically awesome."}'
+        response = self.post_github(body, sign(body), event='ping')
+        self.assertEqual(response.status_code, 204)
+        self.enqueue.assert_not_called()
+
+    def test_github_invalid_payloads_are_rejected(self):
+        payload = json.loads(read_payload('github_issues_labeled.json'))
+        del payload['repository']['name']
+        for body in (b'{"issue": ', json.dumps(payload).encode('utf-8'),
+                     b'[]'):
+            with self.subTest(body=body[:20]):
+                response = self.post_github(body, sign(body))
+                self.assertEqual(response.status_code, 400)
+        self.enqueue.assert_not_called()
+
+    def test_zenhub_invalid_payloads_are_rejected(self):
+        transfer = QueryDict(read_payload('zenhub_issue_transfer.txt'))
+        for field, value in (('issue_number', 'forty-two'), ('repo', None)):
+            payload = transfer.copy()
+            if value is None:
+                del payload[field]
+            else:
+                payload[field] = value
+            with self.subTest(field):
+                response = self.client.post(
+                    '/webhooks/zenhub/?token=zenhub-token',
+                    payload.urlencode(),
+                    content_type='application/x-www-form-urlencoded')
+                self.assertEqual(response.status_code, 400)
+        self.enqueue.assert_not_called()
+
+    def test_zenhub_transfer_is_queued(self):
+        response = self.client.post(
+            '/webhooks/zenhub/?token=zenhub-token',
+            read_payload('zenhub_issue_transfer.txt'),
+            content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, 202)
+        repo_name, event = self.enqueue.call_args[0]
+        self.assertEqual(repo_name, 'website')
+        self.assertEqual(event['number'], 42)
+        self.assertEqual(event['from_pipeline'], 'Backlog')
+        self.assertEqual(event['to_pipeline'], 'In Progress')
+
+    def test_zenhub_bad_token_is_rejected(self):
+        response = self.client.post(
+            '/webhooks/zenhub/?token=guess',
+            read_payload('zenhub_issue_transfer.txt'),
+            content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, 403)
+
+
+class DedupeEventsTests(TestCase):
+
+    def test_repeated_transfers_are_dropped(self):
+        event = webhooks.zenhub_event(QueryDict(
+            read_payload('zenhub_issue_transfer.txt')))
+        back = dict(
+            event, from_pipeline='In Progress', to_pipeline='Backlog')
+        events = webhooks.dedupe_events([event, event, back, event])
+        self.assertEqual(events, [event, back, event])
+
+    def test_latest_github_event_keeps_closing(self):
+        closed = webhooks.github_event(
+            json.loads(read_payload('github_issues_closed.json')))
+        labeled = webhooks.github_event(
+            json.loads(read_payload('github_issues_labeled.json')))
+        [event] = webhooks.dedupe_events([closed, labeled])
+        self.assertEqual(event['action'], 'closed')
+        self.assertEqual(event['closed_at'], '2017-10-12T09:30:00Z')
+
+
+@override_settings(GITHUB=GITHUB, ZENHUB=ZENHUB)
+class ApplyWebhookEventsTests(TestCase):
+
+    def setUp(self):
+        self.repo = Repo.objects.create(repo_id=35129377, name='website')
+        self.backlog, self.in_progress = Pipeline.objects.bulk_create([
+            Pipeline(repo=self.repo, name=name, pipeline_id=name, order=i)
+            for i, name in enumerate(['Backlog', 'In Progress'])
+        ])
+        Pipeline.objects.create(
+            repo=self.repo, name=CLOSED_PIPELINE_NAME,
+            pipeline_id='website-closed', order=10000)
+        self.created_at = datetime(2017, 10, 9, 8, 12, 41, tzinfo=utc)
+        self.issue = Issue.objects.create(
+            repo=self.repo, number=42, title='Search', labels=['bug'],
+            durations={}, cycle_time=0,
+            latest_pipeline_name='Backlog', current_pipeline_name='Backlog',
+            latest_transfer_date=self.created_at)
+        Transfer.objects.create(
+            issue=self.issue, to_pipeline=self.backlog,
+            transfered_at=self.created_at)
+
+    def apply(self, *events):
+        Fetcher(['website']).apply_webhook_events(
+            self.repo, webhooks.dedupe_events(events))
+        self.issue.refresh_from_db()
+
+    def test_zenhub_transfer_is_folded_in(self):
+        received_at = self.created_at + timedelta(days=2)
+        self.apply(webhooks.zenhub_event(QueryDict(
+            read_payload('zenhub_issue_transfer.txt')), received_at))
+        self.assertEqual(self.issue.current_pipeline_name, 'In Progress')
+        self.assertEqual(self.issue.latest_transfer_date, received_at)
+        self.assertEqual(self.issue.durations, {'Backlog': 2 * 86400})
+        transfer = self.issue.transfers.get(from_webhook=True)
+        self.assertEqual(transfer.from_pipeline, self.backlog)
+        self.assertEqual(transfer.to_pipeline, self.in_progress)
+
+    def test_refetched_transfers_do_not_move_the_date_back(self):
+        received_at = self.created_at + timedelta(days=2)
+        self.apply(webhooks.zenhub_event(QueryDict(
+            read_payload('zenhub_issue_transfer.txt')), received_at))
+        # ZenHub dates the same transfer a day before the webhook arrived
+        fetcher = Fetcher(['website'])
+        fetcher.load_pipelines(self.repo)
+        fetcher.load_known_issues(self.repo, [42])
+        fetcher.save_issue_events(self.repo, 42, {
+            'title': 'Search', 'labels': [{'name': 'bug'}],
+            'created_at': self.created_at.isoformat(),
+        }, [{
+            'type': 'transferIssue',
+            'created_at': (self.created_at + timedelta(days=1)).isoformat(),
+            'from_pipeline': {'name': 'Backlog'},
+            'to_pipeline': {'name': 'In Progress'},
+        }], {'pipeline': {'name': 'In Progress'}})
+        fetcher.writer.flush()
+        self.issue.refresh_from_db()
+        self.assertEqual(self.issue.latest_transfer_date, received_at)
+        self.assertEqual(self.issue.current_pipeline_name, 'In Progress')
+        self.assertEqual(self.issue.durations, {'Backlog': 2 * 86400})
+
+    def test_github_labels_and_closing(self):
+        self.apply(
+            webhooks.github_event(
+                json.loads(read_payload('github_issues_closed.json'))),
+            webhooks.github_event(
+                json.loads(read_payload('github_issues_labeled.json'))),
+        )
+        self.assertEqual(self.issue.labels, ['bug', 'search'])
+        self.assertEqual(
+            self.issue.current_pipeline_name, CLOSED_PIPELINE_NAME)
+        self.assertEqual(
+            self.issue.durations, {'Backlog': 3 * 86400 + 4639})
+        self.assertEqual(
+            set(IssueLabel.objects.values_list('label__name', flat=True)),
+            {'bug', 'search'})
+
+
+class WebhookTaskTests(TestCase):
+
+    def setUp(self):
+        Repo.objects.create(repo_id=1, name='hooked')
+        self.buffer = tasks.webhook_buffer
+        self.addCleanup(
+            self.buffer.redis.delete, *self.buffer.keys('hooked'),
+            'sync-lock:hooked')
+        self.event = {'source': 'github', 'action': 'labeled', 'number': 1,
+                      'title': 'Search', 'labels': [], 'closed_at': None}
+        self.buffer.push('hooked', self.event)
+        patcher = mock.patch('boards.fetcher.fetch.Fetcher')
+        self.fetcher = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_locked_repos_keep_a_single_scheduled_task(self):
+        self.assertTrue(RepoLock('hooked').acquire())
+        self.buffer.redis.expire(self.buffer.keys('hooked')[1], 1)
+        with self.assertRaises(Retry):
+            tasks.apply_webhook_events('hooked')
+        self.assertGreater(
+            self.buffer.redis.ttl(self.buffer.keys('hooked')[1]), 1)
+        self.assertFalse(self.buffer.push('hooked', self.event))
+        with mock.patch.object(tasks.apply_webhook_events, 'max_retries', 0):
+            tasks.apply_webhook_events('hooked')
+        self.assertEqual(len(self.buffer.peek('hooked')), 2)
+        self.assertTrue(self.buffer.schedule('hooked'))
+
+    def test_events_are_kept_until_applied(self):
+        self.fetcher.apply_webhook_events.side_effect = RuntimeError
+        with self.assertRaises(RuntimeError):
+            tasks.apply_webhook_events('hooked')
+        self.assertEqual(self.buffer.peek('hooked'), [self.event])
+        self.assertFalse(RepoLock('hooked').redis.exists('sync-lock:hooked'))
+        self.assertTrue(self.buffer.push('hooked', self.event))
+
+    def test_events_pushed_while_applying_get_a_new_batch(self):
+        self.fetcher.apply_webhook_events.side_effect = (
+            lambda repo, events: self.buffer.push('hooked', self.event))
+        with mock.patch.object(
+                tasks.apply_webhook_events, 'apply_async') as apply_async:
+            tasks.apply_webhook_events('hooked')
+        apply_async.assert_called_once_with(
+            ('hooked',), countdown=self.buffer.delay)
+        self.assertEqual(self.buffer.peek('hooked'), [self.event])
+
+
+class IssueWriterTests(TestCase):
+
+    def test_labels_created_by_a_parallel_chunk(self):
+        repo = Repo.objects.create(repo_id=1, name='labels')
+        issue = Issue.objects.create(
+            repo=repo, number=1, title='#1', labels=['bug', 'ui'],
+            durations={}, cycle_time=0,
+            latest_transfer_date=datetime(2017, 10, 1, tzinfo=utc))
+        # another chunk creates "bug" after this one looked for it
+        Label.objects.create(repo=repo, name='bug')
+        labels = Label.objects.filter(repo_id=repo.pk, name__in={'bug', 'ui'})
+        with mock.patch.object(Label.objects, 'filter', side_effect=[
+                Label.objects.none(), labels]):
+            IssueWriter().save_labels([issue])
+        self.assertEqual(
+            sorted(issue.issue_labels.values_list('label__name', flat=True)),
+            ['bug', 'ui'])
+        self.assertEqual(Label.objects.filter(repo=repo).count(), 2)
+
+
+class PipelineRegistryTests(TestCase):
+
+    def setUp(self):
+        self.repo = Repo.objects.create(repo_id=1, name='board')
+        self.addCleanup(forget, self.repo)
+        self.board = [
+            {'id': 'b', 'name': 'Backlog'},
+            {'id': 'p', 'name': 'In Progress'},
+        ]
+
+    def test_boards_are_diffed_in_memory(self):
+        with self.assertNumQueries(1):
+            registry = PipelineRegistry(self.repo)
+        registry.sync(self.board)
+        self.assertEqual(registry.first.name, 'Backlog')
+        self.assertEqual(registry.closed.pipeline_id, 'board-closed')
+        with self.assertNumQueries(0):
+            registry.sync(self.board)
+        # renamed, moved and added at once
+        self.board = [
+            {'id': 'p', 'name': 'Doing'},
+            {'id': 'b', 'name': 'Backlog'},
+            {'id': 'r', 'name': 'Review'},
+        ]
+        # reload, then savepoint, pipelines, mapping, update, version bump
+        # and refresh, release
+        with self.assertNumQueries(8):
+            registry.sync(self.board)
+        self.assertEqual(
+            list(Pipeline.objects.filter(repo=self.repo).order_by(
+                'order').values_list('name', flat=True)),
+            ['Doing', 'Backlog', 'Review', CLOSED_PIPELINE_NAME])
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.get('In Progress').name, 'Doing')
+            self.assertEqual(registry.first.name, 'Doing')
+        reloaded = PipelineRegistry(self.repo)
+        self.assertEqual(reloaded.get('In Progress').pipeline_id, 'p')
+        self.assertEqual(reloaded.get('Review').order, 2)
+
+    def test_unknown_names_are_reloaded_once(self):
+        registry = PipelineRegistry(self.repo)
+        registry.sync(self.board)
+        Pipeline.objects.create(
+            repo=self.repo, name='QA', pipeline_id='q', order=2)
+        with self.assertNumQueries(1):
+            self.assertEqual(registry.get('QA').pipeline_id, 'q')
+        with self.assertNumQueries(1):
+            self.assertRaises(KeyError, registry.get, 'Icebox')
+        with self.assertNumQueries(0):
+            self.assertRaises(KeyError, registry.get, 'Icebox')
+        later = monotonic() + registry.miss_interval
+        with mock.patch(
+                'boards.fetcher.pipelines.monotonic', return_value=later):
+            with self.assertNumQueries(1):
+                self.assertRaises(KeyError, registry.get, 'Icebox')
+
+    def test_stale_registries_are_reloaded(self):
+        registry = get_registry(self.repo)
+        registry.sync(self.board)
+        # another process renames a pipeline
+        other = PipelineRegistry(Repo.objects.get(pk=self.repo.pk))
+        other.sync([{'id': 'b', 'name': 'Todo'}, self.board[1]])
+        repo = Repo.objects.get(pk=self.repo.pk)
+        with self.assertNumQueries(1):
+            self.assertIs(get_registry(repo), registry)
+        self.assertEqual(registry.first.name, 'Todo')
+        self.assertEqual(registry.get('Backlog').name, 'Todo')
+
+    def test_changed_boards_are_compared_to_the_saved_pipelines(self):
+        registry = get_registry(self.repo)
+        registry.sync(self.board)
+        # another process already applied the new board, with a stale repo
+        board = [{'id': 'b', 'name': 'Todo'}, self.board[1]]
+        PipelineRegistry(Repo.objects.get(pk=self.repo.pk)).sync(board)
+        get_registry(self.repo).sync(board)
+        self.assertEqual(
+            PipelineNameMapping.objects.filter(repo=self.repo).count(), 1)
+        self.assertEqual(registry.get('Backlog').name, 'Todo')
+
+    def test_registry_is_shared_by_the_fetchers(self):
+        self.assertIs(get_registry(self.repo), get_registry(self.repo))
+        fetcher = Fetcher(github=object(), zenhub=object())
+        fetcher.create_pipelines(self.repo, self.board)
+        with self.assertNumQueries(0):
+            other = Fetcher(github=object(), zenhub=object())
+            other.create_pipelines(self.repo, self.board)
+            self.assertEqual(
+                other.first_pipeline, fetcher.registry.pipelines['Backlog'])
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        board = FakeBoard.synthetic(name='cached', issues=3, seed=1)
+        self.repo_id = board.repo_id
+        self.server = FakeApiServer(board)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = self.server.settings(FETCHER_CACHE={
+            'directory': directory.name, 'ttl': 60, 'max_size': 1024 * 1024})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patcher = mock.patch.dict(cache._caches, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unchanged_responses_are_revalidated(self):
+        client = ZenhubClient(**settings.ZENHUB)
+        board = client.get_board(self.repo_id)
+        session = client.session
+        send = session.request
+        requests = []
+
+        def request(*args, **kwargs):
+            requests.append((kwargs['headers'], send(*args, **kwargs)))
+            return requests[-1][1]
+
+        with mock.patch.object(session, 'request', side_effect=request):
+            self.assertEqual(client.get_board(self.repo_id), board)
+        [(headers, response)] = requests
+        self.assertEqual(
+            headers['If-None-Match'], response.headers['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual((client.cache.hits, client.cache.misses), (1, 1))
+
+
+class RateLimiterTests(TestCase):
+
+    def acquire_in_thread(self, limiter):
+        thread = Thread(target=limiter.acquire)
+        thread.start()
+        self.addCleanup(thread.join, 1)
+        return thread
+
+    def test_tokens_are_drawn_down_to_the_reserve(self):
+        limiter = RateLimiter('test', reserve=5)
+        limiter.acquire()
+        self.assertIsNone(limiter.tokens)
+        limiter.update(100, 7, time() + 3600)
+        limiter.acquire()
+        limiter.acquire()
+        self.assertEqual(limiter.tokens, 5)
+        thread = self.acquire_in_thread(limiter)
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+        # the limit was reset, the response of another thread refills it
+        limiter.update(100, 100, time() + 7200)
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(limiter.tokens, 99)
+
+    def test_waits_until_the_limit_resets(self):
+        limiter = RateLimiter('test', reserve=5)
+        limiter.update(100, 5, time() + 0.2)
+        started = time()
+        limiter.acquire()
+        self.assertGreaterEqual(time() - started, 0.15)
+        # the next response tells the new budget
+        self.assertIsNone(limiter.tokens)
+
+    def test_stale_responses_do_not_refill(self):
+        limiter = RateLimiter('test')
+        reset_at = time() + 3600
+        limiter.update(100, 50, reset_at)
+        limiter.update(100, 60, reset_at)
+        self.assertEqual(limiter.tokens, 50)
+
+
+class SyncIssuesTests(TestCase):
+
+    def test_failed_writes_cancel_the_pending_fetches(self):
+        repo = Repo.objects.create(repo_id=1, name='failing')
+        fetcher = Fetcher(github=object(), zenhub=object(), workers=2)
+        fetched = []
+
+        def fetch(repo, number):
+            fetched.append(number)
+            return ()
+
+        with mock.patch.object(fetcher, 'fetch_issue_events', fetch), \
+                mock.patch.object(
+                    fetcher, 'save_issue_events',
+                    side_effect=PipelineNotFoundError('failing', 'Icebox')):
+            with self.assertRaises(PipelineNotFoundError):
+                fetcher.sync_issues(repo, list(range(200)))
+        self.assertLessEqual(len(fetched), 5)
+
+
+class FetcherReplayTests(TestCase):
+
+    def setUp(self):
+        self.board = FakeBoard.synthetic(name='replay', issues=30, seed=1)
+        self.server = FakeApiServer(self.board)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        settings = self.server.settings(FETCHER_CACHE=None)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.repo = Repo.objects.create(
+            name=self.board.name, repo_id=self.board.repo_id)
+        self.open_issues = [
+            number for number, issue in sorted(self.board.issues.items())
+            if issue['pipeline'] != CLOSED_PIPELINE_NAME
+        ]
+
+    def sync(self, **kwargs):
+        self.server.reset_calls()
+        fetcher = Fetcher([self.repo.name], **kwargs)
+        fetcher.sync()
+        return fetcher
+
+    def test_full_sync(self):
+        self.sync(full=True)
+        self.assertEqual(
+            sorted(self.repo.issues.values_list('number', flat=True)),
+            self.open_issues)
+        # the board, then an issue, its events and pipeline per issue
+        self.assertEqual(
+            self.server.total_calls, 1 + 3 * len(self.open_issues))
+        for number in self.open_issues:
+            issue = self.repo.issues.get(number=number)
+            self.assertEqual(
+                issue.current_pipeline_name,
+                self.board.issues[number]['pipeline'])
+            self.assertEqual(
+                issue.transfers.count(),
+                len(self.board.issues[number]['events']) + 1)
+
+    def test_incremental_sync_only_fetches_changes(self):
+        self.sync(full=True)
+        self.sync()
+        # the board and an empty page of updated issues
+        self.assertEqual(self.server.total_calls, 2)
+        number = self.open_issues[0]
+        self.board.move(number, self.board.pipelines[-1]['name'])
+        self.sync()
+        self.assertEqual(self.server.total_calls, 2 + 3)
+        self.assertEqual(
+            self.repo.issues.get(number=number).current_pipeline_name,
+            self.board.pipelines[-1]['name'])
+
+    def test_incremental_fold_matches_a_rebuild(self):
+        self.sync(full=True)
+        pipelines = [p['name'] for p in self.board.pipelines]
+        for step, number in enumerate(self.open_issues[:6]):
+            self.board.move(number, pipelines[step % len(pipelines)])
+            self.board.move(number, pipelines[(step + 2) % len(pipelines)])
+            self.sync()
+        folded = {
+            issue.number: (issue.durations, issue.cycle_time)
+            for issue in self.repo.issues.all()
+        }
+        call_command(
+            'rebuild_durations', repo=self.repo.name, stdout=StringIO())
+        for issue in self.repo.issues.all():
+            durations, cycle_time = folded[issue.number]
+            self.assertEqual(issue.durations.keys(), durations.keys())
+            for name, seconds in durations.items():
+                self.assertAlmostEqual(issue.durations[name], seconds)
+            self.assertAlmostEqual(issue.cycle_time, cycle_time)
+
+    def test_benchmark_replays_a_recorded_board_of_a_tracked_repo(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replay.json')
+            self.board.save(path)
+            out = StringIO()
+            call_command(
+                'benchmark_fetcher', board=path, latency=0, changes=2,
+                stdout=out)
+        self.assertIn('incremental sync: ', out.getvalue())
+        self.assertEqual(
+            list(Repo.objects.values_list('name', 'repo_id')),
+            [(self.board.name, self.board.repo_id)])
+        self.assertFalse(self.repo.issues.exists())
+
+    def test_request_stats_are_per_fetcher(self):
+        self.sync(full=True)
+        fetcher = self.sync()
+        for client, api in ((fetcher.github, 'github'),
+                            (fetcher.zenhub, 'zenhub')):
+            self.assertEqual(
+                sum(client.stats.counts.values()), self.server.calls[api])
+
+    def test_fetch_command_shares_one_fetcher(self):
+        Repo.objects.create(name='other', repo_id=self.board.repo_id + 1)
+        with mock.patch(
+                'boards.management.commands.fetch.Fetcher',
+                wraps=Fetcher) as fetcher, \
+                mock.patch.object(Fetcher, 'sync_repo') as sync_repo:
+            call_command('fetch', full=True)
+        fetcher.assert_called_once()
+        self.assertIsNotNone(fetcher.call_args[1]['github'])
+        self.assertEqual(
+            sorted(call[0][0].name for call in sync_repo.call_args_list),
+            ['other', 'replay'])
+
+    def test_sync_phases_are_timed(self):
+        profiling.metrics._pending.clear()
+        with self.settings(PROFILING=dict(settings.PROFILING, enabled=True)):
+            with mock.patch.object(profiling.metrics, 'flush'):
+                self.sync(full=True)
+        calls = {
+            field.rpartition(':')[0]: count
+            for field, count in profiling.metrics._pending.items()
+            if field.endswith(':calls')
+        }
+        self.assertEqual(calls['sync.board'], 1)
+        self.assertEqual(calls['sync.pipelines'], 1)
+        self.assertEqual(calls['sync.api'], len(self.open_issues))
+        self.assertEqual(calls['sync.durations'], len(self.open_issues))
+        self.assertEqual(calls['sync.write'], 1)
+        self.assertGreater(profiling.metrics._pending['sync.write:queries'], 0)
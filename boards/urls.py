@@ -0,0 +1,11 @@
+from django.conf.urls import url
+
+from .views import GithubWebhookView, ZenhubWebhookView
+
+
+urlpatterns = [
+    url(r'^webhooks/github/$', GithubWebhookView.as_view(),
+        name='github-webhook'),
+    url(r'^webhooks/zenhub/$', ZenhubWebhookView.as_view(),
+        name='zenhub-webhook'),
+]
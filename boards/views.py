@@ -1,3 +1,75 @@
-from django.shortcuts import render
+import json
+import logging
 
-# Create your views here.
+from django.http import (
+    HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+)
+from django.utils.decorators import method_decorator
+from django.views import generic
+from django.views.decorators.csrf import csrf_exempt
+
+from boards import webhooks
+from boards.models import Repo
+from boards.tasks import enqueue_webhook_event
+
+logger = logging.getLogger(__name__)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class WebhookView(generic.View):
+    """
+    Receives webhook events and queues them for the repo. Events of repos
+    that are not tracked are acknowledged and ignored.
+    """
+    http_method_names = ['post']
+
+    def is_authenticated(self, request):
+        raise NotImplementedError
+
+    def get_event(self, request):
+        """
+        Returns the repo name and the event, None if it is not tracked.
+        Raises KeyError, TypeError or ValueError if the payload is invalid.
+        """
+        raise NotImplementedError
+
+    def post(self, request, *args, **kwargs):
+        if not self.is_authenticated(request):
+            return HttpResponseForbidden()
+        try:
+            repo_name, event = self.get_event(request)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f'invalid {self.__class__.__name__} payload: {e!r}')
+            return HttpResponseBadRequest('Invalid payload')
+        if not event or not Repo.objects.filter(name=repo_name).exists():
+            return HttpResponse(status=204)
+        enqueue_webhook_event(repo_name, event)
+        return HttpResponse(status=202)
+
+
+class GithubWebhookView(WebhookView):
+
+    def is_authenticated(self, request):
+        return webhooks.verify_github_signature(
+            request.body, request.META.get('HTTP_X_HUB_SIGNATURE_256'))
+
+    def get_event(self, request):
+        if request.META.get('HTTP_X_GITHUB_EVENT') != 'issues':
+            return None, None
+        payload = json.loads(request.body.decode('utf-8'))
+        return payload['repository']['name'], webhooks.github_event(payload)
+
+
+class ZenhubWebhookView(WebhookView):
+    """
+    ZenHub webhooks are form posts without a signature, they are
+    authenticated by a token in their url.
+    """
+
+    def is_authenticated(self, request):
+        return webhooks.verify_zenhub_token(request.GET.get('token'))
+
+    def get_event(self, request):
+        if request.POST.get('type') != 'issue_transfer':
+            return None, None
+        return request.POST['repo'], webhooks.zenhub_event(request.POST)
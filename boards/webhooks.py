@@ -0,0 +1,167 @@
+"""
+GitHub and ZenHub webhooks. Events are buffered per repo in Redis and
+applied in batches, so a burst of events on a board costs a single task.
+"""
+import hashlib
+import hmac
+import json
+
+import redis
+from django.conf import settings
+from django.utils.timezone import now
+
+# GitHub issue actions that change more than the title and labels, the
+# issue is fetched again instead of being updated from the payload
+REFETCH_ACTIONS = ('opened', 'reopened', 'transferred', 'deleted')
+
+
+def verify_github_signature(body, signature):
+    secret = settings.GITHUB.get('webhook_secret')
+    if not secret or not signature:
+        return False
+    expected = 'sha256=' + hmac.new(
+        secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def verify_zenhub_token(token):
+    expected = settings.ZENHUB.get('webhook_token')
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(expected, token)
+
+
+def github_event(payload):
+    issue = payload['issue']
+    return {
+        'source': 'github',
+        'action': payload['action'],
+        'number': issue['number'],
+        'title': issue['title'],
+        'labels': [label['name'] for label in issue['labels']],
+        'closed_at': issue.get('closed_at'),
+    }
+
+
+def zenhub_event(payload, received_at=None):
+    """
+    ZenHub does not say when an issue was moved, the time it is received
+    at is used instead.
+    """
+    return {
+        'source': 'zenhub',
+        'number': int(payload['issue_number']),
+        'from_pipeline': payload['from_pipeline_name'],
+        'to_pipeline': payload['to_pipeline_name'],
+        'received_at': (received_at or now()).isoformat(),
+    }
+
+
+def dedupe_events(events):
+    """
+    Drops repeated deliveries: a transfer identical to the previous one of
+    the same issue, and all but the latest GitHub event of an issue. The
+    latest one keeps the action of an earlier event that closed the issue
+    or requires fetching it again.
+    """
+    deduped = []
+    latest_transfers = {}
+    github_events = {}
+    for event in events:
+        number = event['number']
+        if event['source'] == 'zenhub':
+            move = (event['from_pipeline'], event['to_pipeline'])
+            if latest_transfers.get(number) == move:
+                continue
+            latest_transfers[number] = move
+            deduped.append(event)
+        else:
+            previous = github_events.get(number)
+            if previous and previous['action'] in REFETCH_ACTIONS or (
+                    previous and previous['action'] == 'closed' and
+                    event['action'] not in REFETCH_ACTIONS):
+                event = dict(
+                    event, action=previous['action'],
+                    closed_at=previous['closed_at'])
+            github_events[number] = event
+    return deduped + list(github_events.values())
+
+
+class WebhookBuffer(object):
+    """
+    Redis lists of the events received for every repo. Pushing the first
+    event of a batch tells the caller to schedule its processing, events
+    are removed once they were applied.
+    """
+    prefix = 'webhooks'
+
+    def __init__(self, url=None, delay=None):
+        self.url = (
+            url or settings.WEBHOOKS.get('url') or settings.CELERY_BROKER_URL)
+        self.delay = delay or settings.WEBHOOKS['batch_delay']
+        self._redis = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = redis.StrictRedis.from_url(self.url)
+        return self._redis
+
+    def keys(self, repo_name):
+        return (
+            f'{self.prefix}:{repo_name}:events',
+            f'{self.prefix}:{repo_name}:scheduled')
+
+    def push(self, repo_name, event):
+        """
+        Buffers `event`, returns True if no batch is scheduled yet.
+        """
+        events, scheduled = self.keys(repo_name)
+        pipe = self.redis.pipeline()
+        pipe.rpush(events, json.dumps(event))
+        pipe.set(scheduled, 1, nx=True, ex=self.delay * 10)
+        return bool(pipe.execute()[-1])
+
+    def schedule(self, repo_name):
+        """
+        Returns True if no batch is scheduled yet, the caller schedules it.
+        """
+        return bool(self.redis.set(
+            self.keys(repo_name)[1], 1, nx=True, ex=self.delay * 10))
+
+    def keep_scheduled(self, repo_name):
+        """
+        Extends the scheduled batch of the repo while its task is retried,
+        so new events do not schedule another one.
+        """
+        self.redis.set(self.keys(repo_name)[1], 1, ex=self.delay * 10)
+
+    def unschedule(self, repo_name):
+        """
+        Buffered events are left for the batch the next event schedules.
+        """
+        self.redis.delete(self.keys(repo_name)[1])
+
+    def peek(self, repo_name):
+        """
+        Every buffered event of the repo, they stay buffered until removed.
+        """
+        events = self.redis.lrange(self.keys(repo_name)[0], 0, -1)
+        return [json.loads(event.decode('utf-8')) for event in events]
+
+    def remove(self, repo_name, count):
+        """
+        Removes the `count` oldest events of the repo once they were applied
+        and ends its batch. Returns True if events were pushed in between,
+        they need a batch of their own.
+        """
+        events, scheduled = self.keys(repo_name)
+        pipe = self.redis.pipeline()
+        pipe.ltrim(events, count, -1)
+        pipe.delete(scheduled)
+        pipe.llen(events)
+        return bool(pipe.execute()[-1])
+
+
+webhook_buffer = WebhookBuffer()
+
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from charts.models import ChartSnapshot
+
+
+@admin.register(ChartSnapshot)
+class ChartSnapshotAdmin(admin.ModelAdmin):
+    list_display = (
+        '__str__', 'data_version', 'built_at', 'build_time')
+    list_filter = ('repo',)
+    exclude = ('content', 'columnar')
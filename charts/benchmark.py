@@ -0,0 +1,74 @@
+"""
+Chart filters and measurements shared by the chart benchmarks and the
+performance budgets of the test suite.
+"""
+from datetime import timedelta
+from time import perf_counter
+import json
+import statistics
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from boards import synthetic
+from charts.encoding import iter_json
+
+
+def scenarios(until=None):
+    """
+    Filter combinations of get_chart_data, by name.
+    """
+    until = until or now()
+    since = until - timedelta(days=90)
+    return {
+        'default': {},
+        'last 90 days': {
+            'since': since.timestamp() * 1000,
+            'until': until.timestamp() * 1000,
+        },
+        'pipelines': {'durations': synthetic.PIPELINE_NAMES[2:4]},
+        'labels': {'labels': ['bug']},
+        'pipelines and labels': {
+            'durations': synthetic.PIPELINE_NAMES[2:4],
+            'labels': ['bug', 'ui'],
+        },
+    }
+
+
+def encoded_size(data):
+    """
+    Bytes of `data` once encoded like the chart responses encode it.
+    """
+    if data.get('format') == 'columnar':
+        return sum(len(chunk.encode('utf-8')) for chunk in iter_json(data))
+    return len(json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8'))
+
+
+class Measurement(object):
+    """
+    Timings, queries and response size of repeated calls of a function.
+    """
+
+    def __init__(self, function, runs=1, **kwargs):
+        self.timings = []
+        for _ in range(runs):
+            with CaptureQueriesContext(connection) as queries:
+                started = perf_counter()
+                self.data = function(**kwargs)
+                if self.data.get('format') == 'columnar':
+                    # its series are only computed while being encoded
+                    self.size = encoded_size(self.data)
+                self.timings.append(perf_counter() - started)
+        self.queries = len(queries)
+        if self.data.get('format') != 'columnar':
+            self.size = encoded_size(self.data)
+
+    @property
+    def median(self):
+        return statistics.median(self.timings)
+
+    @property
+    def best(self):
+        return min(self.timings)
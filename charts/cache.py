@@ -0,0 +1,199 @@
+from hashlib import sha1
+from time import time
+from uuid import uuid4
+import json
+import logging
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ChartCache(object):
+    """
+    LRU cache of serialized chart data, kept in Redis and bounded in
+    entries and in bytes. Keys contain the repo's data version, so a sync
+    invalidates every chart of the repo just by bumping it.
+    """
+    prefix = 'chart-data'
+    # bytes of a streamed chart held in memory before being appended
+    buffer_size = 64 * 1024
+
+    def __init__(self, url=None, max_entries=None, max_bytes=None,
+                 timeout=None):
+        options = getattr(settings, 'CHART_CACHE', {})
+        self.url = url or options.get('url') or settings.CELERY_BROKER_URL
+        self.max_entries = max_entries or options.get('max_entries', 1000)
+        self.max_bytes = max_bytes or options.get(
+            'max_bytes', 256 * 1024 * 1024)
+        self.timeout = timeout or options.get('timeout', 60 * 60 * 24)
+        self.age_bucket = options.get('age_bucket', 60 * 60)
+        self._redis = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = redis.StrictRedis.from_url(self.url)
+        return self._redis
+
+    def key(self, version, **params):
+        """
+        Canonical key of a chart: parameters are normalized, so the same
+        chart requested with differently ordered filters is cached once.
+        """
+        canonical = {
+            k: sorted(v) if isinstance(v, (list, tuple)) else v
+            for k, v in params.items()
+            if v is not None
+        }
+        canonical['version'] = version
+        return sha1(
+            json.dumps(canonical, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
+    def get(self, key):
+        try:
+            content = self.redis.get(f'{self.prefix}:{key}')
+            pipe = self.redis.pipeline()
+            if content is None:
+                pipe.incr(f'{self.prefix}:misses')
+            else:
+                pipe.incr(f'{self.prefix}:hits')
+                pipe.zadd(f'{self.prefix}:index', time(), key)
+            pipe.execute()
+            return content
+        except redis.RedisError as e:
+            logger.warning(f'chart cache unavailable: {e}')
+            return None
+
+    def bucket(self):
+        """
+        Current period of `age_bucket` seconds, part of the keys of the
+        charts that show the age of open issues so it is never older.
+        """
+        return int(time() // self.age_bucket)
+
+    def set(self, key, content, timeout=None):
+        try:
+            pipe = self.redis.pipeline()
+            pipe.set(f'{self.prefix}:{key}', content)
+            self.add(pipe, key, timeout)
+        except redis.RedisError as e:
+            logger.warning(f'chart cache unavailable: {e}')
+
+    def iter_set(self, key, chunks, timeout=None):
+        """
+        Yields `chunks` while appending them to a temporary entry, which
+        becomes `key` once all of them were sent. At most `buffer_size`
+        bytes are held in memory, an interrupted stream is not cached.
+        """
+        partial = f'{self.prefix}:partial:{uuid4().hex}'
+        buffered = []
+        size = 0
+        caching = True
+        try:
+            for chunk in chunks:
+                yield chunk
+                buffered.append(chunk)
+                size += len(chunk)
+                if caching and size >= self.buffer_size:
+                    caching = self.append(partial, b''.join(buffered))
+                    buffered = []
+                    size = 0
+            if caching and self.append(partial, b''.join(buffered)):
+                self.rename(partial, key, timeout)
+                partial = None
+        finally:
+            if partial:
+                self.discard(partial)
+
+    def append(self, partial, content):
+        try:
+            pipe = self.redis.pipeline()
+            pipe.append(partial, content)
+            pipe.expire(partial, self.timeout)
+            pipe.execute()
+            return True
+        except redis.RedisError as e:
+            logger.warning(f'chart cache unavailable: {e}')
+            return False
+
+    def rename(self, partial, key, timeout=None):
+        try:
+            pipe = self.redis.pipeline()
+            pipe.rename(partial, f'{self.prefix}:{key}')
+            self.add(pipe, key, timeout)
+        except redis.RedisError as e:
+            logger.warning(f'chart cache unavailable: {e}')
+
+    def discard(self, partial):
+        try:
+            self.redis.delete(partial)
+        except redis.RedisError as e:
+            logger.warning(f'chart cache unavailable: {e}')
+
+    def add(self, pipe, key, timeout=None):
+        """
+        Executes `pipe` with the entry `key` marked as the most recent one
+        and expiring after `timeout` seconds, evicts the least recent ones
+        past `max_entries` or `max_bytes`.
+        """
+        entry = f'{self.prefix}:{key}'
+        pipe.expire(entry, timeout or self.timeout)
+        pipe.zadd(f'{self.prefix}:index', time(), key)
+        pipe.strlen(entry)
+        size = pipe.execute()[-1]
+        pipe = self.redis.pipeline()
+        pipe.hset(f'{self.prefix}:sizes', key, size)
+        pipe.hgetall(f'{self.prefix}:sizes')
+        sizes = {
+            k.decode('utf-8'): int(v) for k, v in pipe.execute()[-1].items()}
+        if (len(sizes) > self.max_entries or
+                sum(sizes.values()) > self.max_bytes):
+            self.evict(sizes)
+
+    def evict(self, sizes):
+        """
+        Removes the least recently used entries until at most `max_entries`
+        of them are left, of at most `max_bytes` in all. `sizes` are the
+        bytes of every entry.
+        """
+        index = f'{self.prefix}:index'
+        count = len(sizes)
+        total = sum(sizes.values())
+        keys = []
+        for key in self.redis.zrange(index, 0, -1):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            key = key.decode('utf-8')
+            keys.append(key)
+            count -= 1
+            total -= sizes.get(key, 0)
+        if not keys:
+            return
+        pipe = self.redis.pipeline()
+        pipe.delete(*[f'{self.prefix}:{k}' for k in keys])
+        pipe.zrem(index, *keys)
+        pipe.hdel(f'{self.prefix}:sizes', *keys)
+        pipe.execute()
+        logger.info(f'evicted {len(keys)} charts from cache')
+
+    def stats(self):
+        """
+        Hits and misses since the counters were created, entries and their
+        bytes in all.
+        """
+        pipe = self.redis.pipeline()
+        pipe.mget(f'{self.prefix}:hits', f'{self.prefix}:misses')
+        pipe.hvals(f'{self.prefix}:sizes')
+        (hits, misses), sizes = pipe.execute()
+        return {
+            'hits': int(hits or 0),
+            'misses': int(misses or 0),
+            'entries': len(sizes),
+            'bytes': sum(int(size) for size in sizes),
+        }
+
+
+chart_cache = ChartCache()
@@ -0,0 +1,35 @@
+from types import GeneratorType
+import json
+
+import numpy as np
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+def iter_json(value):
+    """
+    Encodes `value` as JSON in chunks, one per scalar or column, so big
+    responses are never held in memory as a whole. NumPy arrays are
+    converted to lists only while being encoded, generators are encoded
+    as lists and consumed item by item.
+    """
+    if isinstance(value, dict):
+        yield '{'
+        for index, (key, item) in enumerate(value.items()):
+            if index:
+                yield ', '
+            yield json.dumps(str(key)) + ': '
+            yield from iter_json(item)
+        yield '}'
+    elif isinstance(value, GeneratorType) or isinstance(value, list) and any(
+            isinstance(item, (dict, np.ndarray)) for item in value):
+        yield '['
+        for index, item in enumerate(value):
+            if index:
+                yield ', '
+            yield from iter_json(item)
+        yield ']'
+    elif isinstance(value, np.ndarray):
+        yield json.dumps(value.tolist())
+    else:
+        yield json.dumps(value, cls=DjangoJSONEncoder)
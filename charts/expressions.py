@@ -0,0 +1,68 @@
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import (
+    Aggregate, Case, DateTimeField, ExpressionWrapper, F, FloatField, Func,
+    IntegerField, Q, Value, When
+)
+
+from boards.models import CLOSED_PIPELINE_NAME
+
+
+class PercentileCont(Aggregate):
+    """
+    Postgres' continuous percentiles of an expression, e.g.
+    PercentileCont('cycle_time', [0.25, 0.5]) -> [12.5, 40.0]
+    """
+    function = 'percentile_cont'
+    template = (
+        '%(function)s(ARRAY[%(fractions)s]) '
+        'WITHIN GROUP (ORDER BY %(expressions)s)'
+    )
+
+    def __init__(self, expression, fractions, **extra):
+        super(PercentileCont, self).__init__(
+            expression,
+            fractions=', '.join(str(float(f)) for f in fractions),
+            output_field=ArrayField(FloatField()),
+            **extra
+        )
+
+
+class Epoch(Func):
+    """
+    Seconds in an interval.
+    """
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+
+    def __init__(self, expression, **extra):
+        super(Epoch, self).__init__(
+            expression, output_field=FloatField(), **extra)
+
+
+class EpochDay(Func):
+    """
+    Days since the epoch of a date, in UTC.
+    """
+    template = 'FLOOR(EXTRACT(EPOCH FROM %(expressions)s) / 86400)::integer'
+
+    def __init__(self, expression, **extra):
+        super(EpochDay, self).__init__(
+            expression, output_field=IntegerField(), **extra)
+
+
+def live_cycle_time(at):
+    """
+    Issue.cycle_time plus the time spent in the current pipeline until `at`.
+    """
+    return ExpressionWrapper(
+        F('cycle_time') + Case(
+            When(
+                ~Q(current_pipeline_name__in=['', CLOSED_PIPELINE_NAME]),
+                then=Epoch(
+                    Value(at, output_field=DateTimeField()) -
+                    F('latest_transfer_date'))
+            ),
+            default=Value(0.0),
+            output_field=FloatField()
+        ),
+        output_field=FloatField()
+    )
@@ -0,0 +1,148 @@
+"""
+Cumulative flow, throughput and work in progress of a repo, computed in a
+single sweep over its transfers.
+"""
+import io
+
+import numpy as np
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from boards.models import CLOSED_PIPELINE_NAME, Transfer
+from charts.expressions import EpochDay
+
+DAY = 86400
+
+
+class Flow(object):
+    """
+    Issues in every pipeline at the end of every day, and issues created
+    and closed during every day. `counts` has a row per day starting at
+    `start` (seconds since the epoch) and a column per `pipelines` name.
+    """
+
+    def __init__(self, pipelines, start, counts, created, closed):
+        self.pipelines = pipelines
+        self.start = start
+        self.counts = counts
+        self.created = created
+        self.closed = closed
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def days(self):
+        return self.start + np.arange(len(self)) * DAY
+
+    @property
+    def open_pipelines(self):
+        return [p for p in self.pipelines if p != CLOSED_PIPELINE_NAME]
+
+    def column(self, pipeline):
+        return self.counts[:, self.pipelines.index(pipeline)]
+
+    def dumps(self):
+        """
+        The arrays of the flow as bytes, to be cached.
+        """
+        content = io.BytesIO()
+        np.savez(
+            content, pipelines=np.array(self.pipelines, dtype=str),
+            start=self.start, counts=self.counts, created=self.created,
+            closed=self.closed)
+        return content.getvalue()
+
+    @classmethod
+    def loads(cls, content):
+        arrays = np.load(io.BytesIO(content), allow_pickle=False)
+        return cls(
+            arrays['pipelines'].tolist(), int(arrays['start']),
+            arrays['counts'], arrays['created'], arrays['closed'])
+
+    def between(self, since=None, until=None):
+        """
+        The days from `since` to `until`, both datetimes.
+        """
+        low, high = 0, len(self)
+        if since:
+            low = int(np.clip(
+                (since.timestamp() - self.start) // DAY, 0, len(self)))
+        if until:
+            high = int(np.clip(
+                (until.timestamp() - self.start) // DAY + 1, low, len(self)))
+        return Flow(
+            self.pipelines, self.start + low * DAY, self.counts[low:high],
+            self.created[low:high], self.closed[low:high])
+
+
+def read_transfers(repo, at, chunk_size=10000):
+    """
+    Issue id, pipeline id (0 if none) and day of the transfers of `repo`
+    until `at` in date order, as NumPy columns. Rows are read from a
+    server-side cursor `chunk_size` at a time and converted to arrays,
+    without building model instances or datetimes.
+    """
+    sql, params = Transfer.objects.filter(
+        issue__repo=repo, transfered_at__lte=at
+    ).order_by('transfered_at').values_list(
+        'issue_id', Coalesce('to_pipeline_id', Value(0)),
+        EpochDay('transfered_at')
+    ).query.sql_with_params()
+    chunks = [np.zeros((0, 3), dtype=np.int64)]
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchmany(chunk_size)
+        while rows:
+            chunks.append(np.array(rows, dtype=np.int64))
+            rows = cursor.fetchmany(chunk_size)
+    return np.concatenate(chunks).T
+
+
+def sweep(repo, at=None):
+    """
+    Replays the transfers of `repo` until `at`: every transfer leaves the
+    pipeline its issue was in and enters its own. These +1/-1 changes are
+    added up per (day, pipeline), then along the days, so the cost is one
+    pass over the transfers, in NumPy, whatever the length of history.
+    """
+    at = at or now()
+    pipelines = list(repo.pipeline_set.order_by('order'))
+    names = [p.name for p in pipelines]
+    today = int(at.timestamp() // DAY)
+    issues, pipeline_ids, days = read_transfers(repo, at)
+    if not len(days):
+        empty = np.zeros(0, dtype=np.int64)
+        return Flow(
+            names, today * DAY, np.zeros((0, len(names)), dtype=np.int64),
+            empty, empty)
+    first = int(days[0])
+    length = today - first + 1
+    # column of the pipeline of every transfer, -1 off the board
+    ids = [p.pk for p in pipelines]
+    lookup = np.full(max(ids + [pipeline_ids.max()]) + 1, -1)
+    lookup[ids] = np.arange(len(ids))
+    columns = lookup[pipeline_ids]
+    # transfers of an issue next to each other, still in date order
+    by_issue = np.argsort(issues, kind='mergesort')
+    issues = issues[by_issue]
+    columns = columns[by_issue]
+    offsets = days[by_issue] - first
+    previous = np.concatenate(([-1], columns[:-1]))
+    previous[np.concatenate(([True], issues[1:] != issues[:-1]))] = -1
+    moved = columns != previous
+    left = moved & (previous >= 0)
+    entered = moved & (columns >= 0)
+    deltas = np.zeros((length, len(names)), dtype=np.int64)
+    np.add.at(deltas, (offsets[left], previous[left]), -1)
+    np.add.at(deltas, (offsets[entered], columns[entered]), 1)
+    created = entered & (previous < 0)
+    closed = entered & np.isin(columns, [
+        index for index, name in enumerate(names)
+        if name == CLOSED_PIPELINE_NAME])
+    return Flow(
+        names, first * DAY, np.cumsum(deltas, axis=0),
+        np.bincount(offsets[created], minlength=length),
+        np.bincount(offsets[closed], minlength=length))
@@ -0,0 +1,66 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from boards import synthetic
+from boards.models import Repo
+from charts import benchmark
+from charts.views import ChartResponseView
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates synthetic repos of several sizes and reports the time, '
+        'queries and response size of the chart data for every filter '
+        'combination and response format. Rolled back unless --keep.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=str, default='1000,10000,100000',
+            help='Comma separated numbers of issues')
+        parser.add_argument('--pipelines', type=int, default=8)
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument(
+            '--keep', action='store_true', default=False,
+            help='Keep the synthetic repos')
+
+    def get_formats(self, view):
+        return {
+            'points': (view.get_chart_data, {}),
+            'columnar': (view.get_columnar_data, {}),
+            'weekly': (view.get_chart_data, {'aggregate': 'week'}),
+            'downsampled': (view.get_chart_data, {'points': 500}),
+        }
+
+    def handle(self, *args, **options):
+        view = ChartResponseView()
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        with transaction.atomic():
+            for size in sizes:
+                name = f'synthetic-charts-{size}'
+                repo = Repo.objects.filter(name=name).first()
+                if not repo:
+                    started = perf_counter()
+                    repo = synthetic.create_repo(
+                        name, issues=size, pipelines=options['pipelines'],
+                        seed=size)
+                    self.stdout.write(
+                        f'created {size} issues in '
+                        f'{perf_counter() - started:.1f}s')
+                self.stdout.write(f'\n== {size} issues')
+                for scenario, filters in benchmark.scenarios().items():
+                    for response_format, (function, extra) in (
+                            self.get_formats(view).items()):
+                        measurement = benchmark.Measurement(
+                            function, options['runs'], repo_name=repo.name,
+                            **filters, **extra)
+                        self.stdout.write(
+                            f'{scenario:<22} {response_format:<12}'
+                            f'{measurement.median * 1000:>8.0f}ms median '
+                            f'{measurement.best * 1000:>8.0f}ms best '
+                            f'{measurement.queries:>3} queries '
+                            f'{measurement.size / 1024:>9.1f}KB')
+            if not options['keep']:
+                transaction.set_rollback(True)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from charts.cache import chart_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Reports the hits and misses of the chart data cache, and its '
+        'entries and bytes against their bounds.'
+    )
+
+    def handle(self, *args, **options):
+        stats = chart_cache.stats()
+        requests = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / requests if requests else 0
+        self.stdout.write(
+            f'{stats["hits"]} hits, {stats["misses"]} misses '
+            f'({ratio:.1%} hit ratio)')
+        self.stdout.write(
+            f'{stats["entries"]} of {chart_cache.max_entries} entries, '
+            f'{stats["bytes"] / 1024 / 1024:.1f} of '
+            f'{chart_cache.max_bytes / 1024 / 1024:.0f}MB')
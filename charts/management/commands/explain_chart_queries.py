@@ -0,0 +1,62 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from boards import synthetic
+from boards.models import Repo
+from charts import benchmark
+from charts.views import ChartResponseView
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates a synthetic repo, prints the query plans of the chart '
+        'filters and times the chart data. Rolled back unless --keep.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--issues', type=int, default=100000)
+        parser.add_argument('--pipelines', type=int, default=8)
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument(
+            '--repo', type=str, default='synthetic-benchmark')
+        parser.add_argument(
+            '--keep', action='store_true', default=False,
+            help='Keep the synthetic repo')
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def handle(self, *args, **options):
+        view = ChartResponseView()
+        with transaction.atomic():
+            repo = Repo.objects.filter(name=options['repo']).first()
+            if not repo:
+                started = perf_counter()
+                repo = synthetic.create_repo(
+                    options['repo'], issues=options['issues'],
+                    pipelines=options['pipelines'])
+                self.stdout.write(
+                    f'created {options["issues"]} issues in '
+                    f'{perf_counter() - started:.1f}s')
+            for name, filters in benchmark.scenarios().items():
+                self.stdout.write(f'\n== {name} {filters}')
+                issues = view.get_issues(repo, **filters).order_by(
+                    'latest_transfer_date')
+                self.stdout.write(self.explain(issues))
+                measurement = benchmark.Measurement(
+                    view.get_chart_data, options['runs'],
+                    repo_name=repo.name, **filters)
+                points = sum(
+                    len(s['data']) for s in measurement.data['series']
+                    if s['type'] == 'scatter')
+                self.stdout.write(
+                    f'get_chart_data: {points} issues, '
+                    f'median {measurement.median * 1000:.0f}ms, '
+                    f'best {measurement.best * 1000:.0f}ms')
+            if not options['keep']:
+                transaction.set_rollback(True)
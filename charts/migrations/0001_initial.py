@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 15:05
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('boards', '0007_labels'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('durations', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=255), blank=True, default=list, size=None)),
+                ('data_version', models.PositiveIntegerField()),
+                ('content', models.TextField()),
+                ('columnar', models.TextField()),
+                ('built_at', models.DateTimeField()),
+                ('build_time', models.FloatField(help_text='seconds')),
+                ('repo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chart_snapshots', to='boards.Repo')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='chartsnapshot',
+            unique_together=set([('repo', 'durations')]),
+        ),
+    ]
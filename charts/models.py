@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.utils.timezone import now
+
+
+class ChartSnapshotQuerySet(models.QuerySet):
+
+    def fresh(self):
+        """
+        Snapshots recent enough to serve, the time open issues have spent
+        in their pipeline is frozen at built_at.
+        """
+        max_age = timedelta(seconds=settings.CHART_SNAPSHOTS['max_age'])
+        return self.filter(built_at__gte=now() - max_age)
+
+
+class ChartSnapshot(models.Model):
+    """
+    Chart data of a repo precomputed after a sync, for the default filters
+    and a few pipeline selections. Only served while `data_version`
+    matches the repo's.
+    """
+    repo = models.ForeignKey('boards.Repo', related_name='chart_snapshots')
+    # sorted selected pipelines, empty for all of them
+    durations = ArrayField(
+        models.CharField(max_length=255), default=list, blank=True)
+    data_version = models.PositiveIntegerField()
+    content = models.TextField()
+    columnar = models.TextField()
+    built_at = models.DateTimeField()
+    build_time = models.FloatField(help_text='seconds')
+
+    objects = ChartSnapshotQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.repo} {",".join(self.durations) or "all pipelines"}'
+
+    class Meta:
+        unique_together = (('repo', 'durations'),)
@@ -0,0 +1,67 @@
+"""
+Chart snapshots, the charts most requests ask for, built once a repo is
+synced instead of on every request.
+"""
+from time import perf_counter
+import json
+import logging
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.timezone import now
+
+from boards.models import CLOSED_PIPELINE_NAME
+from charts.encoding import iter_json
+from charts.models import ChartSnapshot
+from charts.views import ChartResponseView
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_durations(repo):
+    """
+    Pipeline selections to snapshot: all pipelines, each board pipeline
+    alone and the combinations listed in settings.CHART_SNAPSHOTS.
+    """
+    names = list(repo.pipeline_set.exclude(
+        name=CLOSED_PIPELINE_NAME
+    ).order_by('order').values_list('name', flat=True))
+    selections = [[]] + [[name] for name in names]
+    for combination in settings.CHART_SNAPSHOTS['pipelines']:
+        if set(combination) <= set(names):
+            selections.append(sorted(set(combination)))
+    unique = []
+    for selection in selections:
+        if selection not in unique:
+            unique.append(selection)
+    return unique
+
+
+def build_snapshots(repo):
+    """
+    Replaces the snapshots of `repo` with ones of its current data.
+    """
+    view = ChartResponseView()
+    started = perf_counter()
+    selections = snapshot_durations(repo)
+    kept = []
+    for durations in selections:
+        built = perf_counter()
+        params = {'repo_name': repo.name, 'durations': durations or None}
+        content = json.dumps(
+            view.get_chart_data(**params), cls=DjangoJSONEncoder)
+        columnar = ''.join(iter_json(view.get_columnar_data(**params)))
+        snapshot, _ = ChartSnapshot.objects.update_or_create(
+            repo=repo, durations=durations, defaults={
+                'data_version': repo.data_version,
+                'content': content,
+                'columnar': columnar,
+                'built_at': now(),
+                'build_time': perf_counter() - built,
+            })
+        kept.append(snapshot.pk)
+    ChartSnapshot.objects.filter(repo=repo).exclude(pk__in=kept).delete()
+    logger.info(
+        f'built {len(selections)} chart snapshots of {repo} in '
+        f'{perf_counter() - started:.1f}s')
+
@@ -0,0 +1,161 @@
+import numpy as np
+from django.utils.timezone import now
+
+PERCENTS = (25, 50, 75, 90)
+
+
+def open_durations(issues, at=None):
+    """
+    Seconds every issue spent in its current pipeline until `at`, 0 for
+    closed issues. Stored durations only go until the latest transfer.
+    """
+    at = (at or now()).timestamp()
+    is_open = np.array([i.is_open for i in issues], dtype=bool)
+    since = np.array(
+        [i.latest_transfer_date.timestamp() for i in issues], dtype=float)
+    return np.where(is_open, at - since, 0.0)
+
+
+class CycleTimeMatrix(object):
+    """
+    Dense issues x pipelines matrix of the seconds every issue spent in each
+    pipeline until `at`. Issues are read once; everything else is computed
+    on columns. `ages`, the result of open_durations, can be given instead
+    of `at` when already known.
+    """
+
+    def __init__(self, issues, at=None, ages=None):
+        self.issues = issues
+        self.pipelines = sorted(
+            {k for i in issues for k in i.durations} |
+            {i.current_pipeline_name for i in issues if i.is_open}
+        )
+        self.columns = {
+            name: index for index, name in enumerate(self.pipelines)
+        }
+        self.values = np.zeros((len(issues), len(self.pipelines)))
+        current = np.zeros(len(issues), dtype=int)
+        for row, issue in enumerate(issues):
+            for name, seconds in issue.durations.items():
+                self.values[row, self.columns[name]] = seconds
+            if issue.is_open:
+                current[row] = self.columns[issue.current_pipeline_name]
+        rows = np.arange(len(issues))
+        if ages is None:
+            ages = open_durations(issues, at)
+        self.values[rows, current] += ages
+
+    def __len__(self):
+        return len(self.issues)
+
+    def mask(self, pipelines=None):
+        """
+        Boolean column mask for the selected pipelines, all of them if
+        nothing is selected.
+        """
+        if not pipelines:
+            return np.ones(len(self.pipelines), dtype=bool)
+        return np.isin(self.pipelines, list(pipelines))
+
+    def totals(self, mask=None):
+        if mask is None:
+            return self.values.sum(axis=1)
+        return self.values[:, mask].sum(axis=1)
+
+
+def rolling_average(totals, frame):
+    """
+    Rolling average and mean deviation of `totals` over `frame` items.
+    Returns the positions the windows are centered on, the averages and the
+    mean deviations. Windows at the end of the series are cut short but
+    still divided by `frame`.
+    http://tinyurl.com/yaybq6g9
+    """
+    count = len(totals)
+    half = frame // 2
+    last = min(count - 1, count - half + 1)
+    positions = np.arange(half, last + 1)
+    if not len(positions):
+        empty = np.empty(0)
+        return positions, empty, empty
+    low = positions - half
+    high = np.minimum(positions + half + 1, count)
+    cumulative = np.concatenate(([0.0], np.cumsum(totals)))
+    averages = (cumulative[high] - cumulative[low]) / frame
+    window = low[:, None] + np.arange(2 * half + 1)
+    inside = window < high[:, None]
+    values = totals[np.minimum(window, count - 1)]
+    deviations = np.where(
+        inside, np.abs(values - averages[:, None]), 0).sum(axis=1) / frame
+    return positions, averages, deviations
+
+
+def median(totals):
+    if not len(totals):
+        return 0
+    return float(np.median(totals))
+
+
+def average(totals):
+    if not len(totals):
+        return 0
+    return float(np.mean(totals))
+
+
+def percentiles(totals, percents=PERCENTS):
+    """
+    Linearly interpolated percentiles, same as Postgres' percentile_cont.
+    """
+    if not len(totals):
+        return [0] * len(percents)
+    return np.percentile(totals, percents).tolist()
+
+
+def buckets(x, totals, width, offset=0):
+    """
+    Splits the issues into time buckets of `width` starting at `offset`,
+    `x` being sorted. Returns the start of every non empty bucket, the
+    number of issues in it and their percentiles.
+    """
+    if not len(x):
+        return (
+            np.empty(0), np.empty(0, dtype=int),
+            np.empty((0, len(PERCENTS))))
+    keys = np.floor((x - offset) / width)
+    keys, starts, counts = np.unique(
+        keys, return_index=True, return_counts=True)
+    values = np.array([
+        percentiles(totals[start:start + count])
+        for start, count in zip(starts, counts)
+    ])
+    return keys * width + offset, counts, values
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of the `threshold`
+    points that keep the visual shape of the series, `x` being sorted.
+    Every bucket keeps the point that forms the largest triangle with the
+    point kept before it and the average of the next bucket.
+    https://skemman.is/handle/1946/15343
+    """
+    count = len(x)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+    every = (count - 2) / (threshold - 2)
+    selected = np.zeros(threshold, dtype=int)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, count)
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous]) -
+            (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    selected[-1] = count - 1
+    return selected
@@ -1,14 +1,104 @@
+import logging
+
+from celery import chord, group, shared_task
 from celery.schedules import crontab
 from celery.task import periodic_task
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
 
 from boards.fetcher.fetch import Fetcher
+from boards.fetcher.locks import RepoLock
 from boards.models import Repo
 
+logger = logging.getLogger(__name__)
+
 
-@periodic_task(run_every=crontab(minute=0, hour='*/3'),  # every 3 hours
+@periodic_task(run_every=crontab(
+                   minute=0,
+                   hour=f'*/{settings.FETCHER_TASKS["every_hours"]}'),
                name='Periodic data update')
 def fetch():
-    repos = Repo.objects.all()
-    for repo in repos:
-        fetcher = Fetcher([repo.name])
-        fetcher.sync()
+    repo_names = Repo.objects.values_list('name', flat=True)
+    group(sync_repo.s(name) for name in repo_names).apply_async()
+
+
+@shared_task(name='Sync repo')
+def sync_repo(repo_name):
+    """
+    Syncs a repo unless it is already being synced. Big syncs are split in
+    chunks of issues fetched by parallel tasks, the last one to finish
+    completes the sync and releases the lock, or abort_sync releases it if
+    a chunk fails.
+    """
+    lock = RepoLock(repo_name)
+    if not lock.acquire():
+        logger.info(f'{repo_name} is already being synced, skipping')
+        return
+    try:
+        started_at = now()
+        repo = Repo.objects.get(name=repo_name)
+        fetcher = Fetcher([repo_name])
+        issue_numbers = fetcher.get_sync_issue_numbers(repo)
+        chunk_size = settings.FETCHER_TASKS['chunk_size']
+        if len(issue_numbers) > chunk_size:
+            chunks = [
+                issue_numbers[i:i + chunk_size]
+                for i in range(0, len(issue_numbers), chunk_size)
+            ]
+            logger.info(
+                f'syncing {len(issue_numbers)} issues of {repo} in '
+                f'{len(chunks)} chunks')
+            chord(
+                sync_issues.s(repo_name, chunk) for chunk in chunks
+            )(finish_sync.s(
+                repo_name, started_at.isoformat(), lock.token
+            ).on_error(abort_sync.s(repo_name, lock.token)))
+            return
+        fetcher.sync_issues(repo, issue_numbers)
+        fetcher.report()
+        complete_sync(repo, fetcher, started_at, len(issue_numbers))
+    except Exception:
+        lock.release()
+        raise
+    lock.release()
+
+
+@shared_task(name='Sync issues')
+def sync_issues(repo_name, issue_numbers):
+    repo = Repo.objects.get(name=repo_name)
+    fetcher = Fetcher([repo_name])
+    fetcher.load_pipelines(repo)
+    fetcher.sync_issues(repo, issue_numbers)
+    fetcher.report()
+    return len(issue_numbers)
+
+
+@shared_task(name='Finish sync')
+def finish_sync(issue_counts, repo_name, started_at, lock_token):
+    lock = RepoLock(repo_name, token=lock_token)
+    try:
+        repo = Repo.objects.get(name=repo_name)
+        complete_sync(
+            repo, Fetcher([repo_name]), parse_datetime(started_at),
+            sum(issue_counts))
+    finally:
+        lock.release()
+
+
+@shared_task(name='Abort sync')
+def abort_sync(task_id, repo_name, lock_token):
+    """
+    Error callback of a chunked sync: finish_sync never runs once a chunk
+    failed, the next periodic run syncs the repo again.
+    """
+    logger.error(f'a chunk of the sync of {repo_name} failed ({task_id})')
+    RepoLock(repo_name, token=lock_token).release()
+
+
+def complete_sync(repo, fetcher, started_at, issue_count):
+    # the chart views and NumPy are loaded by the first sync, not at startup
+    from charts.snapshots import build_snapshots
+    fetcher.finish_sync(repo, started_at, issue_count)
+    repo.refresh_from_db()
+    build_snapshots(repo)
@@ -1,3 +1,634 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+from urllib.parse import urlencode
+import json
+import os
+import tempfile
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import utc
+
+from boards import synthetic
+from boards.models import (
+    CLOSED_PIPELINE_NAME, Issue, Pipeline, Repo, Transfer
+)
+from boards.fetcher.locks import RepoLock
+from charts import benchmark, stats, tasks
+from charts.cache import ChartCache, chart_cache
+from charts.expressions import PercentileCont
+from charts.flow import DAY, Flow, sweep
+from charts.models import ChartSnapshot
+from charts.snapshots import build_snapshots
+from charts.views import ChartResponseView
+from zenhub_charts import profiling
+
+# Most queries a chart may take, whatever the number of issues
+QUERY_BUDGETS = {
+    'chart-data': 6,
+    'snapshot': 2,
+    'chart': 3,
+    'issues': 3,
+}
+# Most bytes a chart may take per issue, or as a whole if aggregated
+SIZE_BUDGETS = {
+    'points': 500,
+    'columnar': 250,
+    'issues': 400,
+    'weekly': 12 * 1024,
+    'downsampled': 24 * 1024,
+}
+FILTERS = {
+    'default': {},
+    'pipelines': {'durations': ','.join(synthetic.PIPELINE_NAMES[2:4])},
+    'labels': {'labels': 'bug'},
+    'pipelines and labels': {
+        'durations': ','.join(synthetic.PIPELINE_NAMES[2:4]),
+        'labels': 'bug,ui',
+    },
+    'issue numbers': {'issue-numbers': '1,2,3,5,8,13'},
+}
+
+
+class ChartBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.small = synthetic.create_repo(
+            'small', issues=40, seed=1, repo_id=1)
+        cls.large = synthetic.create_repo(
+            'large', issues=400, seed=2, repo_id=2)
+
+    def setUp(self):
+        # every request computes its chart, nothing comes from Redis
+        for method, value in (('get', None), ('set', None)):
+            patcher = mock.patch.object(
+                chart_cache, method, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(
+            chart_cache, 'iter_set',
+            side_effect=lambda key, chunks, timeout=None: chunks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, path, repo, **params):
+        """
+        Requests `path` for a repo or a repo parameter, returns the
+        response, its queries and its body.
+        """
+        if isinstance(repo, Repo):
+            repo = repo.name
+        query = urlencode(dict(params, repo=repo))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'{path}?{query}')
+            if response.streaming:
+                body = b''.join(response.streaming_content)
+            else:
+                body = response.content
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries), body
+
+    def count(self, repo):
+        data = ChartResponseView().get_chart_data(repo.name, aggregate='week')
+        return data['count']
+
+    def test_chart_data_queries_do_not_grow_with_issues(self):
+        for name, filters in FILTERS.items():
+            for extra in ({}, {'format': 'columnar'}, {'aggregate': 'week'},
+                          {'points': 100}):
+                params = dict(filters, **extra)
+                with self.subTest(name, **extra):
+                    _, small, _ = self.get(
+                        '/cycle-time/chart-data/', self.small, **params)
+                    _, large, _ = self.get(
+                        '/cycle-time/chart-data/', self.large, **params)
+                    self.assertEqual(small, large)
+                    self.assertLessEqual(
+                        large, QUERY_BUDGETS['chart-data'])
+
+    def test_chart_data_size_budgets(self):
+        issues = self.count(self.large)
+        self.assertGreater(issues, 100)
+        _, _, body = self.get('/cycle-time/chart-data/', self.large)
+        self.assertLessEqual(len(body) / issues, SIZE_BUDGETS['points'])
+        _, _, body = self.get(
+            '/cycle-time/chart-data/', self.large, format='columnar')
+        self.assertLessEqual(len(body) / issues, SIZE_BUDGETS['columnar'])
+        _, _, body = self.get(
+            '/cycle-time/chart-data/', self.large, aggregate='week')
+        self.assertLessEqual(len(body), SIZE_BUDGETS['weekly'])
+        _, _, body = self.get(
+            '/cycle-time/chart-data/', self.large, points=100)
+        self.assertLessEqual(len(body), SIZE_BUDGETS['downsampled'])
+
+    def test_snapshots_are_served_without_chart_queries(self):
+        build_snapshots(self.large)
+        response, queries, _ = self.get(
+            '/cycle-time/chart-data/', self.large)
+        self.assertEqual(response['X-Cache'], 'SNAPSHOT')
+        self.assertLessEqual(queries, QUERY_BUDGETS['snapshot'])
+
+    def test_snapshots_are_cached_until_they_expire(self):
+        build_snapshots(self.large)
+        max_age = settings.CHART_SNAPSHOTS['max_age']
+        ChartSnapshot.objects.update(
+            built_at=datetime.now(utc) - timedelta(seconds=max_age - 100))
+        response, _, _ = self.get('/cycle-time/chart-data/', self.large)
+        self.assertEqual(response['X-Cache'], 'SNAPSHOT')
+        timeout = chart_cache.set.call_args[0][2]
+        self.assertLessEqual(timeout, 100)
+        self.assertGreater(timeout, 0)
+
+    def test_default_window_follows_the_cache_bucket(self):
+        view = ChartResponseView()
+        bucket = chart_cache.bucket()
+        since, until = view.get_window()
+        self.assertIsNone(until)
+        with mock.patch.object(chart_cache, 'bucket', return_value=bucket + 1):
+            later, _ = view.get_window()
+        self.assertEqual(
+            (later - since).total_seconds(), chart_cache.age_bucket)
+        self.assertEqual(view.get_window(since='0', until='86400000'), (
+            datetime.fromtimestamp(0), datetime.fromtimestamp(86400)))
+        response = self.client.get(
+            '/cycle-time/chart-data/?repo=small&since=abc&until=1')
+        self.assertEqual(response.status_code, 400)
+
+    def test_open_issues_ages_expire_cached_charts(self):
+        first, _, _ = self.get('/cycle-time/chart-data/', self.large)
+        with mock.patch.object(
+                chart_cache, 'bucket', return_value=chart_cache.bucket() + 1):
+            later, _, _ = self.get('/cycle-time/chart-data/', self.large)
+        self.assertNotEqual(first['ETag'], later['ETag'])
+        self.assertEqual(
+            chart_cache.set.call_args[0][2], chart_cache.age_bucket)
+
+    def test_chart_page_queries(self):
+        _, small, _ = self.get('/', self.small)
+        _, large, _ = self.get('/', self.large)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, QUERY_BUDGETS['chart'])
+
+    def test_issues_page_budgets(self):
+        _, small, _ = self.get('/cycle-time/issues/', self.small)
+        _, large, body = self.get(
+            '/cycle-time/issues/', self.large, page_size=100)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, QUERY_BUDGETS['issues'])
+        self.assertLessEqual(len(body) / 100, SIZE_BUDGETS['issues'])
+
+    def test_aggregated_and_downsampled_chart_data(self):
+        issues = self.count(self.large)
+        response, _, _ = self.get(
+            '/cycle-time/chart-data/', self.large, points=50)
+        data = response.json()
+        self.assertEqual(data['count'], issues)
+        series = {s['id']: s for s in data['series']}
+        self.assertLessEqual(len(series['average']['data']), 50)
+        scatter = [
+            point for s in data['series'] if s['type'] == 'scatter'
+            for point in s['data']]
+        self.assertEqual(len(scatter), 50)
+        self.assertEqual(set(scatter[0]), {'x', 'y', 'issue_number'})
+        response, _, _ = self.get(
+            '/cycle-time/chart-data/', self.large, aggregate='week')
+        data = response.json()
+        median = [s for s in data['series'] if s['id'] == 'median'][0]
+        self.assertEqual(
+            sum(point['count'] for point in median['data']), issues)
+        self.assertEqual(
+            [s['type'] for s in data['series']],
+            ['arearange', 'line', 'line'])
+
+    def test_invalid_chart_params(self):
+        for path in ('/cycle-time/chart-data/', '/cycle-time/issues/'):
+            for params in ({'frame': '4'}, {'frame': '-1'},
+                           {'frame': 'abc'}, {'points': '2'},
+                           {'points': '1.5'}):
+                with self.subTest(path, **params):
+                    response = self.client.get(
+                        f'{path}?{urlencode(dict(params, repo="small"))}')
+                    self.assertEqual(response.status_code, 400)
+        self.get('/cycle-time/chart-data/', self.small, frame=5, points=3)
+
+    def test_issues_page_size_is_clamped(self):
+        for page_size, issues in (('0', 1), ('-5', 1), ('1000', 500)):
+            with self.subTest(page_size=page_size):
+                response, _, _ = self.get(
+                    '/cycle-time/issues/', self.large, page_size=page_size)
+                self.assertEqual(
+                    len(response.json()['issues']),
+                    min(issues, self.count(self.large)))
+        response = self.client.get(
+            '/cycle-time/issues/?repo=large&page_size=abc')
+        self.assertEqual(response.status_code, 400)
+
+    def test_repos_are_charted_in_one_pass(self):
+        for name, filters in FILTERS.items():
+            for extra in ({}, {'format': 'columnar'}, {'aggregate': 'week'},
+                          {'points': 100}):
+                params = dict(filters, **extra)
+                with self.subTest(name, **extra):
+                    _, single, _ = self.get(
+                        '/cycle-time/chart-data/', self.large, **params)
+                    _, both, _ = self.get(
+                        '/cycle-time/chart-data/', 'small,large', **params)
+                    # no snapshot is looked up for several repos
+                    self.assertLessEqual(both, single)
+        response, queries, _ = self.get('/cycle-time/chart-data/', 'all')
+        # and the names of the repos
+        self.assertLessEqual(queries, QUERY_BUDGETS['chart-data'] + 1)
+        data = response.json()
+        self.assertEqual(list(data['repos']), ['large', 'small'])
+        for repo in (self.small, self.large):
+            self.assertEqual(
+                data['repos'][repo.name]['count'], self.count(repo))
+        self.assertEqual(
+            data['count'], self.count(self.small) + self.count(self.large))
+        scatter = [s for s in data['series'] if s['type'] == 'scatter']
+        self.assertEqual(
+            [(s['id'], s['repo']) for s in scatter],
+            [('large', 'large'), ('small', 'small')])
+        self.assertIn('small:average', [s['id'] for s in data['series']])
+        columnar = json.loads(self.get(
+            '/cycle-time/chart-data/', 'all', format='columnar')[2])
+        self.assertEqual(
+            columnar['issue_urls']['small'],
+            f'{self.small.github_url}/issues/')
+        self.assertEqual(
+            sum(len(s['columns']['x']) for s in columnar['series']
+                if s['type'] == 'scatter'), data['count'])
+
+    def test_open_issues_age_on_read(self):
+        view = ChartResponseView()
+        at = datetime.now(utc)
+        points = []
+        for day in (0, 1):
+            with mock.patch(
+                    'charts.views.now', return_value=at + timedelta(days=day)):
+                data = view.get_chart_data(self.small.name)
+            points.append({
+                point['issue_number']: point
+                for series in data['series'] if series['type'] == 'scatter'
+                for point in series['data']
+            })
+        before, after = points
+        issues = Issue.objects.filter(repo=self.small, number__in=before)
+        self.assertTrue(any(i.is_open for i in issues))
+        self.assertTrue(any(not i.is_open for i in issues))
+        for issue in issues:
+            day = 86400 * 1000 if issue.is_open else 0
+            self.assertAlmostEqual(
+                after[issue.number]['y'] - before[issue.number]['y'], day)
+            for name, duration in before[issue.number]['durations'].items():
+                grown = day if name == issue.current_pipeline_name else 0
+                self.assertAlmostEqual(
+                    after[issue.number]['durations'][name] - duration, grown)
+
+    def test_benchmark_scenarios_run_within_budget(self):
+        view = ChartResponseView()
+        for name, filters in benchmark.scenarios().items():
+            with self.subTest(name):
+                measurement = benchmark.Measurement(
+                    view.get_chart_data, repo_name=self.large.name,
+                    **filters)
+                self.assertLessEqual(
+                    measurement.queries, QUERY_BUDGETS['chart-data'])
+
+
+def baseline_rolling_average(totals, frame):
+    """
+    The rolling average the chart views computed issue by issue before it
+    moved to stats.rolling_average, as positions, averages and deviations.
+    """
+    positions, averages, deviations = [], [], []
+    count = len(totals)
+    for order in range(count):
+        if order < frame // 2 or count - frame // 2 < order - 1:
+            continue
+        window = totals[order - frame // 2:order + frame // 2 + 1]
+        average = sum(window) / frame
+        positions.append(order)
+        averages.append(average)
+        deviations.append(sum(abs(t - average) for t in window) / frame)
+    return positions, averages, deviations
+
+
+class StatsTests(TestCase):
+
+    def test_rolling_average_matches_the_baseline(self):
+        totals = np.random.RandomState(7).exponential(86400, 50).round()
+        for count in (0, 1, 4, 5, 9, 10, 50):
+            for frame in (1, 3, 9, 11, 25, 99):
+                with self.subTest(count=count, frame=frame):
+                    positions, averages, deviations = (
+                        stats.rolling_average(totals[:count], frame))
+                    expected = baseline_rolling_average(
+                        totals[:count].tolist(), frame)
+                    self.assertEqual(positions.tolist(), expected[0])
+                    np.testing.assert_allclose(averages, expected[1])
+                    np.testing.assert_allclose(deviations, expected[2])
+
+
+    def test_percentiles_are_interpolated_like_postgres(self):
+        repo = Repo.objects.create(repo_id=1, name='percentiles')
+        cycle_times = [100, 0, 30, 10, 20]
+        Issue.objects.bulk_create([
+            Issue(repo=repo, number=number, title='', labels=[],
+                  durations={'Backlog': cycle_time}, cycle_time=cycle_time,
+                  latest_transfer_date=datetime(2017, 10, 1, tzinfo=utc))
+            for number, cycle_time in enumerate(cycle_times, 1)
+        ])
+        fractions = [p / 100 for p in stats.PERCENTS]
+        expected = [10, 20, 30, 72]
+        self.assertEqual(
+            Issue.objects.aggregate(percentiles=PercentileCont(
+                'cycle_time', fractions))['percentiles'], expected)
+        self.assertEqual(
+            stats.percentiles(np.array(cycle_times, dtype=float)),
+            expected)
+        self.assertEqual(stats.percentiles(np.empty(0)), [0] * 4)
+
+    def test_lttb_keeps_the_ends_and_the_peaks(self):
+        x = np.arange(100, dtype=float)
+        y = np.zeros(100)
+        y[37] = 50
+        kept = stats.lttb(x, y, 10)
+        self.assertEqual(len(kept), 10)
+        self.assertEqual((kept[0], kept[-1]), (0, 99))
+        self.assertIn(37, kept.tolist())
+        self.assertEqual(kept.tolist(), sorted(kept.tolist()))
+        self.assertEqual(stats.lttb(x, y, 100).tolist(), list(range(100)))
+        self.assertEqual(stats.lttb(x, y, 2).tolist(), list(range(100)))
+
+    def test_buckets(self):
+        x = np.array([0, 1, 2, 10, 11, 30], dtype=float)
+        totals = np.array([1, 2, 3, 4, 6, 5], dtype=float)
+        starts, counts, values = stats.buckets(x, totals, 10, offset=-5)
+        self.assertEqual(starts.tolist(), [-5, 5, 25])
+        self.assertEqual(counts.tolist(), [3, 2, 1])
+        self.assertEqual(values[:, stats.PERCENTS.index(50)].tolist(),
+                         [2, 5, 5])
+        starts, counts, values = stats.buckets(np.empty(0), np.empty(0), 10)
+        self.assertEqual((len(starts), values.shape), (0, (0, 4)))
+
+    def test_sql_summary_matches_the_python_summary(self):
+        repo = synthetic.create_repo('summary', issues=80, seed=3, repo_id=3)
+        view = ChartResponseView()
+        at = datetime.now(utc)
+        issues = view.get_issues(repo)
+        # totals from the durations, not from the stored cycle_time
+        matrix = stats.CycleTimeMatrix(list(issues), at)
+        expected = view.get_summary_from_totals(
+            view._js_time(matrix.totals()))
+        summary = view.get_summary(issues, at)
+        self.assertGreater(len(matrix), 10)
+        for name in ('median', 'average'):
+            self.assertAlmostEqual(summary[name], expected[name], delta=1)
+        np.testing.assert_allclose(
+            summary['percentiles'], expected['percentiles'], atol=1)
+
+
+class ChartCacheTests(TestCase):
+
+    def setUp(self):
+        self.cache = ChartCache(max_entries=10)
+        self.cache.prefix = 'test-chart-data'
+        self.cache.buffer_size = 4
+        self.addCleanup(self.clear)
+
+    def clear(self):
+        keys = self.cache.redis.keys(f'{self.cache.prefix}:*')
+        if keys:
+            self.cache.redis.delete(*keys)
+
+    def test_streamed_charts_are_appended(self):
+        chunks = [b'{"series": ', b'[1, 2, 3]', b', ', b'"count": 3}']
+        with mock.patch.object(
+                self.cache, 'append', wraps=self.cache.append) as append:
+            self.assertEqual(list(self.cache.iter_set('key', chunks)), chunks)
+        self.assertEqual(append.call_count, 4)
+        self.assertEqual(self.cache.get('key'), b''.join(chunks))
+        self.assertEqual(
+            self.cache.redis.keys(f'{self.cache.prefix}:partial:*'), [])
+
+    def test_entries_are_bounded_in_bytes(self):
+        self.cache.max_bytes = 10
+        self.cache.set('old', b'123456')
+        self.cache.set('new', b'123456')
+        self.assertIsNone(self.cache.get('old'))
+        self.assertEqual(self.cache.get('new'), b'123456')
+        counters = self.cache.stats()
+        self.assertEqual((counters['entries'], counters['bytes']), (1, 6))
+        self.assertEqual((counters['hits'], counters['misses']), (1, 1))
+
+    def test_stats_command(self):
+        counters = {
+            'hits': 3, 'misses': 1, 'entries': 2, 'bytes': 1024 * 1024}
+        out = StringIO()
+        with mock.patch.object(chart_cache, 'stats', return_value=counters):
+            call_command('chart_cache_stats', stdout=out)
+        self.assertIn('3 hits, 1 misses (75.0% hit ratio)', out.getvalue())
+        self.assertIn('2 of 1000 entries, 1.0 of', out.getvalue())
+
+    def test_interrupted_streams_are_not_cached(self):
+        streamed = self.cache.iter_set('key', [b'{"series": ', b'[1, 2]}'])
+        next(streamed)
+        next(streamed)
+        streamed.close()
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(
+            self.cache.redis.keys(f'{self.cache.prefix}:partial:*'), [])
+
+
+class ProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.repo = synthetic.create_repo('profiled', issues=50, repo_id=1)
+
+    def setUp(self):
+        for target, method in ((chart_cache, 'get'), (chart_cache, 'set'),
+                               (profiling.metrics, 'flush')):
+            patcher = mock.patch.object(target, method, return_value=None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        profiling.metrics._pending.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(PROFILING={
+            'enabled': True, 'sample_rate': 0, 'directory': self.directory})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_phases_are_timed(self):
+        response = self.client.get(
+            '/cycle-time/chart-data/?repo=profiled&durations=Icebox')
+        timings = dict(
+            phase.split(';', 1)
+            for phase in response['Server-Timing'].split(', '))
+        self.assertEqual(
+            set(timings),
+            {'chart.sql', 'chart.stats', 'chart.points', 'chart.json',
+             'request'})
+        # the repo, its Icebox pipeline and the issues
+        self.assertIn('desc="3 queries"', timings['chart.sql'])
+        self.assertEqual(
+            profiling.metrics._pending['chart.sql:queries'], 3)
+        self.assertEqual(profiling.metrics._pending['request:calls'], 1)
+
+    def test_staff_gets_the_profile(self):
+        User.objects.create_user('staff', password='password', is_staff=True)
+        self.client.login(username='staff', password='password')
+        response = self.client.get(
+            '/cycle-time/chart-data/?repo=profiled&profile')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertIn(b'get_chart_data', response.content)
+        [path] = os.listdir(self.directory)
+        self.assertTrue(path.startswith('request-cycle-time-chart-data-'))
+
+    def test_exposition(self):
+        self.assertEqual(profiling.exposition({
+            'chart.sql': {'seconds': 0.25, 'calls': 2, 'queries': 6},
+        }), (
+            '# HELP zenhub_charts_phase_seconds_total Time spent in the '
+            'phase.\n'
+            '# TYPE zenhub_charts_phase_seconds_total counter\n'
+            'zenhub_charts_phase_seconds_total{phase="chart.sql"} 0.25\n'
+            '# HELP zenhub_charts_phase_calls_total Times the phase ran.\n'
+            '# TYPE zenhub_charts_phase_calls_total counter\n'
+            'zenhub_charts_phase_calls_total{phase="chart.sql"} 2\n'
+            '# HELP zenhub_charts_phase_queries_total SQL queries run in '
+            'the phase.\n'
+            '# TYPE zenhub_charts_phase_queries_total counter\n'
+            'zenhub_charts_phase_queries_total{phase="chart.sql"} 6\n'
+        ))
+
+
+class FlowTests(TestCase):
+
+    def setUp(self):
+        self.repo = Repo.objects.create(repo_id=1, name='flow')
+        self.backlog, self.in_progress, self.closed = (
+            Pipeline.objects.create(
+                repo=self.repo, name=name, pipeline_id=name, order=order)
+            for order, name in ((0, 'Backlog'), (1, 'In Progress'),
+                                (10000, CLOSED_PIPELINE_NAME)))
+        self.start = datetime(2017, 10, 1, 9, tzinfo=utc)
+        self.at = self.start + timedelta(days=9)
+        # #1 is started on the 3rd and closed on the 5th, #2 is started
+        # the day it is created
+        self.add_issue(1, (0, self.backlog), (2, self.in_progress),
+                       (4, self.closed))
+        self.add_issue(2, (1, self.backlog), (1.1, self.in_progress))
+        for method in ('get', 'set'):
+            patcher = mock.patch.object(
+                chart_cache, method, return_value=None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def add_issue(self, number, *moves):
+        issue = Issue.objects.create(
+            repo=self.repo, number=number, title=f'#{number}', labels=[],
+            durations={}, cycle_time=0,
+            latest_transfer_date=self.start + timedelta(days=moves[-1][0]))
+        previous = None
+        for days, pipeline in moves:
+            Transfer.objects.create(
+                issue=issue, from_pipeline=previous, to_pipeline=pipeline,
+                transfered_at=self.start + timedelta(days=days))
+            previous = pipeline
+
+    def test_sweep(self):
+        flow = sweep(self.repo, self.at)
+        self.assertEqual(flow.start, self.start.timestamp() // DAY * DAY)
+        self.assertEqual(len(flow), 10)
+        self.assertEqual(
+            flow.column('Backlog').tolist(), [1, 1] + [0] * 8)
+        self.assertEqual(
+            flow.column('In Progress').tolist(), [0, 1, 2, 2] + [1] * 6)
+        self.assertEqual(flow.column('Closed').tolist(), [0] * 4 + [1] * 6)
+        self.assertEqual(flow.created.tolist(), [1, 1] + [0] * 8)
+        self.assertEqual(flow.closed.tolist(), [0] * 4 + [1] + [0] * 5)
+        days = flow.between(
+            self.start + timedelta(days=2), self.start + timedelta(days=4))
+        self.assertEqual(days.start, flow.start + 2 * DAY)
+        self.assertEqual(days.column('In Progress').tolist(), [2, 2, 1])
+
+    def test_views(self):
+        since = (self.start.timestamp() - DAY) * 1000
+        with mock.patch('charts.views.now', return_value=self.at), \
+                mock.patch('charts.flow.now', return_value=self.at):
+            wip = self.client.get(
+                f'/flow/wip/?repo=flow&since={since}').json()
+            throughput = self.client.get(
+                f'/flow/throughput/?repo=flow&since={since}').json()
+            response = self.client.get('/flow/cumulative-flow/?repo=flow')
+        self.assertEqual(wip['pipelines'], ['Backlog', 'In Progress'])
+        total = wip['series'][-1]
+        self.assertEqual(total['id'], 'total')
+        self.assertEqual(
+            [y for _, y in total['data']], [1, 2, 2, 2] + [1] * 6)
+        self.assertEqual(throughput['total'], 1)
+        self.assertEqual(
+            [y for _, y in throughput['series'][0]['data']][4], 1)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(
+            [s['id'] for s in response.json()['series']],
+            ['Closed', 'In Progress', 'Backlog'])
+        self.assertEqual(
+            self.client.get('/flow/wip/?repo=unknown').status_code, 404)
+
+    def test_flow_is_swept_once_for_every_chart(self):
+        cached = {}
+        for method, side_effect in (('get', cached.get),
+                                    ('set', cached.__setitem__)):
+            patcher = mock.patch.object(
+                chart_cache, method, side_effect=side_effect)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        since = (self.start.timestamp() + DAY) * 1000
+        with mock.patch('charts.views.now', return_value=self.at), \
+                mock.patch('charts.flow.now', return_value=self.at), \
+                mock.patch('charts.views.sweep', wraps=sweep) as swept:
+            wip = self.client.get(f'/flow/wip/?repo=flow&since={since}')
+            self.client.get('/flow/throughput/?repo=flow')
+            self.client.get('/flow/cumulative-flow/?repo=flow')
+        self.assertEqual(swept.call_count, 1)
+        self.assertEqual(
+            [y for _, y in wip.json()['series'][-1]['data']],
+            [2, 2, 2] + [1] * 6)
+        flow = Flow.loads(sweep(self.repo, self.at).dumps())
+        self.assertEqual(flow.pipelines, ['Backlog', 'In Progress', 'Closed'])
+        self.assertEqual(flow.column('Closed').tolist(), [0] * 4 + [1] * 6)
+
+
+class SyncTaskTests(TestCase):
+
+    def setUp(self):
+        Repo.objects.create(repo_id=1, name='chunked')
+        self.addCleanup(RepoLock('chunked').redis.delete, 'sync-lock:chunked')
+
+    def test_failed_chunks_release_the_lock(self):
+        fetcher = mock.Mock()
+        fetcher.get_sync_issue_numbers.return_value = [3, 2, 1]
+        with mock.patch.object(tasks, 'Fetcher', return_value=fetcher), \
+                mock.patch.object(tasks, 'chord') as chord, \
+                self.settings(FETCHER_TASKS=dict(
+                    tasks.settings.FETCHER_TASKS, chunk_size=2)):
+            tasks.sync_repo('chunked')
+        [callback], _ = chord.return_value.call_args
+        [errback] = callback.options['link_error']
+        self.assertEqual(errback['task'], 'Abort sync')
+        self.assertFalse(RepoLock('chunked').acquire())
+        tasks.abort_sync('callback-id', *errback['args'])
+        self.assertTrue(RepoLock('chunked').acquire())
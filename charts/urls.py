@@ -1,9 +1,15 @@
 from django.conf.urls import url
 
-from .views import ChartView, ChartResponseView
+from .views import ChartView, ChartResponseView, FlowView, IssuesView
 
 
 urlpatterns = [
     url(r'^$', ChartView.as_view(), name='chart'),  # we currently have only one chart
     url(r'^cycle-time/chart-data/$', ChartResponseView.as_view(), name='chart-data'),
+    url(r'^cycle-time/issues/$', IssuesView.as_view(), name='chart-issues'),
+    url(r'^flow/cumulative-flow/$',
+        FlowView.as_view(chart='cumulative-flow'), name='cumulative-flow'),
+    url(r'^flow/throughput/$',
+        FlowView.as_view(chart='throughput'), name='throughput'),
+    url(r'^flow/wip/$', FlowView.as_view(chart='wip'), name='wip'),
 ]
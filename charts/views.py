@@ -1,13 +1,35 @@
 from datetime import datetime, timedelta
-import statistics
 from collections import defaultdict
+import json
 
-from django.http import JsonResponse
+import numpy as np
+
+from django.conf import settings
+from django.core.paginator import InvalidPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Avg, Exists, OuterRef, Q, Sum
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, JsonResponse,
+    StreamingHttpResponse
+)
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from django.utils.text import compress_sequence
+from django.utils.timezone import now
 from django.views import generic
 
-from boards.models import Issue, Pipeline, Repo
+from boards.models import (
+    CLOSED_PIPELINE_NAME, Issue, IssueDuration, Label, Pipeline, Repo
+)
+from charts import stats
+from charts.flow import Flow, sweep
+from charts.expressions import PercentileCont, live_cycle_time
+from charts.cache import chart_cache
+from charts.encoding import iter_json
+from charts.models import ChartSnapshot
+from zenhub_charts import profiling
 
 
 class ChartView(generic.TemplateView):
@@ -30,72 +52,102 @@ class ChartView(generic.TemplateView):
     def get_context_data(self, repo, repos, durations, labels, issue_numbers,
                          *args, **kwargs):
         context = super(ChartView, self).get_context_data(*args, **kwargs)
+        # 'all' or comma separated repos are charted together
+        names = list(repos) if repo == 'all' else (repo or '').split(',')
         pipelines = Pipeline.objects.filter(
-            repo__name=repo
+            repo__name__in=names
         ).values_list('name', flat=True).order_by('order')
         context['pipelines'] = {i: i in durations for i in pipelines}
         context['repos'] = {i: i == repo for i in repos}
-        labels_from_db = Issue.objects.filter(repo__name=repo).values_list(
-            'labels', flat=True)
-        # flatten, dedupe, sort
-        labels_from_db = sorted(list(set(sum(labels_from_db, []))))
+        context['all_repos'] = repo == 'all'
+        labels_from_db = Label.objects.filter(
+            repo__name__in=names, issue_count__gt=0
+        ).order_by('name').values_list('name', flat=True)
         context['labels'] = {i: i in labels for i in labels_from_db}
         context['issue_numbers'] = issue_numbers
         return context
 
 
 class ChartResponseView(generic.View):
+    rolling_frame = 9
+    # bucket width and start, in seconds since the epoch, weeks start on
+    # Mondays like 1970-01-05
+    buckets = {
+        'day': (86400, 0),
+        'week': (7 * 86400, 4 * 86400),
+    }
+
     def get_chart_data(
             self, repo_name, since=None, until=None, durations=None,
-            labels=None, issue_numbers=None):
-        issues = Issue.objects.select_related('repo').filter(
-            repo__name=repo_name,
-        ).exclude(durations={})
-        if since and until:
-            since = self._py_datetime(int(float(since)))
-            until = self._py_datetime(int(float(until)))
-            issues = issues.filter(
-                latest_transfer_date__gte=since,
-                latest_transfer_date__lte=until
-            )
+            labels=None, issue_numbers=None, frame=None, aggregate=None,
+            points=None):
+        """
+        One scatter point per issue by default. With `aggregate` ('day' or
+        'week') the issues are summarized in time buckets instead, with
+        `points` they are downsampled to about that many points. Points
+        then only carry the issue number, see IssuesView for the details.
+        `repo_name` may be a list of repos, their issues are then read in
+        one query and charted together, see get_repos_series.
+        """
+        at = now()
+        summary, issues, xaxis, totals, ages = self.get_chart_issues(
+            repo_name, since, until, durations, labels, issue_numbers, at)
+        if isinstance(repo_name, list):
+            summary.update(self.get_repos_series(
+                issues, xaxis, totals, ages, durations, frame, aggregate,
+                points))
         else:
-            since = datetime.now() - timedelta(days=365)
-            issues = issues.filter(
-                latest_transfer_date__gte=since
-            )
-        if durations:
-            issues = issues.filter(durations__has_any_keys=durations)
-        if labels:
-            issues = issues.filter(labels__contains=labels)
-        if issue_numbers:
-            issues = issues.filter(number__in=issue_numbers)
-        issues = issues.order_by('latest_transfer_date')
+            summary.update(self.get_series(
+                issues, xaxis, totals, ages, durations, frame, aggregate,
+                points))
+        return summary
+
+    def get_series(self, issues, xaxis, totals, ages, durations, frame,
+                   aggregate, points, scatter=None):
+        """
+        Series of the chart of `issues`, with a scatter series per pipeline,
+        or a single one named `scatter`. `ages` are the seconds the issues
+        spent in their current pipeline.
+        """
+        if aggregate:
+            with profiling.phase('chart.stats'):
+                series = self.get_bucket_series(xaxis, totals, aggregate)
+            return {
+                'count': len(issues),
+                'series': series,
+                'pipelines': list({i.latest_pipeline_name for i in issues}),
+            }
+        with profiling.phase('chart.stats'):
+            positions, averages, deviations = stats.rolling_average(
+                totals, frame or self.rolling_frame)
+            if points:
+                kept = stats.lttb(xaxis[positions], averages, points)
+                positions = positions[kept]
+                averages = averages[kept]
+                deviations = deviations[kept]
+            rolling_set = np.column_stack(
+                (xaxis[positions], averages)).tolist()
+            deviation_set = np.column_stack((
+                xaxis[positions], averages - deviations,
+                averages + deviations
+            )).tolist()
+            indices = range(len(issues))
+            if points:
+                indices = stats.lttb(xaxis, totals, points).tolist()
+        selected = set(durations) if durations else None
         raw_data = defaultdict(list)
         pipelines = set()
-        rolling_set = []
-        deviation_set = []
-        for order, issue in enumerate(issues):
-            rolling, deviation = self.calculate_rolling_average(
-                issues, order, durations)
-            if rolling and deviation:
-                rolling_set.append(rolling)
-                deviation_set.append(deviation)
-            pipelines.add(issue.latest_pipeline_name)
-            pipelines_and_times = self.get_cycle_time_values(
-                        issue, durations, only_values=False)
-            total = sum(dict(pipelines_and_times).values())
-            raw_data[issue.latest_pipeline_name].append({
-                'x': self._js_time(issue.latest_transfer_date.timestamp()),
-                'y': self._js_time(total),
-                'title': issue.title,
-                'issue_number': issue.number,
-                'url': issue.github_url,
-                'labels': issue.labels,
-                'durations': {
-                    k: self._js_time(v)
-                    for k, v in pipelines_and_times
-                }
-            })
+        with profiling.phase('chart.points'):
+            for index in indices:
+                issue = issues[index]
+                x, y = xaxis[index].item(), totals[index].item()
+                pipelines.add(issue.latest_pipeline_name)
+                if points:
+                    point = {'x': x, 'y': y, 'issue_number': issue.number}
+                else:
+                    point = self.get_point(
+                        issue, x, y, ages[index], selected)
+                raw_data[scatter or issue.latest_pipeline_name].append(point)
         series = []
         series.append({
             'id': 'deviation',
@@ -111,105 +163,378 @@ class ChartResponseView(generic.View):
             'color': 'rgba(19, 109, 168, 1)',
             'type': 'line'})
 
-        duration_totals = [
-            self._js_time(
-                sum(self.get_cycle_time_values(i, durations))) for i in issues
-        ]
-        median = self.get_median(duration_totals)
-        average = self.get_average(duration_totals)
-        percentiles = self.get_percentiles(duration_totals)
-
         for key, data in raw_data.items():
-            data = sorted(data, key=lambda x: x['x'])
             series.append({
                 'id': key, 'name': key, 'data': data, 'type': 'scatter'
             })
 
-        return {
+        result = {
             'series': series,
-            'median': median,
-            'average': average,
-            'percentiles': percentiles,
             'pipelines': list(pipelines)
         }
+        if points:
+            result['count'] = len(issues)
+        return result
 
-    def get_cycle_time_values(
-            self, issue, cycle_time_pipelines, only_values=True):
-        if cycle_time_pipelines:
-            if only_values:
-                return [
-                    v for k, v in issue.durations.items()
-                    if k in cycle_time_pipelines
-                ]
-            else:
-                return {
-                    k: v for k, v in issue.durations.items()
-                    if k in cycle_time_pipelines
-                }.items()
+    def get_repos_series(self, issues, xaxis, totals, ages, durations,
+                         frame, aggregate, points):
+        """
+        Series of every repo of `issues`, one after the other, with a
+        single scatter series per repo named after it. Series are tagged
+        with their `repo`, `repos` has the summary of every repo.
+        """
+        series = []
+        pipelines = set()
+        repos = {}
+        for name, rows in self.get_repo_rows(issues):
+            group = self.get_series(
+                [issues[i] for i in rows], xaxis[rows], totals[rows],
+                ages[rows], durations, frame, aggregate, points,
+                scatter=name)
+            for item in group['series']:
+                if item['type'] != 'scatter':
+                    item['id'] = f'{name}:{item["id"]}'
+                    item['name'] = f'{name} {item["name"]}'
+                item['repo'] = name
+            series += group['series']
+            pipelines.update(group['pipelines'])
+            with profiling.phase('chart.stats'):
+                repos[name] = self.get_summary_from_totals(totals[rows])
+            repos[name]['count'] = len(rows)
+        return {
+            'count': len(issues),
+            'series': series,
+            'pipelines': sorted(pipelines),
+            'repos': repos,
+        }
+
+    def get_repo_rows(self, issues):
+        """
+        Name of every repo of `issues` and the positions of its issues, in
+        name order.
+        """
+        names = np.array([issue.repo.name for issue in issues])
+        for name in sorted(set(names.tolist())):
+            yield name, np.flatnonzero(names == name)
+
+    def get_chart_issues(self, repo_name, since, until, durations, labels,
+                         issue_numbers, at):
+        """
+        Summary of the chart, its issues in transfer date order with the
+        x and y of their points and the seconds they spent in their current
+        pipeline until `at`. `repo_name` may be a list of repos.
+        """
+        with profiling.phase('chart.sql'):
+            # resolved once, so the issue filters hit (repo_id, ...) indexes
+            repo = self.get_repo(repo_name)
+            issues = self.get_issues(
+                repo, since, until, durations, labels, issue_numbers)
+            summary = None if durations else self.get_summary(issues, at)
+            issues = list(issues.order_by('latest_transfer_date'))
+        with profiling.phase('chart.stats'):
+            # the time in the current pipeline is only computed once, for
+            # all the issues, and shared by the totals and the points
+            ages = stats.open_durations(issues, at)
+            totals = self.get_totals(issues, durations, ages)
+            if summary is None:
+                summary = self.get_summary_from_totals(totals)
+            xaxis = self._js_time(np.array(
+                [i.latest_transfer_date.timestamp() for i in issues]))
+        repos = {r.pk: r for r in self.as_list(repo) if r}
+        for issue in issues:
+            issue.repo = repos[issue.repo_id]
+        return summary, issues, xaxis, totals, ages
+
+    def get_columnar_data(
+            self, repo_name, since=None, until=None, durations=None,
+            labels=None, issue_numbers=None, frame=None, aggregate=None,
+            points=None):
+        """
+        Same chart as get_chart_data, with the series as parallel columns
+        of integer milliseconds instead of lists of points. Scatter series
+        and their durations refer to the pipelines by their index in
+        `pipelines`, issue urls are `issue_url` followed by the number.
+        With a list of repos the series of every repo are tagged with their
+        `repo` and `issue_urls` has the issue url of every repo.
+
+        `series` and `pipelines` are generators, every series is only built
+        when iter_json reaches it, so a single one is held in memory.
+        """
+        at = now()
+        summary, issues, xaxis, totals, ages = self.get_chart_issues(
+            repo_name, since, until, durations, labels, issue_numbers, at)
+        xaxis = np.rint(xaxis).astype(np.int64)
+        totals = np.rint(totals).astype(np.int64)
+        names = {}
+        args = (names, durations, frame, aggregate, points)
+        summary.update({'format': 'columnar', 'count': len(issues)})
+        if not isinstance(repo_name, list):
+            repo = issues[0].repo if issues else None
+            summary['issue_url'] = (
+                f'{repo.github_url}/issues/' if repo else '')
+            summary['series'] = self.get_columnar_group(
+                issues, xaxis, totals, ages, *args)
         else:
-            if only_values:
-                return issue.durations.values()
-            else:
-                return issue.durations.items()
+            repos = {}
+            issue_urls = {}
+            summary['series'] = self.get_columnar_repos(
+                issues, xaxis, totals, ages, repos, issue_urls, *args)
+            # filled while the series are generated, encoded after them
+            summary['repos'] = repos
+            summary['issue_urls'] = issue_urls
+        summary['pipelines'] = self.iter_pipelines(names)
+        return summary
+
+    def iter_pipelines(self, names):
+        # names are complete once every series was generated
+        yield from list(names)
+
+    def get_columnar_repos(self, issues, xaxis, totals, ages, repos,
+                           issue_urls, *args):
+        for name, rows in self.get_repo_rows(issues):
+            group = [issues[i] for i in rows]
+            repos[name] = self.get_summary_from_totals(totals[rows])
+            repos[name]['count'] = len(rows)
+            issue_urls[name] = f'{group[0].repo.github_url}/issues/'
+            for item in self.get_columnar_group(
+                    group, xaxis[rows], totals[rows], ages[rows], *args):
+                item['repo'] = name
+                yield item
+
+    def get_columnar_group(self, issues, xaxis, totals, ages, names,
+                           durations, frame, aggregate, points):
+        if aggregate:
+            width, offset = (
+                self._js_time(s) for s in self.buckets[aggregate])
+            starts, counts, values = stats.buckets(
+                xaxis, totals, width, offset)
+            values = np.rint(values).astype(np.int64)
+            columns = {'x': starts.astype(np.int64), 'count': counts}
+            for index, percent in enumerate(stats.PERCENTS):
+                columns[f'p{percent}'] = values[:, index]
+            return iter([
+                {'id': 'buckets', 'type': 'buckets', 'columns': columns}])
+        return self.get_columnar_series(
+            issues, xaxis, totals, ages, names, durations, frame, points)
+
+    def get_columnar_series(self, issues, xaxis, totals, ages, names,
+                            durations, frame, points):
+        with profiling.phase('chart.columns'):
+            positions, averages, deviations = stats.rolling_average(
+                totals, frame or self.rolling_frame)
+            if points:
+                kept = stats.lttb(xaxis[positions], averages, points)
+                positions = positions[kept]
+                averages = averages[kept]
+                deviations = deviations[kept]
+            indices = np.arange(len(issues))
+            if points:
+                indices = stats.lttb(xaxis, totals, points)
+            groups = defaultdict(list)
+            for index in indices.tolist():
+                pipeline = issues[index].latest_pipeline_name
+                groups[names.setdefault(pipeline, len(names))].append(index)
+        yield {
+            'id': 'deviation',
+            'type': 'arearange',
+            'columns': {
+                'x': xaxis[positions],
+                'low': np.rint(averages - deviations).astype(np.int64),
+                'high': np.rint(averages + deviations).astype(np.int64),
+            },
+        }
+        yield {
+            'id': 'average',
+            'type': 'line',
+            'columns': {
+                'x': xaxis[positions],
+                'y': np.rint(averages).astype(np.int64),
+            },
+        }
+        selected = set(durations) if durations else None
+        for pipeline, group in groups.items():
+            columns = {
+                'x': xaxis[group],
+                'y': totals[group],
+                'issue_number': [issues[i].number for i in group],
+            }
+            if not points:
+                columns['title'] = [issues[i].title for i in group]
+                columns['labels'] = [issues[i].labels for i in group]
+                columns['durations'] = self.get_duration_columns(
+                    [issues[i] for i in group], ages[group], names,
+                    selected)
+            yield {
+                'pipeline': pipeline, 'type': 'scatter', 'columns': columns
+            }
 
-    def calculate_rolling_average(self, issues, order, cycle_time_pipelines):
+    def get_duration_columns(self, issues, ages, names, selected=None):
         """
-        http://tinyurl.com/yaybq6g9
+        Milliseconds spent in every pipeline by `issues`, one column per
+        pipeline index, null where an issue never was in the pipeline.
         """
-        frame = 9  # TODO: calculate actual frame
-        issues_as_list = list(issues)  # optimize to have less queries
-        total = len(issues_as_list)
-        if order < frame // 2 or total - frame // 2 < order - 1:
-            return None, None
-        average_result = []
-        deviation_result = []
-        xaxis = self._js_time(
-            issues_as_list[order].latest_transfer_date.timestamp()
+        columns = {}
+        for row, (issue, age) in enumerate(zip(issues, ages.tolist())):
+            for name, seconds in issue.live_durations(age=age).items():
+                if selected is not None and name not in selected:
+                    continue
+                index = names.setdefault(name, len(names))
+                if index not in columns:
+                    columns[index] = [None] * len(issues)
+                columns[index][row] = round(self._js_time(seconds))
+        return columns
+
+    def get_point(self, issue, x, y, age, selected=None):
+        return {
+            'x': x,
+            'y': y,
+            'title': issue.title,
+            'issue_number': issue.number,
+            'url': issue.github_url,
+            'labels': issue.labels,
+            'durations': {
+                k: self._js_time(v)
+                for k, v in issue.live_durations(age=age).items()
+                if selected is None or k in selected
+            }
+        }
+
+    def get_totals(self, issues, durations, ages):
+        """
+        Cycle time of every issue, `ages` being the seconds they spent in
+        their current pipeline, only counting the time spent in `durations`
+        if any.
+        """
+        if durations:
+            matrix = stats.CycleTimeMatrix(issues, ages=ages)
+            return self._js_time(matrix.totals(matrix.mask(durations)))
+        return self._js_time(np.array(
+            [i.cycle_time or 0 for i in issues], dtype=float
+        ) + ages)
+
+    def get_bucket_series(self, xaxis, totals, aggregate):
+        width, offset = (self._js_time(s) for s in self.buckets[aggregate])
+        starts, counts, values = stats.buckets(xaxis, totals, width, offset)
+        lower, median, upper, highest = (
+            values[:, stats.PERCENTS.index(p)].tolist()
+            for p in stats.PERCENTS)
+        starts = starts.tolist()
+        return [{
+            'id': 'interquartile',
+            'name': 'Interquartile range',
+            'data': [list(point) for point in zip(starts, lower, upper)],
+            'color': 'rgba(191, 227, 252, 0.5)',
+            'type': 'arearange',
+        }, {
+            'id': 'median',
+            'name': 'Median',
+            'data': [
+                {'x': x, 'y': y, 'count': count}
+                for x, y, count in zip(starts, median, counts.tolist())
+            ],
+            'color': 'rgba(19, 109, 168, 1)',
+            'type': 'line',
+        }, {
+            'id': 'percentile-90',
+            'name': '90th percentile',
+            'data': [list(point) for point in zip(starts, highest)],
+            'color': 'gray',
+            'type': 'line',
+        }]
+
+    def get_issues(self, repo, since=None, until=None, durations=None,
+                   labels=None, issue_numbers=None):
+        """
+        Issues of `repo`, a Repo or a list of them, matching the filters.
+        """
+        repos = self.as_list(repo)
+        issues = Issue.objects.filter(
+            repo__in=repos,
+        ).exclude(
+            durations={},
+            current_pipeline_name__in=['', CLOSED_PIPELINE_NAME]
         )
-        filtered_issues = issues_as_list[order-(frame//2):order+(frame//2)+1]
-        total = sum(
-            [sum(self.get_cycle_time_values(i, cycle_time_pipelines))
-                for i in filtered_issues]
+        since, until = self.get_window(since, until)
+        issues = issues.filter(latest_transfer_date__gte=since)
+        if until:
+            issues = issues.filter(latest_transfer_date__lte=until)
+        if durations:
+            pipeline_ids = list(Pipeline.objects.filter(
+                repo__in=repos, name__in=durations
+            ).values_list('pk', flat=True))
+            issues = issues.annotate(in_pipelines=Exists(
+                IssueDuration.objects.filter(
+                    issue=OuterRef('pk'), pipeline_id__in=pipeline_ids)
+            )).filter(
+                Q(in_pipelines=True) |
+                Q(current_pipeline_name__in=[
+                    d for d in durations if d != CLOSED_PIPELINE_NAME
+                ])
+            )
+        if labels:
+            # every repo has its own row of a label
+            label_ids = defaultdict(list)
+            for name, pk in Label.objects.filter(
+                    repo__in=repos, name__in=labels).values_list('name', 'pk'):
+                label_ids[name].append(pk)
+            if len(label_ids) < len(set(labels)):
+                return issues.none()
+            # one join per label, each one on the (label, issue) index
+            for ids in label_ids.values():
+                issues = issues.filter(issue_labels__label_id__in=ids)
+        if issue_numbers:
+            issues = issues.filter(number__in=issue_numbers)
+        return issues
+
+    def get_window(self, since=None, until=None):
+        """
+        Transfer dates charted: from `since` to `until` if both are given,
+        otherwise the year before the current cache bucket started, so
+        every chart cached in a bucket covers the same days.
+        """
+        if since and until:
+            return (self._py_datetime(int(float(since))),
+                    self._py_datetime(int(float(until))))
+        started = chart_cache.bucket() * chart_cache.age_bucket
+        return datetime.fromtimestamp(started) - timedelta(days=365), None
+
+    def get_summary(self, issues, at):
+        """
+        Median, average and percentiles of the whole cycle time until `at`,
+        aggregated by Postgres from the precomputed Issue.cycle_time.
+        """
+        cycle_time = live_cycle_time(at)
+        result = issues.aggregate(
+            average=Avg(cycle_time),
+            percentiles=PercentileCont(
+                cycle_time, [p / 100 for p in stats.PERCENTS])
         )
-        average = total / (frame)
-        average_result = [
-            xaxis,
-            self._js_time(average)
-        ]
-        deviations = sum([
-            abs(sum(self.get_cycle_time_values(i, cycle_time_pipelines))
-                - average)
-            for i in filtered_issues
-        ])
-        mean_deviation = deviations / (frame)
-        deviation_result = [
-            xaxis,
-            self._js_time(average - abs(mean_deviation)),
-            self._js_time(average + abs(mean_deviation)),
-        ]
-        return average_result, deviation_result
-
-    def get_median(self, totals):
-        try:
-            return statistics.median(totals)
-        except statistics.StatisticsError:
-            return 0
-
-    def get_average(self, totals):
-        total = len(totals)
-        if total:
-            return sum(totals) / total
-        return 0
-
-    def get_percentiles(self, totals):
-        if not totals:
-            return [0, 0, 0, 0]
-        ordered = sorted(totals)
-        total = len(ordered)
-        percents = [0.25, 0.50, 0.75, 0.90]
-        results = [ordered[int(total*i)] for i in percents]
-        results[1] = self.get_median(totals)  # quick & dirty way to get mean
-        return results
+        if result['average'] is None:
+            return self.get_summary_from_totals([])
+        percentiles = [self._js_time(p) for p in result['percentiles']]
+        return {
+            'median': percentiles[stats.PERCENTS.index(50)],
+            'average': self._js_time(result['average']),
+            'percentiles': percentiles,
+        }
+
+    def get_summary_from_totals(self, totals):
+        return {
+            'median': stats.median(totals),
+            'average': stats.average(totals),
+            'percentiles': stats.percentiles(totals),
+        }
+
+    def get_repo(self, repo_name):
+        """
+        The repo named `repo_name`, a list of repos for a list of names.
+        """
+        if isinstance(repo_name, list):
+            return list(Repo.objects.filter(name__in=repo_name))
+        return Repo.objects.filter(name=repo_name).first()
+
+    def as_list(self, repo):
+        return repo if isinstance(repo, list) else [repo]
 
     def _js_time(self, ts):
         """
@@ -220,15 +545,321 @@ class ChartResponseView(generic.View):
     def _py_datetime(self, ts):
         return datetime.fromtimestamp(ts / 1000)
 
-    def get(self, request, *args, **kwargs):
-        repo_name = request.GET.get('repo')
-        since = request.GET.get('since')
-        until = request.GET.get('until')
+    def get_params(self, request):
+        """
+        Chart parameters of the query string. Raises ValueError if `frame`
+        is not a positive odd integer or `points` an integer of at least 3.
+        """
         durations = request.GET.get('durations')
-        durations = durations.split(',') if durations else None
         labels = request.GET.get('labels')
-        labels = labels.split(',') if labels else None
         issue_numbers = request.GET.get('issue-numbers')
-        issue_numbers = issue_numbers.split(',') if issue_numbers else None
-        return JsonResponse(self.get_chart_data(
-            repo_name, since, until, durations, labels, issue_numbers))
+        frame = self.get_int(request, 'frame', 1)
+        if frame is not None and not frame % 2:
+            raise ValueError('frame must be odd')
+        aggregate = request.GET.get('aggregate')
+        response_format = request.GET.get('format')
+        points = self.get_int(request, 'points', 3)
+        return {
+            'repo_name': self.get_repo_names(request.GET.get('repo')),
+            'since': request.GET.get('since'),
+            'until': request.GET.get('until'),
+            'durations': durations.split(',') if durations else None,
+            'labels': labels.split(',') if labels else None,
+            'issue_numbers': (
+                issue_numbers.split(',') if issue_numbers else None),
+            'frame': frame,
+            'aggregate': aggregate if aggregate in self.buckets else None,
+            'points': points,
+            'columnar': response_format == 'columnar',
+        }
+
+    def get_int(self, request, name, minimum):
+        value = request.GET.get(name)
+        if not value:
+            return None
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValueError(f'{name} must be an integer')
+        if value < minimum:
+            raise ValueError(f'{name} must be at least {minimum}')
+        return value
+
+    def get_repo_names(self, repo):
+        """
+        A repo name, or a list of them for 'all' or comma separated names.
+        """
+        if repo == 'all':
+            return list(Repo.objects.order_by('name').values_list(
+                'name', flat=True))
+        if repo and ',' in repo:
+            return sorted(set(repo.split(',')))
+        return repo
+
+    def get_version(self, repo_name):
+        """
+        Data version of the repo, the sum of them for a list of repos.
+        """
+        if isinstance(repo_name, list):
+            return Repo.objects.filter(name__in=repo_name).aggregate(
+                version=Sum('data_version'))['version']
+        return Repo.objects.filter(
+            name=repo_name
+        ).values_list('data_version', flat=True).first()
+
+    def get(self, request, *args, **kwargs):
+        try:
+            params = self.get_params(request)
+            since, until = self.get_window(params['since'], params['until'])
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        version = self.get_version(params['repo_name'])
+        # open issues age, the chart changes every age_bucket seconds too,
+        # and so does the default window
+        key = chart_cache.key(
+            version, bucket=chart_cache.bucket(),
+            **dict(params, since=since.isoformat(),
+                   until=until.isoformat() if until else None))
+        etag = quote_etag(key)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified:
+            return not_modified
+        content = chart_cache.get(key)
+        cache_status = 'HIT'
+        timeout = chart_cache.age_bucket
+        if content is None:
+            content, expires_in = self.get_snapshot(version, params)
+            if content is not None:
+                cache_status = 'SNAPSHOT'
+                content = content.encode('utf-8')
+                chart_cache.set(key, content, min(timeout, expires_in))
+        if params.pop('columnar'):
+            if content is None:
+                cache_status = 'MISS'
+                chunks = iter_json(self.get_columnar_data(**params))
+                content = chart_cache.iter_set(
+                    key, (chunk.encode('utf-8') for chunk in chunks),
+                    timeout)
+            else:
+                content = [content]
+            response = self.streaming_response(request, content)
+        else:
+            if content is None:
+                cache_status = 'MISS'
+                data = self.get_chart_data(**params)
+                with profiling.phase('chart.json'):
+                    content = json.dumps(data, cls=DjangoJSONEncoder)
+                chart_cache.set(key, content, timeout)
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        response['X-Cache'] = cache_status
+        return response
+
+    def get_snapshot(self, version, params):
+        """
+        Precomputed content of the chart and the seconds it can still be
+        served for, None if it has custom filters, several repos or its
+        snapshot is stale.
+        """
+        snapshot_params = ('repo_name', 'durations', 'columnar')
+        if version is None or isinstance(params['repo_name'], list) or any(
+                v for k, v in params.items() if k not in snapshot_params):
+            return None, None
+        field = 'columnar' if params['columnar'] else 'content'
+        snapshot = ChartSnapshot.objects.fresh().filter(
+            repo__name=params['repo_name'],
+            durations=sorted(set(params['durations'] or [])),
+            data_version=version,
+        ).values_list(field, 'built_at').first()
+        if snapshot is None:
+            return None, None
+        content, built_at = snapshot
+        max_age = settings.CHART_SNAPSHOTS['max_age']
+        expires_in = max_age - (now() - built_at).total_seconds()
+        return content, max(int(expires_in), 1)
+
+    def streaming_response(self, request, chunks):
+        """
+        Streams the encoded JSON `chunks`, gzipped if the client accepts it.
+        """
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        gzipped = 'gzip' in accept_encoding
+        if gzipped:
+            chunks = compress_sequence(chunks)
+        response = StreamingHttpResponse(
+            chunks, content_type='application/json')
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class IssuesView(ChartResponseView):
+    """
+    Paged chart points with their issue details, in transfer date order,
+    for the issues of a time range of an aggregated chart.
+    """
+    page_size = 100
+    max_page_size = 500
+
+    def get(self, request, *args, **kwargs):
+        try:
+            params = self.get_params(request)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        repo = self.get_repo(params['repo_name'])
+        issues = self.get_issues(
+            repo, params['since'], params['until'], params['durations'],
+            params['labels'], params['issue_numbers']
+        ).order_by('latest_transfer_date', 'pk')
+        try:
+            page_size = int(request.GET.get('page_size') or self.page_size)
+        except ValueError:
+            return HttpResponseBadRequest('page_size must be an integer')
+        page_size = min(max(page_size, 1), self.max_page_size)
+        try:
+            page = Paginator(issues, page_size).page(
+                request.GET.get('page') or 1)
+        except InvalidPage:
+            raise Http404('Invalid page')
+        at = now()
+        page_issues = list(page.object_list)
+        ages = stats.open_durations(page_issues, at)
+        totals = self.get_totals(page_issues, params['durations'], ages)
+        selected = set(params['durations'] or []) or None
+        data = []
+        repos = {r.pk: r for r in self.as_list(repo) if r}
+        for issue, y, age in zip(
+                page_issues, totals.tolist(), ages.tolist()):
+            issue.repo = repos[issue.repo_id]
+            x = self._js_time(issue.latest_transfer_date.timestamp())
+            data.append(self.get_point(issue, x, y, age, selected))
+        return JsonResponse({
+            'count': page.paginator.count,
+            'page': page.number,
+            'pages': page.paginator.num_pages,
+            'issues': data,
+        })
+
+
+class FlowView(ChartResponseView):
+    """
+    Cumulative flow, daily throughput or work in progress per pipeline
+    over time, `chart` being 'cumulative-flow', 'throughput' or 'wip'.
+    """
+    chart = None
+    throughput_frame = 7  # days of the throughput rolling average
+
+    def get(self, request, *args, **kwargs):
+        repo = Repo.objects.filter(name=request.GET.get('repo')).first()
+        if repo is None:
+            raise Http404('Unknown repo')
+        since = request.GET.get('since')
+        until = request.GET.get('until')
+        # the current day grows until midnight even without new transfers
+        key = chart_cache.key(
+            repo.data_version, repo_name=repo.name, chart=self.chart,
+            since=since, until=until, day=now().date().isoformat())
+        etag = quote_etag(key)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified:
+            return not_modified
+        content = chart_cache.get(key)
+        cache_status = 'HIT'
+        if content is None:
+            cache_status = 'MISS'
+            flow = self.get_flow(repo).between(
+                self._py_datetime(int(float(since))) if since else
+                now() - timedelta(days=365),
+                self._py_datetime(int(float(until))) if until else None)
+            data = getattr(self, 'get_' + self.chart.replace('-', '_'))(flow)
+            content = json.dumps(data, cls=DjangoJSONEncoder)
+            chart_cache.set(key, content)
+        response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        response['X-Cache'] = cache_status
+        return response
+
+    def get_flow(self, repo):
+        """
+        Flow of the whole history of the repo, swept once a day and data
+        version for the three charts and every range.
+        """
+        key = chart_cache.key(
+            repo.data_version, repo_name=repo.name, chart='flow',
+            day=now().date().isoformat())
+        content = chart_cache.get(key)
+        if content is not None:
+            return Flow.loads(content)
+        with profiling.phase('flow.sweep'):
+            flow = sweep(repo)
+        chart_cache.set(key, flow.dumps())
+        return flow
+
+    def get_points(self, flow, values):
+        return np.column_stack(
+            (self._js_time(flow.days), values)).tolist()
+
+    def get_cumulative_flow(self, flow):
+        """
+        Issues in every pipeline, the latest pipelines first so they stack
+        at the bottom.
+        """
+        return {
+            'pipelines': flow.pipelines,
+            'series': [{
+                'id': name,
+                'name': name,
+                'data': self.get_points(flow, flow.column(name)),
+                'type': 'area',
+            } for name in reversed(flow.pipelines)],
+        }
+
+    def get_throughput(self, flow):
+        frame = self.throughput_frame
+        cumulative = np.concatenate(([0], np.cumsum(flow.closed)))
+        # average of the `frame` days up to each day, shorter at the start
+        low = np.maximum(np.arange(len(flow)) + 1 - frame, 0)
+        averages = (cumulative[1:] - cumulative[low]) / (
+            np.arange(1, len(flow) + 1) - low)
+        return {
+            'total': int(flow.closed.sum()),
+            'average': flow.closed.mean() if len(flow) else None,
+            'series': [{
+                'id': 'closed',
+                'name': 'Closed issues',
+                'data': self.get_points(flow, flow.closed),
+                'type': 'column',
+            }, {
+                'id': 'average',
+                'name': f'{frame} days average',
+                'data': self.get_points(flow, averages),
+                'color': 'rgba(19, 109, 168, 1)',
+                'type': 'line',
+            }, {
+                'id': 'created',
+                'name': 'New issues',
+                'data': self.get_points(flow, flow.created),
+                'type': 'line',
+            }],
+        }
+
+    def get_wip(self, flow):
+        names = flow.open_pipelines
+        series = [{
+            'id': name,
+            'name': name,
+            'data': self.get_points(flow, flow.column(name)),
+            'type': 'line',
+        } for name in names]
+        total = sum(
+            (flow.column(name) for name in names),
+            np.zeros(len(flow), dtype=np.int64))
+        series.append({
+            'id': 'total',
+            'name': 'Work in progress',
+            'data': self.get_points(flow, total),
+            'color': 'gray',
+            'type': 'line',
+        })
+        return {'pipelines': names, 'series': series}
@@ -0,0 +1,227 @@
+"""
+Opt-in instrumentation of the chart requests and the syncs: phase timers
+with query counts, exposed as Server-Timing headers and Prometheus
+metrics, and cProfile captures of a sample of the requests and syncs.
+Everything is a no-op unless PROFILING['enabled'].
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter, time
+import io
+import logging
+import os
+import random
+import re
+import threading
+
+import redis
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+# phases timed by the thread serving the current request
+_local = threading.local()
+
+
+def enabled():
+    return settings.PROFILING['enabled']
+
+
+class Metrics(object):
+    """
+    Time, calls and queries of every phase. Phases are added up in memory
+    and to Redis once a request or a sync is done, so the web and worker
+    processes are reported together.
+    """
+    prefix = 'metrics'
+
+    def __init__(self, url=None):
+        self.url = (
+            url or settings.PROFILING.get('url') or
+            settings.CELERY_BROKER_URL)
+        self._redis = None
+        self._lock = threading.Lock()
+        self._pending = defaultdict(float)
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = redis.StrictRedis.from_url(self.url)
+        return self._redis
+
+    def add(self, phase, seconds, queries):
+        with self._lock:
+            self._pending[f'{phase}:seconds'] += seconds
+            self._pending[f'{phase}:calls'] += 1
+            self._pending[f'{phase}:queries'] += queries
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+        if not pending:
+            return
+        try:
+            pipe = self.redis.pipeline()
+            for field, value in pending.items():
+                pipe.hincrbyfloat(f'{self.prefix}:phases', field, value)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f'metrics unavailable: {e}')
+
+    def totals(self):
+        """
+        Totals of every phase by name, like {'chart.sql': {'seconds': 1.2,
+        'calls': 3, 'queries': 9}}.
+        """
+        totals = defaultdict(dict)
+        fields = self.redis.hgetall(f'{self.prefix}:phases')
+        for field, value in fields.items():
+            phase, _, total = field.decode('utf-8').rpartition(':')
+            totals[phase][total] = float(value)
+        return dict(totals)
+
+
+metrics = Metrics()
+
+
+def exposition(totals):
+    """
+    Phase totals in the Prometheus text format.
+    """
+    lines = []
+    for total, description in (
+            ('seconds', 'Time spent in the phase'),
+            ('calls', 'Times the phase ran'),
+            ('queries', 'SQL queries run in the phase')):
+        name = f'zenhub_charts_phase_{total}_total'
+        lines.append(f'# HELP {name} {description}.')
+        lines.append(f'# TYPE {name} counter')
+        for phase, values in sorted(totals.items()):
+            lines.append(
+                f'{name}{{phase="{phase}"}} {values.get(total, 0):g}')
+    return '\n'.join(lines) + '\n'
+
+
+def record(name, seconds, queries):
+    metrics.add(name, seconds, queries)
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings.append((name, seconds, queries))
+
+
+@contextmanager
+def phase(name):
+    """
+    Times the block and counts the queries it runs on this thread's
+    database connection.
+    """
+    if not enabled():
+        yield
+        return
+    forced = connection.force_debug_cursor
+    connection.force_debug_cursor = True
+    queries = len(connection.queries_log)
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        seconds = perf_counter() - started
+        queries = len(connection.queries_log) - queries
+        connection.force_debug_cursor = forced
+        if not forced and not settings.DEBUG:
+            # the outermost phase keeps the log from filling up
+            connection.queries_log.clear()
+        record(name, seconds, queries)
+
+
+@contextmanager
+def sampled_profile(name, force=False):
+    """
+    Profiles the block with cProfile for PROFILING['sample_rate'] of the
+    calls, or if `force`d, and saves the stats in PROFILING['directory'].
+    Yields the profile, None if the block is not profiled.
+    """
+    options = settings.PROFILING
+    if not force and not (
+            options['enabled'] and random.random() < options['sample_rate']):
+        yield None
+        return
+    import cProfile
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        os.makedirs(options['directory'], exist_ok=True)
+        slug = re.sub(r'[^\w.-]+', '-', name).strip('-')
+        path = os.path.join(
+            options['directory'], f'{slug}-{int(time() * 1000)}.prof')
+        profile.dump_stats(path)
+        logger.info(f'saved the profile of {name} to {path}')
+
+
+def report(profile, limit=50):
+    import pstats
+    output = io.StringIO()
+    pstats.Stats(profile, stream=output).sort_stats(
+        'cumulative').print_stats(limit)
+    return output.getvalue()
+
+
+def server_timing(timings):
+    """
+    Server-Timing header of the phases, the ones that ran several times
+    are added up.
+    """
+    phases = {}
+    for name, seconds, queries in timings:
+        total_seconds, total_queries = phases.get(name, (0, 0))
+        phases[name] = (total_seconds + seconds, total_queries + queries)
+    return ', '.join(
+        f'{name};dur={seconds * 1000:.1f};desc="{queries} queries"'
+        for name, (seconds, queries) in phases.items()
+    )
+
+
+class ProfilingMiddleware(object):
+    """
+    Adds a Server-Timing header with the phases of every request and adds
+    them to the metrics. A sample of the requests is profiled, staff users
+    get the profile of a request instead of its response with ?profile.
+    Streamed content is not timed.
+    """
+
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        on_demand = 'profile' in request.GET and request.user.is_staff
+        _local.timings = []
+        try:
+            with sampled_profile(
+                    f'request{request.path}', force=on_demand) as profile:
+                with phase('request'):
+                    response = self.get_response(request)
+            timings = _local.timings
+        finally:
+            _local.timings = None
+        metrics.flush()
+        if on_demand:
+            return HttpResponse(report(profile), content_type='text/plain')
+        response['Server-Timing'] = server_timing(timings)
+        return response
+
+
+def metrics_view(request):
+    if not enabled():
+        raise Http404('Profiling is disabled')
+    metrics.flush()
+    return HttpResponse(
+        exposition(metrics.totals()),
+        content_type='text/plain; version=0.0.4')
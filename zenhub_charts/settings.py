@@ -53,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'zenhub_charts.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'zenhub_charts.urls'
@@ -133,6 +134,67 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis'
 
+# Number of issues fetched concurrently during a sync
+FETCHER_WORKERS = 8
+
+# Periodic syncs: how often they run (a daily reconciliation is enough
+# with webhooks set up), issues fetched by each parallel task when a repo
+# has more to sync, and how long a repo stays locked if its sync dies
+FETCHER_TASKS = {
+    'every_hours': 3,
+    'chunk_size': 1000,
+    'lock_timeout': 60 * 60 * 6,
+}
+
+# Webhook events are applied in batches, at most every batch_delay seconds
+# per repo, retried max_retries times while the repo is being synced.
+# Secrets are GITHUB['webhook_secret'] and ZENHUB['webhook_token'].
+WEBHOOKS = {
+    'batch_delay': 10,
+    'max_retries': 60,
+}
+
+# Keep-alive connections to GitHub and ZenHub, shared by the workers above
+FETCHER_HTTP = {
+    'pool_size': 10,
+    'retries': 3,
+    'timeout': (5, 30),  # connect, read
+}
+
+# Responses revalidated with ETag / Last-Modified instead of downloaded again
+FETCHER_CACHE = {
+    'directory': os.path.join(BASE_DIR, '.cache', 'http'),
+    'ttl': 60 * 60 * 24 * 7,
+    'max_size': 256 * 1024 * 1024,  # bytes
+}
+
+# Chart data cache, uses the Celery broker if no url is given. Cycle time
+# charts show the live age of open issues, they are cached for age_bucket
+# seconds at most.
+CHART_CACHE = {
+    'max_entries': 1000,
+    'max_bytes': 256 * 1024 * 1024,
+    'timeout': 60 * 60 * 24,
+    'age_bucket': 60 * 60,
+}
+
+# Charts precomputed after every sync, besides the one of all pipelines and
+# the ones of each pipeline alone. Open issues' ages are frozen in them, so
+# they are only served for max_age seconds.
+CHART_SNAPSHOTS = {
+    'pipelines': [],
+    'max_age': 60 * 60 * 6,
+}
+
+# Phase timings of the chart requests and the syncs, as Server-Timing
+# headers and Prometheus metrics on /metrics, and cProfile stats of
+# sample_rate of the requests and syncs saved in directory
+PROFILING = {
+    'enabled': False,
+    'sample_rate': 0,
+    'directory': os.path.join(BASE_DIR, '.cache', 'profiles'),
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
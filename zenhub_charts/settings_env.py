@@ -3,10 +3,12 @@ import os
 
 GITHUB = {
     'token': os.environ['GITHUB_TOKEN'],
-    'owner': os.environ['GITHUB_OWNER']
+    'owner': os.environ['GITHUB_OWNER'],
+    'webhook_secret': os.environ.get('GITHUB_WEBHOOK_SECRET'),
 }
 ZENHUB = {
-    'token': os.environ['ZENHUB_TOKEN']
+    'token': os.environ['ZENHUB_TOKEN'],
+    'webhook_token': os.environ.get('ZENHUB_WEBHOOK_TOKEN'),
 }
 
 DATABASES = {
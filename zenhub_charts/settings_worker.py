@@ -0,0 +1,13 @@
+from .settings import *  # noqa
+
+# Celery workers and sync commands serve no pages: no admin, sessions,
+# messages, static files, middleware or views to load at startup. Celery
+# runs the system checks when a worker starts, they import the urls.
+INSTALLED_APPS = [
+    'boards',
+    'charts',
+]
+
+MIDDLEWARE = []
+
+ROOT_URLCONF = 'zenhub_charts.urls_worker'
@@ -18,9 +18,13 @@ from django.contrib import admin
 from django.conf import settings
 from django.conf.urls.static import static
 
+from zenhub_charts.profiling import metrics_view
+
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
+    url(r'^metrics$', metrics_view, name='metrics'),
+    url(r'', include('boards.urls')),
     url(r'', include('charts.urls'))
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
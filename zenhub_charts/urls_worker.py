@@ -0,0 +1,2 @@
+# Workers serve no pages, see settings_worker
+urlpatterns = []